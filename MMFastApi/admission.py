@@ -0,0 +1,309 @@
+"""
+Admission control and priority scheduling.
+
+Every HTTP request is classified as interactive voting, a normal read or a
+bulk/export request. Each class has its own concurrency limit, wait queue,
+per-client token-bucket rate limit and database connection budget. When a
+class queue is full, or a request has waited longer than the class allows, it
+is shed with 503 and Retry-After instead of piling up latency; clients over
+their rate get 429. Freed slots always go to the highest-priority waiter, and
+voting is not bound by the shared slot pool, so it keeps flowing while bulk
+traffic is throttled.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import parse_qs
+
+from starlette.responses import JSONResponse
+
+VOTING = "voting"
+READ = "read"
+BULK = "bulk"
+
+# List endpoints that become exports when called without any of their filters;
+# other parameters (fields=, tag_mode=, ...) do not narrow the result
+BULK_UNLESS_FILTERED = {
+    "/files/": {"category", "committee_id", "meeting_id", "mime_type", "tags"},
+    "/calendar/events": {"start_date", "end_date"},
+}
+# Server-Sent Event streams stay open for a whole session while mostly idle,
+# so they are rate limited but do not hold a concurrency slot
+STREAM_SUFFIX = "/stream"
+
+current_request_class: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_request_class", default=READ
+)
+
+
+@dataclass
+class RequestClass:
+    name: str
+    priority: int  # lower runs first
+    max_concurrency: int
+    max_queue: int
+    max_wait: float  # seconds a request may queue before being shed
+    db_connections: int
+    rate: float  # tokens per second per client
+    burst: int
+    uses_shared_pool: bool = True
+    active: int = 0
+    queued: int = 0
+    admitted: int = 0
+    rate_limited: int = 0
+    shed: int = 0
+    db_semaphore: Optional[asyncio.Semaphore] = field(default=None, repr=False)
+
+
+def default_classes() -> dict[str, RequestClass]:
+    return {
+        VOTING: RequestClass(
+            VOTING, priority=0, max_concurrency=64, max_queue=256, max_wait=5.0,
+            db_connections=20, rate=10.0, burst=20, uses_shared_pool=False,
+        ),
+        READ: RequestClass(
+            READ, priority=1, max_concurrency=32, max_queue=128, max_wait=2.0,
+            db_connections=10, rate=20.0, burst=40,
+        ),
+        BULK: RequestClass(
+            BULK, priority=2, max_concurrency=4, max_queue=16, max_wait=10.0,
+            db_connections=2, rate=1.0, burst=3,
+        ),
+    }
+
+
+def classify_request(method: str, path: str, query_string: bytes) -> str:
+    if path.startswith(("/votes", "/vote-results")) or path.endswith(("/vote-result", "/vote-result/")):
+        return VOTING
+    # The whole committee checks in at the start of a session, just as it votes
+    if method == "POST" and path.startswith("/meetings/") and "/attendance" in path:
+        return VOTING
+    filters = BULK_UNLESS_FILTERED.get(path)
+    if method == "GET" and filters is not None:
+        # Blank values (?category=) are dropped by parse_qs and do not count as a filter
+        if not filters & parse_qs(query_string.decode("latin-1")).keys():
+            return BULK
+    if path.endswith(".zip"):
+        return BULK
+    return READ
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume a token; return 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        classes: Optional[dict[str, RequestClass]] = None,
+        shared_slots: int = int(os.getenv("ADMISSION_SHARED_SLOTS", "48")),
+        max_clients: int = 10000,
+    ):
+        self.classes = classes or default_classes()
+        self.shared_slots = shared_slots
+        self.shared_active = 0
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[tuple[str, str], TokenBucket]" = OrderedDict()
+        self._waiters: list = []
+        self._sequence = itertools.count()
+
+    # -------------------------------------------------------------------------
+    # Rate limiting
+    # -------------------------------------------------------------------------
+
+    def check_rate(self, request_class: RequestClass, client: str) -> float:
+        key = (request_class.name, client)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(request_class.rate, request_class.burst)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take()
+
+    # -------------------------------------------------------------------------
+    # Concurrency slots
+    # -------------------------------------------------------------------------
+
+    def _has_capacity(self, request_class: RequestClass) -> bool:
+        if request_class.active >= request_class.max_concurrency:
+            return False
+        return not request_class.uses_shared_pool or self.shared_active < self.shared_slots
+
+    def _grant(self, request_class: RequestClass):
+        request_class.active += 1
+        request_class.admitted += 1
+        if request_class.uses_shared_pool:
+            self.shared_active += 1
+
+    def _has_priority_waiter(self, request_class: RequestClass) -> bool:
+        # A waiter stuck on its own class limit could not take the slot anyway
+        return any(
+            not waiter[2].done() and waiter[0] <= request_class.priority and self._has_capacity(waiter[3])
+            for waiter in self._waiters
+        )
+
+    async def acquire(self, request_class: RequestClass) -> Optional[float]:
+        """Take a slot for the request; return None on success or a Retry-After in seconds"""
+        if self._has_capacity(request_class) and not self._has_priority_waiter(request_class):
+            self._grant(request_class)
+            return None
+
+        if request_class.queued >= request_class.max_queue:
+            request_class.shed += 1
+            return request_class.max_wait
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (request_class.priority, next(self._sequence), future, request_class)
+        heapq.heappush(self._waiters, entry)
+        request_class.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=request_class.max_wait)
+            return None
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Granted just as the timeout fired; keep the slot
+                return None
+            future.cancel()
+            request_class.shed += 1
+            return request_class.max_wait
+        except asyncio.CancelledError:
+            # Client went away while queued; hand back a slot granted in the meantime
+            if future.done() and not future.cancelled():
+                self.release(request_class)
+            else:
+                future.cancel()
+            raise
+        finally:
+            request_class.queued -= 1
+
+    def release(self, request_class: RequestClass):
+        request_class.active -= 1
+        if request_class.uses_shared_pool:
+            self.shared_active -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        skipped = []
+        while self._waiters:
+            entry = heapq.heappop(self._waiters)
+            future, request_class = entry[2], entry[3]
+            if future.done():
+                continue
+            if self._has_capacity(request_class):
+                self._grant(request_class)
+                future.set_result(True)
+            else:
+                skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
+
+    # -------------------------------------------------------------------------
+    # Database connection budget
+    # -------------------------------------------------------------------------
+
+    @asynccontextmanager
+    async def db_slot(self):
+        request_class = self.classes[current_request_class.get()]
+        if request_class.db_semaphore is None:
+            request_class.db_semaphore = asyncio.Semaphore(request_class.db_connections)
+        async with request_class.db_semaphore:
+            yield
+
+    def stats(self) -> dict:
+        return {
+            "shared_slots": self.shared_slots,
+            "shared_active": self.shared_active,
+            "waiting": sum(1 for waiter in self._waiters if not waiter[2].done()),
+            "classes": {
+                name: {
+                    "priority": c.priority,
+                    "active": c.active,
+                    "queued": c.queued,
+                    "max_concurrency": c.max_concurrency,
+                    "db_connections": c.db_connections,
+                    "admitted": c.admitted,
+                    "rate_limited": c.rate_limited,
+                    "shed": c.shed,
+                }
+                for name, c in self.classes.items()
+            },
+        }
+
+
+admission = AdmissionController()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that applies the admission controller to HTTP requests"""
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        class_name = classify_request(scope["method"], scope["path"], scope.get("query_string", b""))
+        request_class = self.controller.classes[class_name]
+        client = scope["client"][0] if scope.get("client") else "unknown"
+
+        retry_after = self.controller.check_rate(request_class, client)
+        if retry_after:
+            request_class.rate_limited += 1
+            response = _reject(429, "Too many requests", retry_after)
+            await response(scope, receive, send)
+            return
+
+        holds_slot = not scope["path"].endswith(STREAM_SUFFIX)
+        if holds_slot:
+            retry_after = await self.controller.acquire(request_class)
+            if retry_after is not None:
+                response = _reject(503, "Server busy, please retry", retry_after)
+                await response(scope, receive, send)
+                return
+
+        token = current_request_class.set(class_name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request_class.reset(token)
+            if holds_slot:
+                self.controller.release(request_class)
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
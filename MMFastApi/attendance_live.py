@@ -0,0 +1,305 @@
+"""
+Meeting check-in with a live quorum counter.
+
+At the start of a session the whole committee checks in within a minute and
+every screen in the room shows whether the meeting is quorate. Check-ins go
+to an in-memory book per meeting (user -> status), which also keeps the
+number of committee members currently present, adjusted by one on every
+change. With the committee size from the membership index, the quorum
+(vote_tally's rule) is answered without a query, and every change is pushed
+as a Server-Sent Event to the clients watching the meeting instead of each
+of them polling a COUNT.
+
+The book is write-behind: changed rows are collected and upserted into
+`attendance` every ATTENDANCE_FLUSH_MS with one multi-row INSERT ... ON
+DUPLICATE KEY UPDATE (a member checking in twice keeps the later status),
+and the remainder is flushed on shutdown. A failed flush keeps its rows for
+the next one unless the meeting no longer exists, in which case they are
+dropped. A meeting is loaded from `attendance` the first time it is touched,
+and the least recently used ones without watchers or pending rows are
+evicted beyond ATTENDANCE_MAX_MEETINGS.
+
+Like the membership index the book is per process: check-ins taken by
+another worker are seen once the meeting is loaded again.
+"""
+
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from vote_tally import quorum
+
+FLUSH_SECONDS = float(os.getenv("ATTENDANCE_FLUSH_MS", "200")) / 1000
+MAX_MEETINGS = int(os.getenv("ATTENDANCE_MAX_MEETINGS", "500"))
+KEEPALIVE_SECONDS = 15
+MAX_BULK = 1000
+
+PRESENT = "present"
+STATUSES = ("present", "absent", "excused")
+
+QueryFn = Callable[..., Awaitable]
+FlushHook = Callable[[list], Awaitable]
+
+# One row per member and meeting, so check-ins can be upserted
+SCHEMA_INDEX = (
+    "attendance", "uq_attendance_meeting_user", "UNIQUE KEY uq_attendance_meeting_user (meeting_id, user_id)"
+)
+DEDUPLICATE_SQL = """
+DELETE older FROM attendance older
+JOIN attendance newer ON newer.meeting_id = older.meeting_id AND newer.user_id = older.user_id
+    AND newer.id > older.id
+"""
+
+UPSERT_SQL = """
+INSERT INTO attendance (meeting_id, user_id, status, checked_in_at)
+VALUES {values}
+ON DUPLICATE KEY UPDATE status = VALUES(status), checked_in_at = VALUES(checked_in_at)
+"""
+
+
+class MeetingPresence:
+    __slots__ = ("meeting_id", "committee_id", "statuses", "checked_in_at", "present_members", "version", "watchers")
+
+    def __init__(self, meeting_id: int, committee_id: Optional[int]):
+        self.meeting_id = meeting_id
+        self.committee_id = committee_id
+        self.statuses: dict[int, str] = {}
+        self.checked_in_at: dict[int, datetime] = {}
+        self.present_members = 0
+        self.version = 0
+        self.watchers: set[asyncio.Queue] = set()
+
+
+class AttendanceBook:
+    def __init__(self, query: QueryFn, members, on_flush: Optional[FlushHook] = None,
+                 interval: float = FLUSH_SECONDS, max_meetings: int = MAX_MEETINGS):
+        self.query = query
+        self.members = members  # authorization.MembershipIndex
+        self.on_flush = on_flush
+        self.interval = interval
+        self.max_meetings = max_meetings
+        self.meetings: "OrderedDict[int, MeetingPresence]" = OrderedDict()
+        self._loading: dict[int, asyncio.Future] = {}
+        self._dirty: dict[tuple[int, int], tuple[str, datetime]] = {}
+        self._wakeup = asyncio.Event()
+        self.counters = {"check_ins": 0, "flushes": 0, "rows_flushed": 0, "errors": 0, "dropped": 0, "events": 0}
+
+    # -------------------------------------------------------------------------
+    # Loading
+    # -------------------------------------------------------------------------
+
+    async def meeting(self, meeting_id: int, committee_id: Optional[int]) -> MeetingPresence:
+        presence = self.meetings.get(meeting_id)
+        if presence is not None:
+            self.meetings.move_to_end(meeting_id)
+            return presence
+        loading = self._loading.get(meeting_id)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(meeting_id, committee_id))
+            self._loading[meeting_id] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(meeting_id, None))
+        return await asyncio.shield(loading)
+
+    async def _load(self, meeting_id: int, committee_id: Optional[int]) -> MeetingPresence:
+        rows = await self.query(
+            "SELECT user_id, status, checked_in_at FROM attendance WHERE meeting_id = %s ORDER BY id",
+            (meeting_id,), fetch_all=True,
+        )
+        presence = MeetingPresence(meeting_id, committee_id)
+        for row in rows:
+            presence.statuses[row["user_id"]] = row["status"]
+            presence.checked_in_at[row["user_id"]] = row["checked_in_at"]
+        # Check-ins taken while the rows were loading are pending in _dirty and win
+        for (dirty_meeting, user_id), (status, at) in self._dirty.items():
+            if dirty_meeting == meeting_id:
+                presence.statuses[user_id] = status
+                presence.checked_in_at[user_id] = at
+        presence.present_members = self._count_present_members(presence)
+        self.meetings[meeting_id] = presence
+        self._evict()
+        return presence
+
+    def _count_present_members(self, presence: MeetingPresence) -> int:
+        return sum(
+            1 for user_id, status in presence.statuses.items()
+            if status == PRESENT and self.members.is_member(presence.committee_id, user_id)
+        )
+
+    def _evict(self):
+        pending = {meeting_id for meeting_id, _ in self._dirty}
+        for meeting_id in list(self.meetings):
+            if len(self.meetings) <= self.max_meetings:
+                break
+            if not self.meetings[meeting_id].watchers and meeting_id not in pending:
+                del self.meetings[meeting_id]
+
+    # -------------------------------------------------------------------------
+    # Check-in
+    # -------------------------------------------------------------------------
+
+    async def check_in(self, meeting_id: int, committee_id: Optional[int], entries: list) -> dict:
+        """Record (user_id, status) entries; returns the meeting's quorum summary"""
+        presence = await self.meeting(meeting_id, committee_id)
+        now = datetime.now().replace(microsecond=0)
+        for user_id, status in entries:
+            previous = presence.statuses.get(user_id)
+            presence.statuses[user_id] = status
+            presence.checked_in_at[user_id] = now
+            self._dirty[(meeting_id, user_id)] = (status, now)
+            if previous != status and self.members.is_member(committee_id, user_id):
+                presence.present_members += (status == PRESENT) - (previous == PRESENT)
+        self.counters["check_ins"] += len(entries)
+        self._wakeup.set()
+        return self._publish(presence)
+
+    def committee_changed(self, committee_id: Optional[int]):
+        """Call after the committee's membership changed; None after a full reload of the index"""
+        for presence in self.meetings.values():
+            if committee_id is None or presence.committee_id == committee_id:
+                present_members = self._count_present_members(presence)
+                # The committee's size may have changed too, so its own meetings always hear about it
+                if committee_id is not None or present_members != presence.present_members:
+                    presence.present_members = present_members
+                    self._publish(presence)
+
+    # -------------------------------------------------------------------------
+    # Reading and watching
+    # -------------------------------------------------------------------------
+
+    def summary(self, presence: MeetingPresence) -> dict:
+        return {
+            "meeting_id": presence.meeting_id,
+            "committee_id": presence.committee_id,
+            "version": presence.version,
+            **quorum(self.members.member_count(presence.committee_id), presence.present_members),
+        }
+
+    def snapshot(self, presence: MeetingPresence) -> dict:
+        return {
+            **self.summary(presence),
+            "attendees": [
+                {
+                    "user_id": user_id,
+                    "status": status,
+                    "checked_in_at": str(presence.checked_in_at[user_id]) if presence.checked_in_at[user_id] else None,
+                    "member": self.members.is_member(presence.committee_id, user_id),
+                }
+                for user_id, status in sorted(presence.statuses.items())
+            ],
+        }
+
+    def _publish(self, presence: MeetingPresence) -> dict:
+        presence.version += 1
+        summary = self.summary(presence)
+        for watcher in presence.watchers:
+            # Only the latest state matters to a slow client
+            if watcher.full():
+                watcher.get_nowait()
+            watcher.put_nowait(summary)
+        self.counters["events"] += len(presence.watchers)
+        return summary
+
+    async def events(self, meeting_id: int, committee_id: Optional[int]) -> AsyncIterator[str]:
+        """Server-Sent Events: the full snapshot, then a summary on every change"""
+        presence = await self.meeting(meeting_id, committee_id)
+        watcher: asyncio.Queue = asyncio.Queue(maxsize=1)
+        presence.watchers.add(watcher)
+        try:
+            yield _event("snapshot", self.snapshot(presence))
+            while True:
+                try:
+                    summary = await asyncio.wait_for(watcher.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _event("quorum", summary)
+        finally:
+            presence.watchers.discard(watcher)
+
+    # -------------------------------------------------------------------------
+    # Persistence
+    # -------------------------------------------------------------------------
+
+    async def flush(self) -> int:
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, {}
+        rows = [(meeting_id, user_id, status, at) for (meeting_id, user_id), (status, at) in dirty.items()]
+        try:
+            await self._upsert(rows)
+            flushed = rows
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"Attendance flush failed, retrying per meeting: {e}")
+            flushed = await self._flush_per_meeting(rows)
+        self.counters["flushes"] += 1
+        self.counters["rows_flushed"] += len(flushed)
+        meeting_ids = sorted({row[0] for row in flushed})
+        if meeting_ids and self.on_flush:
+            await self.on_flush(meeting_ids)
+        return len(flushed)
+
+    async def _flush_per_meeting(self, rows: list) -> list:
+        by_meeting: dict[int, list] = {}
+        for row in rows:
+            by_meeting.setdefault(row[0], []).append(row)
+        flushed = []
+        for meeting_id, meeting_rows in by_meeting.items():
+            try:
+                await self._upsert(meeting_rows)
+                flushed.extend(meeting_rows)
+            except Exception as e:
+                if await self._meeting_exists(meeting_id):
+                    self._requeue(meeting_rows)
+                else:
+                    self.counters["dropped"] += len(meeting_rows)
+                    self.meetings.pop(meeting_id, None)
+                    print(f"Attendance for deleted meeting {meeting_id} dropped: {e}")
+        return flushed
+
+    async def _meeting_exists(self, meeting_id: int) -> bool:
+        try:
+            row = await self.query("SELECT 1 AS found FROM meetings WHERE id = %s", (meeting_id,), fetch_one=True)
+        except Exception:
+            return True  # the database is unreachable, so keep the rows
+        return row is not None
+
+    def _requeue(self, rows: list):
+        for meeting_id, user_id, status, at in rows:
+            # A check-in taken since the flush started is newer
+            self._dirty.setdefault((meeting_id, user_id), (status, at))
+        self._wakeup.set()
+
+    async def _upsert(self, rows: list):
+        values = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+        await self.query(UPSERT_SQL.format(values=values), [value for row in rows for value in row])
+
+    async def run_forever(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Let the rest of a check-in burst arrive before writing
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Attendance flusher error: {e}")
+
+    async def close(self):
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "meetings": len(self.meetings),
+            "watchers": sum(len(presence.watchers) for presence in self.meetings.values()),
+            "pending_rows": len(self._dirty),
+            "flush_ms": self.interval * 1000,
+            **self.counters,
+        }
+
+
+def _event(name: str, data: dict) -> str:
+    return f"event: {name}\nid: {data['version']}\ndata: {json.dumps(data)}\n\n"
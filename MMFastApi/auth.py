@@ -0,0 +1,142 @@
+"""
+Stateless JWT authentication shared by the API entry points.
+
+Tokens are short-lived HS256 JWTs verified entirely in memory, so resolving
+the current user never touches the database. Decoded claims are cached per
+token until the token expires. bcrypt work runs in the thread pool so a burst
+of logins cannot stall the event loop.
+"""
+
+import hmac
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+
+# The value the sample .env used to ship with; anyone could sign tokens with it
+PLACEHOLDER_SECRET_KEY = "your-secret-key-here"
+SECRET_KEY = os.getenv("SECRET_KEY", "")
+if not SECRET_KEY or SECRET_KEY == PLACEHOLDER_SECRET_KEY:
+    raise RuntimeError(
+        "SECRET_KEY is not set; generate one with "
+        "python -c \"import secrets; print(secrets.token_urlsafe(48))\" and put it in .env"
+    )
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+CLAIMS_CACHE_SIZE = int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "10000"))
+
+# Accounts created before bcrypt was introduced were stored as "hashed_" + password
+LEGACY_HASH_PREFIX = "hashed_"
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# token -> (claims, expires_at); ordered oldest first for LRU eviction
+_claims_cache: "OrderedDict[str, tuple[dict, float]]" = OrderedDict()
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    email: Optional[str] = None
+
+
+# =============================================================================
+# PASSWORDS
+# =============================================================================
+
+async def hash_password(password: str) -> str:
+    return await run_in_threadpool(pwd_context.hash, password)
+
+
+async def verify_password(password: str, password_hash: Optional[str]) -> bool:
+    if not password_hash:
+        return False
+    if password_hash.startswith(LEGACY_HASH_PREFIX):
+        return hmac.compare_digest(password_hash, LEGACY_HASH_PREFIX + password)
+    try:
+        return await run_in_threadpool(pwd_context.verify, password, password_hash)
+    except ValueError:
+        # Unknown or malformed hash in the users table
+        return False
+
+
+def password_needs_rehash(password_hash: str) -> bool:
+    """Legacy and outdated bcrypt hashes are upgraded on the next successful login"""
+    if password_hash.startswith(LEGACY_HASH_PREFIX):
+        return True
+    return pwd_context.needs_update(password_hash)
+
+
+# =============================================================================
+# TOKENS
+# =============================================================================
+
+def create_access_token(user_id: int, email: Optional[str] = None) -> str:
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": str(user_id),
+        "email": email,
+        "iat": now,
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def decode_access_token(token: str) -> dict:
+    now = time.time()
+    cached = _claims_cache.get(token)
+    if cached is not None:
+        claims, expires_at = cached
+        if expires_at > now:
+            _claims_cache.move_to_end(token)
+            return claims
+        del _claims_cache[token]
+
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    # A validly signed token may still lack an expiry or carry a non-numeric subject
+    try:
+        int(claims["sub"])
+        expires_at = float(claims["exp"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    _claims_cache[token] = (claims, expires_at)
+    if len(_claims_cache) > CLAIMS_CACHE_SIZE:
+        _claims_cache.popitem(last=False)
+    return claims
+
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> CurrentUser:
+    if credentials is None or credentials.scheme.lower() != "bearer":
+        raise HTTPException(
+            status_code=401,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    claims = decode_access_token(credentials.credentials)
+    return CurrentUser(id=int(claims["sub"]), email=claims.get("email"))
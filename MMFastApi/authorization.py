@@ -0,0 +1,117 @@
+"""
+Committee-membership authorization.
+
+Keeps an in-memory index of committee membership (user -> committees and
+committee -> members), the set of admin users and the committee each meeting
+belongs to. The index is loaded at startup from committee_members/user_roles
+and updated in place whenever membership changes, so access checks never cost
+a query.
+"""
+
+import os
+from typing import Iterable, Optional
+
+from fastapi import Depends, HTTPException
+
+from auth import CurrentUser, get_current_user
+
+ADMIN_ROLE = "admin"
+MEMBERSHIP_REFRESH_SECONDS = int(os.getenv("MEMBERSHIP_REFRESH_SECONDS", "300"))
+
+
+class MembershipIndex:
+    def __init__(self):
+        self.user_committees: dict[int, set[int]] = {}
+        self.committee_members: dict[int, set[int]] = {}
+        self.meeting_committees: dict[int, Optional[int]] = {}
+        self.admins: set[int] = set()
+        self.loaded = False
+
+    def replace(
+        self,
+        memberships: Iterable[tuple[int, int]],
+        admin_ids: Iterable[int],
+        meetings: Iterable[tuple[int, Optional[int]]],
+    ):
+        """Swap in a freshly loaded snapshot of (committee_id, user_id) pairs"""
+        user_committees: dict[int, set[int]] = {}
+        committee_members: dict[int, set[int]] = {}
+        for committee_id, user_id in memberships:
+            user_committees.setdefault(user_id, set()).add(committee_id)
+            committee_members.setdefault(committee_id, set()).add(user_id)
+
+        self.user_committees = user_committees
+        self.committee_members = committee_members
+        self.meeting_committees = dict(meetings)
+        self.admins = set(admin_ids)
+        self.loaded = True
+
+    def add_member(self, committee_id: int, user_id: int):
+        self.user_committees.setdefault(user_id, set()).add(committee_id)
+        self.committee_members.setdefault(committee_id, set()).add(user_id)
+
+    def remove_member(self, committee_id: int, user_id: int):
+        self.user_committees.get(user_id, set()).discard(committee_id)
+        self.committee_members.get(committee_id, set()).discard(user_id)
+
+    def remove_committee(self, committee_id: int):
+        for user_id in self.committee_members.pop(committee_id, set()):
+            self.user_committees.get(user_id, set()).discard(committee_id)
+
+    def set_meeting_committee(self, meeting_id: int, committee_id: Optional[int]):
+        self.meeting_committees[meeting_id] = committee_id
+
+    def lookup_meeting(self, meeting_id: int) -> tuple[bool, Optional[int]]:
+        """Return (known, committee_id) for a meeting"""
+        if meeting_id in self.meeting_committees:
+            return True, self.meeting_committees[meeting_id]
+        return False, None
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self.admins
+
+    def committees_for(self, user_id: int) -> frozenset:
+        return frozenset(self.user_committees.get(user_id, ()))
+
+    def members_of(self, committee_id: int) -> frozenset:
+        return frozenset(self.committee_members.get(committee_id, ()))
+
+    def member_count(self, committee_id: Optional[int]) -> int:
+        return len(self.committee_members.get(committee_id, ()))
+
+    def is_member(self, committee_id: Optional[int], user_id: int) -> bool:
+        return user_id in self.committee_members.get(committee_id, ())
+
+    def can_access_committee(self, user_id: int, committee_id: Optional[int]) -> bool:
+        # Rows without a committee are shared across the organisation
+        if committee_id is None or self.is_admin(user_id):
+            return True
+        return committee_id in self.user_committees.get(user_id, ())
+
+
+membership = MembershipIndex()
+
+
+def ensure_committee_access(user: CurrentUser, committee_id: Optional[int]):
+    if not membership.can_access_committee(user.id, committee_id):
+        raise HTTPException(status_code=403, detail="Not a member of this committee")
+
+
+def committee_filter(user: CurrentUser, column: str = "committee_id") -> tuple[Optional[str], list]:
+    """
+    Build an SQL condition restricting `column` to the committees the user
+    belongs to. Returns (None, []) when no restriction applies.
+    """
+    if membership.is_admin(user.id):
+        return None, []
+    committee_ids = sorted(membership.committees_for(user.id))
+    if not committee_ids:
+        return f"{column} IS NULL", []
+    placeholders = ", ".join(["%s"] * len(committee_ids))
+    return f"({column} IS NULL OR {column} IN ({placeholders}))", committee_ids
+
+
+async def require_admin(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    if not membership.is_admin(current_user.id):
+        raise HTTPException(status_code=403, detail="Administrator role required")
+    return current_user
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark download throughput and server CPU per GB for Starlette's
+FileResponse (what download_file used to return) against SendfileResponse.
+
+Starts uvicorn in a subprocess serving both responders over the same files,
+downloads them concurrently with httpx and reads the server's CPU time from
+/proc (Linux only for the CPU column).
+
+Usage: python bench_downloads.py [--size-mb 64] [--files 4] [--requests 40] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(os.getenv("BENCH_DOWNLOAD_DIR", tempfile.gettempdir())) / "mm_bench_downloads"
+RESPONDERS = ["fileresponse", "sendfile"]
+
+
+def create_app():
+    from fastapi import FastAPI
+    from starlette.responses import FileResponse
+    from sendfile_response import SendfileResponse
+
+    app = FastAPI()
+
+    @app.get("/fileresponse/{name}")
+    async def via_file_response(name: str):
+        return FileResponse(BENCH_DIR / name, media_type="application/octet-stream")
+
+    @app.get("/sendfile/{name}")
+    async def via_sendfile(name: str):
+        return SendfileResponse(BENCH_DIR / name, media_type="application/octet-stream")
+
+    return app
+
+
+def prepare_files(count: int, size_mb: int) -> list[str]:
+    BENCH_DIR.mkdir(parents=True, exist_ok=True)
+    names = []
+    block = os.urandom(1024 * 1024)
+    for i in range(count):
+        name = f"bench_{size_mb}mb_{i}.bin"
+        path = BENCH_DIR / name
+        if not path.exists() or path.stat().st_size != size_mb * 1024 * 1024:
+            with open(path, "wb") as f:
+                for _ in range(size_mb):
+                    f.write(block)
+        names.append(name)
+    return names
+
+
+def server_cpu_seconds(pid: int):
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except OSError:
+        return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("Benchmark server did not start")
+
+
+async def run_round(base_url: str, responder: str, names: list[str], requests: int, concurrency: int) -> int:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    transferred = 0
+
+    async def download(client, name):
+        nonlocal transferred
+        async with semaphore:
+            async with client.stream("GET", f"{base_url}/{responder}/{name}") as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_raw():
+                    transferred += len(chunk)
+
+    async with httpx.AsyncClient(timeout=None) as client:
+        await asyncio.gather(*(download(client, names[i % len(names)]) for i in range(requests)))
+    return transferred
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    names = prepare_files(args.files, args.size_mb)
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "bench_downloads:create_app", "--factory",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=Path(__file__).parent,
+    )
+    try:
+        wait_for_port(port)
+        base_url = f"http://127.0.0.1:{port}"
+        # Warm the page cache so both responders read from memory
+        asyncio.run(run_round(base_url, "fileresponse", names, len(names), args.concurrency))
+
+        print(f"{'responder':<14}{'GB':>8}{'seconds':>10}{'GB/s':>8}{'cpu s':>8}{'cpu s/GB':>10}")
+        for responder in RESPONDERS:
+            cpu_before = server_cpu_seconds(server.pid)
+            started = time.perf_counter()
+            transferred = asyncio.run(run_round(base_url, responder, names, args.requests, args.concurrency))
+            elapsed = time.perf_counter() - started
+            cpu_after = server_cpu_seconds(server.pid)
+
+            gigabytes = transferred / 1024 ** 3
+            cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+            print(
+                f"{responder:<14}{gigabytes:>8.2f}{elapsed:>10.2f}{gigabytes / elapsed:>8.2f}"
+                + (f"{cpu:>8.2f}{cpu / gigabytes:>10.2f}" if cpu is not None else f"{'n/a':>8}{'n/a':>10}")
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
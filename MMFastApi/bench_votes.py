@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark ballot ingestion: the per-request path create_vote used to take
+(check, insert or update, re-select, each on a fresh connection) against
+VoteBatcher's group commit.
+
+Every voter casts --rounds ballots concurrently with all the others, as when
+a chair opens a vote. Both paths write to a scratch copy of the votes table
+(`bench_votes`, dropped afterwards) in the database from main_complete's
+DB_CONFIG, so the API itself is not involved.
+
+Usage: python bench_votes.py [--voters 500] [--rounds 3] [--connections 50] [--window-ms 5]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import aiomysql
+
+from main_complete import DB_CONFIG
+from vote_codes import code_of
+from vote_ingest import VoteBatcher, SCHEMA_COLUMNS, SCHEMA_INDEX
+
+TABLE = "bench_votes"
+MEETING_ID = 1
+OPTIONS = ["for", "against", "abstain"]
+PATHS = ["per-request", "batched"]
+
+
+async def execute(sql: str, params=None, fetch_one=False):
+    connection = await aiomysql.connect(**DB_CONFIG)
+    try:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(sql, params)
+            result = await cursor.fetchone() if fetch_one else cursor.lastrowid
+        await connection.commit()
+        return result
+    finally:
+        connection.close()
+
+
+async def prepare_table():
+    await execute(f"DROP TABLE IF EXISTS {TABLE}")
+    # LIKE copies indexes but not foreign keys, so any ids will do
+    await execute(f"CREATE TABLE {TABLE} LIKE votes")
+    for _, column, definition in SCHEMA_COLUMNS:
+        try:
+            await execute(f"ALTER TABLE {TABLE} ADD COLUMN {column} {definition}")
+        except aiomysql.OperationalError as e:
+            if e.args[0] != 1060:  # duplicate column
+                raise
+    try:
+        await execute(f"ALTER TABLE {TABLE} ADD {SCHEMA_INDEX[2]}")
+    except aiomysql.OperationalError as e:
+        if e.args[0] != 1061:  # duplicate key name: votes is already migrated
+            raise
+
+
+def per_request_path(connections: int):
+    slots = asyncio.Semaphore(connections)
+
+    async def query(*args, **kwargs):
+        async with slots:
+            return await execute(*args, **kwargs)
+
+    async def cast(user_id: int, opt: str) -> dict:
+        existing = await query(
+            f"SELECT id FROM {TABLE} WHERE meeting_id = %s AND user_id = %s", (MEETING_ID, user_id), fetch_one=True
+        )
+        if existing:
+            await query(f"UPDATE {TABLE} SET opt = %s WHERE id = %s", (opt, existing["id"]))
+            vote_id = existing["id"]
+        else:
+            vote_id = await query(
+                f"INSERT INTO {TABLE} (meeting_id, user_id, opt, created_at) VALUES (%s, %s, %s, NOW())",
+                (MEETING_ID, user_id, opt),
+            )
+        return await query(f"SELECT * FROM {TABLE} WHERE id = %s", (vote_id,), fetch_one=True)
+
+    return cast, None
+
+
+def batched_path(window_ms: float):
+    batcher = VoteBatcher(lambda: aiomysql.connect(**DB_CONFIG), table=TABLE, window=window_ms / 1000)
+
+    async def cast(user_id: int, opt: str) -> dict:
+        return await batcher.submit(MEETING_ID, user_id, code_of(opt))
+
+    return cast, batcher
+
+
+async def run_round(path: str, voters: int, rounds: int, connections: int, window_ms: float):
+    await prepare_table()
+    cast, batcher = per_request_path(connections) if path == "per-request" else batched_path(window_ms)
+    latencies = []
+
+    async def voter(user_id: int):
+        for _ in range(rounds):
+            started = time.perf_counter()
+            await cast(user_id, random.choice(OPTIONS))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(voter(user_id) for user_id in range(1, voters + 1)))
+    elapsed = time.perf_counter() - started
+
+    stored = await execute(f"SELECT COUNT(*) AS count FROM {TABLE}", fetch_one=True)
+    if stored["count"] != voters:
+        raise RuntimeError(f"{path}: expected {voters} stored ballots, found {stored['count']}")
+    if batcher is not None:
+        await batcher.close()
+    latencies.sort()
+    return elapsed, latencies, batcher.stats() if batcher is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voters", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--connections", type=int, default=50, help="concurrent connections for the per-request path")
+    parser.add_argument("--window-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{'path':<14}{'ballots':>9}{'seconds':>10}{'ballots/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'batches':>9}")
+    try:
+        for path in PATHS:
+            elapsed, latencies, stats = asyncio.run(
+                run_round(path, args.voters, args.rounds, args.connections, args.window_ms)
+            )
+            ballots = len(latencies)
+            percentile = lambda p: latencies[min(ballots - 1, int(p * ballots))] * 1000
+            print(
+                f"{path:<14}{ballots:>9}{elapsed:>10.2f}{ballots / elapsed:>11.0f}"
+                f"{percentile(0.5):>9.1f}{percentile(0.99):>9.1f}"
+                + (f"{stats['batches']:>9}" if stats else f"{'-':>9}")
+            )
+    finally:
+        asyncio.run(execute(f"DROP TABLE IF EXISTS {TABLE}"))
+
+
+if __name__ == "__main__":
+    main()
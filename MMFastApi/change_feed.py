@@ -0,0 +1,177 @@
+"""
+Change feed for incremental client sync.
+
+Every write handler appends an entry to `change_log`, in the same
+transaction as the write itself: the entity, its id, whether it was
+upserted or deleted, and the committee it belongs to. The
+AUTO_INCREMENT `seq` of that table is the change sequence number, shared by
+all entities, so a client holding the last `seq` it has seen can ask for
+everything after it. Deletes stay in the log as tombstones, and since only
+the newest entry per entity row matters, a batch is collapsed to one upsert
+or tombstone per row before the current rows are loaded.
+
+Entries younger than SYNC_SETTLE_MS are held back, so a sequence number
+taken just before a slower insert commits cannot be skipped over. Entries
+older than SYNC_RETENTION_DAYS are pruned; a client without a token, or whose
+token predates the oldest remaining entry, is told to reset, reload its
+collections and continue from the returned token. While the log is empty the
+token is 0, and a client holding 0 is up to date.
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Optional
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+SYNC_BATCH_SIZE = 500
+SYNC_MAX_BATCH_SIZE = 2000
+SETTLE_MS = int(os.getenv("SYNC_SETTLE_MS", "1000"))
+RETENTION_DAYS = int(os.getenv("SYNC_RETENTION_DAYS", "30"))
+PRUNE_INTERVAL_SECONDS = 3600
+PRUNE_BATCH_SIZE = 10000
+
+QueryFn = Callable[..., Awaitable]
+
+# For writers without a ChangeFeed (main_extended, main_mysql): (entity, entity_id, op, committee/meeting/item id)
+RECORD_SQL = "INSERT INTO change_log (entity, entity_id, op, committee_id) VALUES (%s, %s, %s, %s)"
+RECORD_FOR_MEETING_SQL = """
+INSERT INTO change_log (entity, entity_id, op, committee_id)
+SELECT %s, %s, %s, committee_id FROM meetings WHERE id = %s
+"""
+RECORD_FOR_AGENDA_ITEM_SQL = """
+INSERT INTO change_log (entity, entity_id, op, committee_id)
+SELECT %s, %s, %s, m.committee_id FROM agenda_items ai JOIN meetings m ON m.id = ai.meeting_id WHERE ai.id = %s
+"""
+
+SCHEMA_TABLE = """
+CREATE TABLE IF NOT EXISTS change_log (
+    seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+    entity VARCHAR(32) NOT NULL,
+    entity_id INT NOT NULL,
+    op ENUM('upsert', 'delete') NOT NULL,
+    committee_id INT NULL,
+    recorded_at DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+    INDEX idx_change_log_recorded (recorded_at)
+) ENGINE=InnoDB
+"""
+
+
+class ChangeFeed:
+    def __init__(self, query: QueryFn):
+        self.query = query
+        self.counters = {"recorded": 0, "batches": 0, "resets": 0, "pruned": 0}
+
+    async def record(
+        self, entity: str, entity_id: int, op: str = UPSERT, committee_id: Optional[int] = None,
+        query: Optional[QueryFn] = None,
+    ) -> int:
+        """Pass the `query` of the transaction that writes the row, so the entry commits with it"""
+        seq = await (query or self.query)(RECORD_SQL, (entity, entity_id, op, committee_id))
+        self.counters["recorded"] += 1
+        return seq
+
+    async def record_many(self, entity: str, rows: list, op: str = UPSERT, query: Optional[QueryFn] = None):
+        """Record several rows in one insert; `rows` are (entity_id, committee_id) pairs"""
+        if not rows:
+            return
+        values = ", ".join(["(%s, %s, %s, %s)"] * len(rows))
+        params = [value for entity_id, committee_id in rows for value in (entity, entity_id, op, committee_id)]
+        await (query or self.query)(
+            f"INSERT INTO change_log (entity, entity_id, op, committee_id) VALUES {values}", params
+        )
+        self.counters["recorded"] += len(rows)
+
+    async def changes(
+        self,
+        since: Optional[int],
+        visible: Callable[[Optional[int]], bool],
+        limit: int = SYNC_BATCH_SIZE,
+    ) -> dict:
+        """
+        Collapse the next `limit` settled entries after `since` into
+        {"token", "reset", "has_more", "entities": {entity: {"upserts": [ids], "deletes": [ids]}}}.
+        Entries the caller may not see are skipped but still advance the token.
+        `since` is None for a client that has never synced.
+        """
+        bounds = await self.query(
+            "SELECT MIN(seq) AS first_seq, MAX(seq) AS last_seq FROM change_log", fetch_one=True
+        )
+        first_seq, last_seq = bounds["first_seq"], bounds["last_seq"]
+        if last_seq is None:
+            # Nothing recorded yet: token 0 is current, and the first entry will follow it
+            reset = since != 0
+        else:
+            reset = since is None or since < 0 or since > last_seq or since < first_seq - 1
+        if reset:
+            self.counters["resets"] += 1
+            return {"token": last_seq or 0, "reset": True, "has_more": False, "entities": {}}
+        if last_seq is None:
+            return {"token": 0, "reset": False, "has_more": False, "entities": {}}
+
+        rows = await self.query(
+            """
+            SELECT seq, entity, entity_id, op, committee_id FROM change_log
+            WHERE seq > %s AND recorded_at <= NOW(3) - INTERVAL %s MICROSECOND
+            ORDER BY seq LIMIT %s
+            """,
+            (since, SETTLE_MS * 1000, limit), fetch_all=True,
+        )
+        self.counters["batches"] += 1
+
+        latest: dict[tuple[str, int], str] = {}
+        for row in rows:
+            if visible(row["committee_id"]):
+                key = (row["entity"], row["entity_id"])
+                latest.pop(key, None)  # keep first-seen order of the final state
+                latest[key] = row["op"]
+
+        entities: dict[str, dict[str, list]] = {}
+        for (entity, entity_id), op in latest.items():
+            bucket = entities.setdefault(entity, {"upserts": [], "deletes": []})
+            bucket["upserts" if op == UPSERT else "deletes"].append(entity_id)
+        return {
+            "token": rows[-1]["seq"] if rows else since,
+            "reset": False,
+            "has_more": len(rows) == limit,
+            "entities": entities,
+        }
+
+    async def prune(self) -> int:
+        cutoff = await self.query(
+            """
+            SELECT MAX(seq) AS cutoff_seq, (SELECT MAX(seq) FROM change_log) AS last_seq
+            FROM change_log WHERE recorded_at < NOW() - INTERVAL %s DAY
+            """,
+            (RETENTION_DAYS,), fetch_one=True,
+        )
+        if not cutoff or cutoff["cutoff_seq"] is None:
+            return 0
+        # The newest entry is always kept so MIN(seq) keeps marking the retained range
+        cutoff_seq = min(cutoff["cutoff_seq"], cutoff["last_seq"] - 1)
+        counted = await self.query(
+            "SELECT COUNT(*) AS expired FROM change_log WHERE seq <= %s", (cutoff_seq,), fetch_one=True
+        )
+        while True:
+            await self.query(
+                "DELETE FROM change_log WHERE seq <= %s ORDER BY seq LIMIT %s", (cutoff_seq, PRUNE_BATCH_SIZE)
+            )
+            remaining = await self.query(
+                "SELECT MIN(seq) AS first_seq FROM change_log", fetch_one=True
+            )
+            if remaining["first_seq"] is None or remaining["first_seq"] > cutoff_seq:
+                break
+        self.counters["pruned"] += counted["expired"]
+        return counted["expired"]
+
+    async def prune_forever(self):
+        while True:
+            try:
+                await self.prune()
+            except Exception as e:
+                print(f"Change log prune error: {e}")
+            await asyncio.sleep(PRUNE_INTERVAL_SECONDS)
+
+    def stats(self) -> dict:
+        return {"settle_ms": SETTLE_MS, "retention_days": RETENTION_DAYS, **self.counters}
@@ -0,0 +1,101 @@
+"""
+PDF first-page previews and document metadata.
+
+After a PDF is uploaded, a worker process opens it with pypdfium2, reads the
+page count and document title, and renders page one to a WebP preview. The
+result is keyed by the file's SHA-256, so re-uploads of the same document
+(new versions of minutes that did not change, copies attached to several
+meetings) reuse the cached metadata and preview instead of rendering again.
+Previews are content-addressed under "uploads/.previews/<sha256>.webp".
+"""
+
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from process_pool import run_in_process
+from singleflight import SingleFlight
+
+PREVIEW_DIR_NAME = ".previews"
+PREVIEW_WIDTH = int(os.getenv("PDF_PREVIEW_WIDTH", "480"))
+MAX_TITLE_LENGTH = 500
+HASH_BLOCK_SIZE = 1024 * 1024
+
+PDF_MIME_TYPES = {"application/pdf", "application/x-pdf"}
+
+renders = SingleFlight("pdf_previews")
+
+
+@dataclass
+class DocumentInfo:
+    content_sha256: str
+    page_count: Optional[int]
+    title: Optional[str]
+    preview_path: Optional[str]
+
+
+def is_pdf(mime_type: Optional[str]) -> bool:
+    return mime_type in PDF_MIME_TYPES
+
+
+def preview_path_for(upload_dir: Path, content_sha256: str) -> Path:
+    return upload_dir / PREVIEW_DIR_NAME / f"{content_sha256}.webp"
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def analyze_pdf(source: str, preview_path: str, width: int) -> dict:
+    """Read metadata and render page one; runs in a worker process"""
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(source)
+    try:
+        page_count = len(pdf)
+        title = (pdf.get_metadata_dict().get("Title") or "").strip() or None
+        rendered = None
+        if page_count:
+            page = pdf[0]
+            try:
+                scale = width / page.get_width()
+                image = page.render(scale=scale).to_pil()
+            finally:
+                page.close()
+            os.makedirs(os.path.dirname(preview_path), exist_ok=True)
+            tmp_path = f"{preview_path}.{os.getpid()}.tmp"
+            image.save(tmp_path, "WEBP", quality=80)
+            os.replace(tmp_path, preview_path)
+            rendered = preview_path
+    finally:
+        pdf.close()
+
+    return {
+        "page_count": page_count,
+        "title": title[:MAX_TITLE_LENGTH] if title else None,
+        "preview_path": rendered,
+    }
+
+
+async def content_hash(path: Path, known_sha256: Optional[str] = None) -> str:
+    # hashlib releases the GIL on large buffers, so a thread is enough here
+    return known_sha256 or await run_in_threadpool(sha256_file, str(path))
+
+
+async def render_document(path: Path, content_sha256: str, upload_dir: Path) -> DocumentInfo:
+    """Analyze the PDF in the process pool; identical concurrent uploads share one render"""
+    async def render():
+        result = await run_in_process(
+            analyze_pdf, str(path), str(preview_path_for(upload_dir, content_sha256)), PREVIEW_WIDTH
+        )
+        return DocumentInfo(content_sha256=content_sha256, **result)
+
+    return await renders.do(content_sha256, render)
@@ -0,0 +1,271 @@
+"""
+Reconciliation between UPLOAD_DIR and the files table.
+
+Two kinds of drift are repaired in the background:
+
+* orphans: files on disk that no files row points to (transcription audio
+  that was never recorded, rows lost when the table was recreated). They are
+  moved into "uploads/.orphans/<date>/" rather than deleted, and purged from
+  there after a retention period.
+* dangling rows: files rows whose file_path no longer exists. They are
+  flagged with missing_since (and unflagged if the file comes back).
+
+Each tick examines at most `batch_size` directory entries and `batch_size`
+rows, with one set query per batch, so a full pass over a large upload
+directory is spread out instead of hammering the disk and the database.
+"""
+
+import asyncio
+import os
+import shutil
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+QUARANTINE_DIR_NAME = ".orphans"
+VARIANT_DIR_SUFFIX = ".variants"
+GC_BATCH_SIZE = int(os.getenv("FILE_GC_BATCH_SIZE", "200"))
+GC_TICK_SECONDS = float(os.getenv("FILE_GC_TICK_SECONDS", "5"))
+GC_PASS_INTERVAL_SECONDS = int(os.getenv("FILE_GC_PASS_INTERVAL_MINUTES", "60")) * 60
+# Files younger than this may still be between write and INSERT
+ORPHAN_MIN_AGE_SECONDS = int(os.getenv("FILE_GC_MIN_AGE_HOURS", "24")) * 3600
+QUARANTINE_RETENTION_SECONDS = int(os.getenv("FILE_GC_QUARANTINE_DAYS", "30")) * 86400
+RECENT_LIMIT = 100
+
+QueryFn = Callable[..., Awaitable]
+
+
+class _DiskWalk:
+    """Depth-first walk that can be suspended between any two directory entries"""
+
+    def __init__(self, root: str):
+        self.pending = deque([root])
+        self.iterator = None
+
+    @property
+    def done(self) -> bool:
+        return self.iterator is None and not self.pending
+
+    def close(self):
+        if self.iterator is not None:
+            self.iterator.close()
+            self.iterator = None
+        self.pending.clear()
+
+
+def _scan_batch(walk: _DiskWalk, limit: int, min_mtime: float) -> list[tuple[str, str]]:
+    """
+    Advance the walk by up to `limit` directory entries and return orphan
+    candidates as (path, original) pairs: original is the path the files row
+    would hold, which differs from path for derived ".variants" directories.
+    Hidden directories (sessions, previews, quarantine) are never entered.
+    """
+    candidates = []
+    examined = 0
+    while examined < limit:
+        if walk.iterator is None:
+            if not walk.pending:
+                break
+            try:
+                walk.iterator = os.scandir(walk.pending.popleft())
+            except FileNotFoundError:
+                continue
+        entry = next(walk.iterator, None)
+        if entry is None:
+            walk.iterator.close()
+            walk.iterator = None
+            continue
+
+        examined += 1
+        if entry.name.startswith("."):
+            continue
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.endswith(VARIANT_DIR_SUFFIX):
+                    walk.pending.append(entry.path)
+                elif entry.stat(follow_symlinks=False).st_mtime < min_mtime:
+                    candidates.append((entry.path, entry.path[: -len(VARIANT_DIR_SUFFIX)]))
+            elif entry.is_file(follow_symlinks=False):
+                if entry.stat(follow_symlinks=False).st_mtime < min_mtime:
+                    candidates.append((entry.path, entry.path))
+        except FileNotFoundError:
+            continue
+    return candidates
+
+
+def _quarantine(upload_dir: Path, path: str) -> str:
+    relative = os.path.relpath(path, upload_dir)
+    destination = upload_dir / QUARANTINE_DIR_NAME / datetime.now().strftime("%Y%m%d") / relative
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(path, destination)
+    return str(destination)
+
+
+def _purge_quarantine(quarantine_dir: Path, cutoff: float) -> int:
+    removed = 0
+    if not quarantine_dir.is_dir():
+        return 0
+    with os.scandir(quarantine_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+    return removed
+
+
+def _missing_paths(paths: list[str]) -> set[str]:
+    return {path for path in paths if not os.path.exists(path)}
+
+
+class FileReconciler:
+    def __init__(
+        self,
+        upload_dir: Path,
+        query: QueryFn,
+        batch_size: int = GC_BATCH_SIZE,
+        tick_seconds: float = GC_TICK_SECONDS,
+        dry_run: bool = os.getenv("FILE_GC_DRY_RUN", "false").lower() == "true",
+    ):
+        self.upload_dir = upload_dir
+        self.query = query
+        self.batch_size = batch_size
+        self.tick_seconds = tick_seconds
+        self.dry_run = dry_run
+        self._walk: Optional[_DiskWalk] = None
+        self._row_cursor = 0
+        self._rows_done = True
+        self.pass_started_at: Optional[float] = None
+        self.last_pass_completed_at: Optional[float] = None
+        self.passes = 0
+        self.counters = {
+            "candidates_checked": 0,
+            "rows_checked": 0,
+            "orphans_found": 0,
+            "orphans_quarantined": 0,
+            "rows_flagged_missing": 0,
+            "rows_restored": 0,
+            "quarantine_purged": 0,
+        }
+        self.recent_orphans: deque = deque(maxlen=RECENT_LIMIT)
+
+    @property
+    def _disk_done(self) -> bool:
+        return self._walk is None or self._walk.done
+
+    def _start_pass(self):
+        if self._walk is not None:
+            self._walk.close()
+        self._walk = _DiskWalk(str(self.upload_dir))
+        self._row_cursor = 0
+        self._rows_done = False
+        self.pass_started_at = time.time()
+
+    async def _known_paths(self, candidates: list[str]) -> set[str]:
+        # Rows may hold relative or absolute paths depending on who wrote them
+        lookup = {}
+        for path in candidates:
+            lookup[path] = path
+            lookup[os.path.abspath(path)] = path
+        keys = list(lookup)
+        placeholders = ", ".join(["%s"] * len(keys))
+        rows = await self.query(
+            f"SELECT file_path FROM files WHERE file_path IN ({placeholders})",
+            keys, fetch_all=True,
+        )
+        return {lookup[row["file_path"]] for row in rows if row["file_path"] in lookup}
+
+    async def _disk_tick(self):
+        min_mtime = time.time() - ORPHAN_MIN_AGE_SECONDS
+        candidates = await run_in_threadpool(_scan_batch, self._walk, self.batch_size, min_mtime)
+        if not candidates:
+            return
+
+        self.counters["candidates_checked"] += len(candidates)
+        known = await self._known_paths([original for _, original in candidates])
+        for path, original in candidates:
+            if original in known:
+                continue
+            self.counters["orphans_found"] += 1
+            record = {"path": path, "found_at": datetime.now().isoformat(timespec="seconds")}
+            if not self.dry_run:
+                try:
+                    record["quarantined_to"] = await run_in_threadpool(_quarantine, self.upload_dir, path)
+                    self.counters["orphans_quarantined"] += 1
+                except OSError as e:
+                    record["error"] = str(e)
+            self.recent_orphans.append(record)
+
+    async def _rows_tick(self):
+        rows = await self.query(
+            "SELECT id, file_path, missing_since FROM files WHERE id > %s ORDER BY id LIMIT %s",
+            (self._row_cursor, self.batch_size), fetch_all=True,
+        )
+        if len(rows) < self.batch_size:
+            self._rows_done = True
+        if not rows:
+            return
+
+        self._row_cursor = rows[-1]["id"]
+        self.counters["rows_checked"] += len(rows)
+        paths = [row["file_path"] for row in rows if row["file_path"]]
+        missing = await run_in_threadpool(_missing_paths, paths)
+
+        flag = [row["id"] for row in rows if row["file_path"] in missing and row["missing_since"] is None]
+        restore = [row["id"] for row in rows if row["file_path"] not in missing and row["missing_since"] is not None]
+        if flag and not self.dry_run:
+            placeholders = ", ".join(["%s"] * len(flag))
+            await self.query(f"UPDATE files SET missing_since = NOW() WHERE id IN ({placeholders})", flag)
+            self.counters["rows_flagged_missing"] += len(flag)
+        if restore and not self.dry_run:
+            placeholders = ", ".join(["%s"] * len(restore))
+            await self.query(f"UPDATE files SET missing_since = NULL WHERE id IN ({placeholders})", restore)
+            self.counters["rows_restored"] += len(restore)
+
+    async def tick(self) -> bool:
+        """Do one bounded unit of work; returns True while a pass is in progress"""
+        if self._disk_done and self._rows_done:
+            return False
+        if not self._disk_done:
+            await self._disk_tick()
+        if not self._rows_done:
+            await self._rows_tick()
+        if self._disk_done and self._rows_done:
+            self.passes += 1
+            self.last_pass_completed_at = time.time()
+            if not self.dry_run:
+                self.counters["quarantine_purged"] += await run_in_threadpool(
+                    _purge_quarantine,
+                    self.upload_dir / QUARANTINE_DIR_NAME,
+                    time.time() - QUARANTINE_RETENTION_SECONDS,
+                )
+        return True
+
+    async def run_forever(self, pass_interval: float = GC_PASS_INTERVAL_SECONDS):
+        while True:
+            self._start_pass()
+            try:
+                while await self.tick():
+                    await asyncio.sleep(self.tick_seconds)
+            except Exception as e:
+                print(f"File reconciliation error: {e}")
+            await asyncio.sleep(pass_interval)
+
+    def report(self) -> dict:
+        in_progress = not (self._disk_done and self._rows_done)
+        return {
+            "dry_run": self.dry_run,
+            "in_progress": in_progress,
+            "passes_completed": self.passes,
+            "pass_started_at": self.pass_started_at,
+            "last_pass_completed_at": self.last_pass_completed_at,
+            "pending_directories": len(self._walk.pending) if self._walk else 0,
+            "row_cursor": self._row_cursor,
+            "batch_size": self.batch_size,
+            "tick_seconds": self.tick_seconds,
+            **self.counters,
+            "recent_orphans": list(self.recent_orphans),
+        }
@@ -0,0 +1,229 @@
+"""
+Content-addressed storage for library document bodies.
+
+Bodies live in `library_text`, keyed by the SHA-256 of the text, and the
+library row only keeps `content_sha256`. Metadata scans (lists, facets)
+therefore never pull document text through the buffer pool, and identical
+bodies (re-uploaded documents, copies filed under another category) are
+stored once. Since a hash always names the same text, bodies are kept in a
+small LRU cache without any invalidation.
+
+Each body is stored exactly once, as plain text, so that it can carry a
+FULLTEXT index for `search=`. Compression is left to InnoDB: the table uses
+ROW_FORMAT=COMPRESSED, which keeps pages compressed on disk and in the
+buffer pool, where application-side compression would have hidden the text
+from the index.
+
+Rows written before this existed still hold their text inline; they are moved
+over in batches at startup, and reads fall back to the inline column until
+then. Bodies from the earlier zstd/zlib-compressed `library_bodies` table are
+decoded into `library_text` at startup and that table is dropped once empty.
+"""
+
+import hashlib
+import os
+import zlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import zstandard
+except ImportError:  # optional; only needed to move zstd bodies out of library_bodies
+    zstandard = None
+
+RAW = "raw"
+ZSTD = "zst"
+ZLIB = "zlib"
+KEY_BLOCK_SIZE = 8
+# Decoding below this size is cheaper than a threadpool hop
+INLINE_CODEC_BYTES = 64 * 1024
+MIGRATION_BATCH_SIZE = 200
+CACHE_BYTES = int(os.getenv("LIBRARY_BODY_CACHE_MB", "32")) * 1024 * 1024
+
+QueryFn = Callable[..., Awaitable]
+
+SCHEMA_TABLES = [
+    f"""
+    CREATE TABLE IF NOT EXISTS library_text (
+        content_sha256 CHAR(64) PRIMARY KEY,
+        body LONGTEXT NOT NULL,
+        FULLTEXT KEY ft_library_text_body (body)
+    ) ENGINE=InnoDB ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE={KEY_BLOCK_SIZE}
+      DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+]
+
+SCHEMA_COLUMNS = [
+    ("library", "content_sha256", "CHAR(64) NULL, ADD INDEX idx_library_content_sha256 (content_sha256)"),
+]
+
+# For library_text tables created before the index was part of the definition
+SCHEMA_INDEX = ("library_text", "ft_library_text_body", "FULLTEXT KEY ft_library_text_body (body)")
+
+# Matches documents whose stored body contains the search words; MATCH is
+# evaluated once through the FULLTEXT index rather than per library row
+SEARCH_CONDITION = (
+    "{alias}.content_sha256 IN (SELECT content_sha256 FROM library_text"
+    " WHERE MATCH(body) AGAINST (%s IN NATURAL LANGUAGE MODE))"
+)
+
+
+def digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def decode(codec: str, body: bytes) -> str:
+    """Decode a body from the earlier library_bodies table"""
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed library bodies")
+        data = zstandard.ZstdDecompressor().decompress(body)
+    elif codec == ZLIB:
+        data = zlib.decompress(body)
+    else:
+        data = body
+    return data.decode("utf-8")
+
+
+class LibraryBodies:
+    def __init__(self, query: QueryFn, cache_bytes: int = CACHE_BYTES):
+        self.query = query
+        self.cache_bytes = cache_bytes
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._cached_bytes = 0
+        self.counters = {
+            "stored": 0, "deduplicated": 0, "loaded": 0, "cache_hits": 0, "migrated": 0, "decompressed": 0,
+        }
+
+    def _remember(self, sha: str, text: str):
+        size = len(text)
+        if size > self.cache_bytes:
+            return
+        if sha in self._cache:
+            self._cache.move_to_end(sha)
+            return
+        self._cache[sha] = text
+        self._cached_bytes += size
+        while self._cached_bytes > self.cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= len(evicted)
+
+    async def put(self, text: str) -> str:
+        """Store a body (once per distinct text) and return its hash"""
+        sha = digest(text)
+        if sha in self._cache:
+            # Cached hashes are known to be stored already
+            self._cache.move_to_end(sha)
+            self.counters["deduplicated"] += 1
+            return sha
+        await self.query("INSERT IGNORE INTO library_text (content_sha256, body) VALUES (%s, %s)", (sha, text))
+        self.counters["stored"] += 1
+        self._remember(sha, text)
+        return sha
+
+    async def get(self, sha: str) -> Optional[str]:
+        text = self._cache.get(sha)
+        if text is not None:
+            self._cache.move_to_end(sha)
+            self.counters["cache_hits"] += 1
+            return text
+        row = await self.query("SELECT body FROM library_text WHERE content_sha256 = %s", (sha,), fetch_one=True)
+        if not row:
+            return None
+        text = row["body"]
+        self.counters["loaded"] += 1
+        self._remember(sha, text)
+        return text
+
+    async def compress_table(self) -> bool:
+        """Rebuild a library_text table created without page compression; returns whether it ran"""
+        row = await self.query(
+            """
+            SELECT row_format AS row_format FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name = 'library_text'
+            """,
+            fetch_one=True,
+        )
+        if not row or row["row_format"].lower() == "compressed":
+            return False
+        await self.query(f"ALTER TABLE library_text ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE={KEY_BLOCK_SIZE}")
+        return True
+
+    async def migrate_inline(self, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+        """Move inline bodies into the store; returns the number of rows moved"""
+        moved = 0
+        while True:
+            rows = await self.query(
+                "SELECT id, content FROM library WHERE content_sha256 IS NULL ORDER BY id LIMIT %s",
+                (batch_size,), fetch_all=True,
+            )
+            for row in rows:
+                sha = await self.put(row["content"] or "")
+                await self.query(
+                    "UPDATE library SET content_sha256 = %s, content = '' WHERE id = %s AND content_sha256 IS NULL",
+                    (sha, row["id"]),
+                )
+            moved += len(rows)
+            self.counters["migrated"] += len(rows)
+            if len(rows) < batch_size:
+                return moved
+
+    async def migrate_compressed(self, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+        """Move bodies out of the earlier library_bodies table; returns the number moved"""
+        exists = await self.query(
+            """
+            SELECT 1 FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name = 'library_bodies'
+            """,
+            fetch_one=True,
+        )
+        if not exists:
+            return 0
+        moved = 0
+        while True:
+            rows = await self.query(
+                "SELECT content_sha256, codec, size, body FROM library_bodies LIMIT %s",
+                (batch_size,), fetch_all=True,
+            )
+            for row in rows:
+                if row["size"] > INLINE_CODEC_BYTES:
+                    text = await run_in_threadpool(decode, row["codec"], row["body"])
+                else:
+                    text = decode(row["codec"], row["body"])
+                await self.query(
+                    "INSERT IGNORE INTO library_text (content_sha256, body) VALUES (%s, %s)",
+                    (row["content_sha256"], text),
+                )
+                await self.query("DELETE FROM library_bodies WHERE content_sha256 = %s", (row["content_sha256"],))
+            moved += len(rows)
+            self.counters["decompressed"] += len(rows)
+            if len(rows) < batch_size:
+                break
+        await self.query("DROP TABLE IF EXISTS library_bodies")
+        return moved
+
+    async def stats(self) -> dict:
+        # On-disk size as InnoDB reports it, in compressed pages; summing
+        # LENGTH(body) would read every body
+        storage = await self.query(
+            """
+            SELECT COALESCE(data_length, 0) AS stored_bytes, COALESCE(index_length, 0) AS index_bytes
+            FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_name = 'library_text'
+            """,
+            fetch_one=True,
+        )
+        bodies = await self.query("SELECT COUNT(*) AS bodies FROM library_text", fetch_one=True)
+        references = await self.query(
+            "SELECT COUNT(*) AS documents FROM library WHERE content_sha256 IS NOT NULL", fetch_one=True
+        )
+        return {
+            **bodies,
+            **(storage or {"stored_bytes": 0, "index_bytes": 0}),
+            **references,
+            "cached_bodies": len(self._cache),
+            "cached_bytes": self._cached_bytes,
+            **self.counters,
+        }
@@ -0,0 +1,530 @@
+"""
+Live meeting sessions.
+
+While a meeting runs the chair takes up its agenda items one at a time
+(pending -> in_progress -> completed or deferred; a deferred item may be
+taken up again later), keeps the time spent on each against its
+estimated_duration and gives the floor to members from a speaker queue. The
+queue belongs to the item under discussion and is cleared when the item is
+closed. Instead of a write and a re-read per action, each running meeting is
+a state machine held in memory, and it is the authority until the session
+ends: reading it is a dictionary lookup.
+
+Every action is a command {seq, at, op, ...}. It is applied to a copy of the
+session, appended to the meeting's write-ahead log
+(`<LIVE_SESSION_DIR>/meeting-<id>.wal`, one JSON line, fsynced) and only
+then swapped in, so readers never see a state that is not logged. Commands
+carry their own timestamp and the start command carries the agenda, so
+replaying a log reproduces the session exactly.
+
+The session is snapshotted to `live_sessions` when it changed, every
+LIVE_SESSION_SNAPSHOT_SECONDS and straight after an agenda item changes
+status; the same transaction brings `agenda_items.status` up to date and
+marks the meeting in_progress, then completed when the session ends. Log lines
+covered by a snapshot are then dropped, keeping the start command. At
+startup running sessions are recovered from their snapshot plus the log
+lines after it (a torn last line is ignored); a log whose start command is
+newer than the snapshot is replayed from the start.
+
+Sessions live in one process, so live sessions need a single worker.
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncContextManager, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from vote_ingest import CLOSED_STATUSES
+
+SESSION_DIR = Path(os.getenv("LIVE_SESSION_DIR", "live_sessions"))
+SNAPSHOT_SECONDS = float(os.getenv("LIVE_SESSION_SNAPSHOT_SECONDS", "5"))
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+DEFERRED = "deferred"
+
+QueryFn = Callable[..., Awaitable]
+TransactionFn = Callable[[], AsyncContextManager[QueryFn]]
+SnapshotHook = Callable[["LiveSession", dict, Optional[str]], Awaitable]
+TransactionHook = Callable[[QueryFn, "LiveSession", dict, Optional[str]], Awaitable]
+
+SCHEMA_TABLE = """
+CREATE TABLE IF NOT EXISTS live_sessions (
+    meeting_id INT PRIMARY KEY,
+    seq INT NOT NULL,
+    state JSON NOT NULL,
+    started_at DATETIME NOT NULL,
+    ended_at DATETIME NULL,
+    snapshot_at DATETIME(3) NOT NULL,
+    FOREIGN KEY (meeting_id) REFERENCES meetings(id) ON DELETE CASCADE
+) ENGINE=InnoDB
+"""
+
+
+@dataclass
+class LiveSession:
+    meeting_id: int
+    committee_id: Optional[int]
+    started_at: float
+    seq: int = 0
+    ended_at: Optional[float] = None
+    current_item_id: Optional[int] = None
+    items: list = field(default_factory=list)  # agenda item dicts in order
+    speakers: list = field(default_factory=list)  # queued {"user_id", "requested_at"}
+    speaker: Optional[dict] = None  # {"user_id", "since"}
+
+    def copy(self) -> "LiveSession":
+        return replace(self, items=[dict(item) for item in self.items], speakers=list(self.speakers))
+
+    def item(self, item_id: int) -> dict:
+        for item in self.items:
+            if item["id"] == item_id:
+                return item
+        raise HTTPException(status_code=404, detail="Agenda item not found in this meeting")
+
+
+# -----------------------------------------------------------------------------
+# Commands
+# -----------------------------------------------------------------------------
+
+def start(command: dict) -> LiveSession:
+    items = [
+        {**item, "status": item["status"] or PENDING, "elapsed": 0.0, "started_at": None}
+        for item in command["items"]
+    ]
+    return LiveSession(
+        command["meeting_id"], command["committee_id"], command["at"], seq=command["seq"], items=items
+    )
+
+
+def _start_item(session: LiveSession, command: dict):
+    item = session.item(command["agenda_item_id"])
+    if session.current_item_id is not None:
+        raise HTTPException(status_code=409, detail=f"Agenda item {session.current_item_id} is in progress")
+    if item["status"] not in (PENDING, DEFERRED):
+        raise HTTPException(status_code=409, detail=f"Agenda item is {item['status']}")
+    item["status"] = IN_PROGRESS
+    item["started_at"] = command["at"]
+    session.current_item_id = item["id"]
+
+
+def _close_item(status: str):
+    def close(session: LiveSession, command: dict):
+        item = session.item(command["agenda_item_id"])
+        if item["id"] != session.current_item_id:
+            raise HTTPException(status_code=409, detail="Agenda item is not in progress")
+        item["elapsed"] += command["at"] - item["started_at"]
+        item["started_at"] = None
+        item["status"] = status
+        session.current_item_id = None
+        session.speakers = []
+        session.speaker = None
+    return close
+
+
+def _request_floor(session: LiveSession, command: dict):
+    user_id = command["user_id"]
+    if session.current_item_id is None:
+        raise HTTPException(status_code=409, detail="No agenda item is in progress")
+    if any(entry["user_id"] == user_id for entry in session.speakers) or (
+        session.speaker and session.speaker["user_id"] == user_id
+    ):
+        raise HTTPException(status_code=409, detail="Already in the speaker queue")
+    session.speakers.append({"user_id": user_id, "requested_at": command["at"]})
+
+
+def _withdraw(session: LiveSession, command: dict):
+    remaining = [entry for entry in session.speakers if entry["user_id"] != command["user_id"]]
+    if len(remaining) == len(session.speakers):
+        raise HTTPException(status_code=404, detail="Not in the speaker queue")
+    session.speakers = remaining
+
+
+def _next_speaker(session: LiveSession, command: dict):
+    if session.speakers:
+        session.speaker = {"user_id": session.speakers[0]["user_id"], "since": command["at"]}
+        session.speakers = session.speakers[1:]
+    else:
+        session.speaker = None
+
+
+def _end(session: LiveSession, command: dict):
+    if session.current_item_id is not None:
+        raise HTTPException(status_code=409, detail=f"Agenda item {session.current_item_id} is in progress")
+    session.ended_at = command["at"]
+
+
+OPERATIONS = {
+    "start_item": _start_item,
+    "complete_item": _close_item(COMPLETED),
+    "defer_item": _close_item(DEFERRED),
+    "request_floor": _request_floor,
+    "withdraw": _withdraw,
+    "next_speaker": _next_speaker,
+    "end": _end,
+}
+# Commands that change agenda_items.status and are snapshotted straight away
+TRANSITIONS = {"start_item", "complete_item", "defer_item", "end"}
+
+
+def apply(session: LiveSession, command: dict) -> LiveSession:
+    """The session after `command`; `session` itself is left untouched"""
+    updated = session.copy()
+    OPERATIONS[command["op"]](updated, command)
+    updated.seq = command["seq"]
+    return updated
+
+
+def view(session: LiveSession, now: Optional[float] = None) -> dict:
+    """The session as clients see it, with running clocks evaluated at `now`"""
+    now = session.ended_at or now or time.time()
+    items = []
+    for item in session.items:
+        elapsed = item["elapsed"] + (now - item["started_at"] if item["started_at"] is not None else 0.0)
+        estimated = item["estimated_duration"] * 60 if item["estimated_duration"] else None
+        items.append({
+            "id": item["id"],
+            "order_index": item["order_index"],
+            "title": item["title"],
+            "status": item["status"],
+            "estimated_duration": item["estimated_duration"],
+            "elapsed_seconds": round(elapsed, 1),
+            "remaining_seconds": round(estimated - elapsed, 1) if estimated is not None else None,
+            "overrun": estimated is not None and elapsed > estimated,
+        })
+    speaker = None
+    if session.speaker:
+        speaker = {**session.speaker, "speaking_seconds": round(now - session.speaker["since"], 1)}
+    return {
+        "meeting_id": session.meeting_id,
+        "committee_id": session.committee_id,
+        "seq": session.seq,
+        "running": session.ended_at is None,
+        "started_at": str(datetime.fromtimestamp(session.started_at)),
+        "ended_at": str(datetime.fromtimestamp(session.ended_at)) if session.ended_at else None,
+        "elapsed_seconds": round(now - session.started_at, 1),
+        "current_item_id": session.current_item_id,
+        "items": items,
+        "speaker": speaker,
+        "speaker_queue": [entry["user_id"] for entry in session.speakers],
+    }
+
+
+# -----------------------------------------------------------------------------
+# Write-ahead log files
+# -----------------------------------------------------------------------------
+
+def append_line(path: Path, line: bytes):
+    with open(path, "ab") as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_lines(path: Path, lines: list):
+    temporary = path.with_suffix(".tmp")
+    with open(temporary, "wb") as f:
+        f.write(b"".join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def read_log(path: Path) -> list:
+    commands = []
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return commands
+    for line in data.splitlines(keepends=True):
+        if not line.endswith(b"\n"):
+            break  # torn last line
+        try:
+            commands.append(json.loads(line))
+        except ValueError:
+            break
+    return commands
+
+
+def _encode(command: dict) -> bytes:
+    return json.dumps(command, separators=(",", ":")).encode() + b"\n"
+
+
+def _timestamp(seconds: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(seconds) if seconds is not None else None
+
+
+@asynccontextmanager
+async def _statements(query: QueryFn):
+    # Without a transaction factory each statement commits on its own
+    yield query
+
+
+class LiveSessions:
+    def __init__(self, query: QueryFn, root: Path = SESSION_DIR, transaction: Optional[TransactionFn] = None,
+                 in_transaction: Optional[TransactionHook] = None, on_snapshot: Optional[SnapshotHook] = None,
+                 interval: float = SNAPSHOT_SECONDS):
+        self.query = query
+        self.root = root
+        # A snapshot's writes, and whatever `in_transaction` adds, commit together when this is given
+        self.transaction = transaction or (lambda: _statements(query))
+        self.in_transaction = in_transaction
+        self.on_snapshot = on_snapshot
+        self.interval = interval
+        self.sessions: dict[int, LiveSession] = {}
+        self._log: dict[int, list] = {}  # meeting_id -> [start command, commands since the last snapshot]
+        self._persisted: dict[int, tuple[int, dict]] = {}  # meeting_id -> (seq, {item id: status})
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._snapshot_locks: dict[int, asyncio.Lock] = {}
+        self._urgent: set[int] = set()
+        self._wakeup = asyncio.Event()
+        self.counters = {"commands": 0, "snapshots": 0, "recovered": 0, "replayed": 0, "errors": 0}
+
+    def _path(self, meeting_id: int) -> Path:
+        return self.root / f"meeting-{meeting_id}.wal"
+
+    def _lock(self, meeting_id: int) -> asyncio.Lock:
+        return self._locks.setdefault(meeting_id, asyncio.Lock())
+
+    def get(self, meeting_id: int) -> Optional[LiveSession]:
+        return self.sessions.get(meeting_id)
+
+    def running(self, meeting_id: int) -> LiveSession:
+        session = self.sessions.get(meeting_id)
+        if session is None or session.ended_at is not None:
+            raise HTTPException(status_code=404, detail="No live session for this meeting")
+        return session
+
+    async def last_snapshot(self, meeting_id: int) -> Optional[LiveSession]:
+        """The session of a meeting that is not running here, as last snapshotted"""
+        row = await self.query(
+            "SELECT state FROM live_sessions WHERE meeting_id = %s", (meeting_id,), fetch_one=True
+        )
+        return LiveSession(**json.loads(row["state"])) if row else None
+
+    # -------------------------------------------------------------------------
+    # Commands
+    # -------------------------------------------------------------------------
+
+    async def start(self, meeting_id: int, committee_id: Optional[int]) -> LiveSession:
+        async with self._lock(meeting_id):
+            session = self.sessions.get(meeting_id)
+            if session is not None and session.ended_at is None:
+                raise HTTPException(status_code=409, detail="The session is already running")
+            # Running a session would set the meeting in progress again and reopen voting,
+            # possibly after its ballots were archived
+            meeting = await self.query(
+                "SELECT status FROM meetings WHERE id = %s", (meeting_id,), fetch_one=True
+            )
+            if meeting is None:
+                raise HTTPException(status_code=404, detail="Meeting not found")
+            if meeting["status"] in CLOSED_STATUSES:
+                raise HTTPException(status_code=409, detail=f"The meeting is {meeting['status']}")
+            items = await self.query(
+                """
+                SELECT id, order_index, title, estimated_duration, status
+                FROM agenda_items WHERE meeting_id = %s ORDER BY order_index, id
+                """,
+                (meeting_id,), fetch_all=True,
+            )
+            command = {
+                "seq": 1, "at": round(time.time(), 3), "op": "start",
+                "meeting_id": meeting_id, "committee_id": committee_id, "items": items,
+            }
+            session = start(command)
+            line = _encode(command)
+            # A new run starts a new log
+            await run_in_threadpool(self.root.mkdir, parents=True, exist_ok=True)
+            await run_in_threadpool(write_lines, self._path(meeting_id), [line])
+            self._log[meeting_id] = [(command["seq"], line)]
+            self._persisted[meeting_id] = (0, {item["id"]: item["status"] for item in items})
+            self.sessions[meeting_id] = session
+            self.counters["commands"] += 1
+        self._schedule(meeting_id, urgent=True)
+        return session
+
+    async def execute(self, meeting_id: int, op: str, **arguments) -> LiveSession:
+        async with self._lock(meeting_id):
+            session = self.running(meeting_id)
+            command = {"seq": session.seq + 1, "at": round(time.time(), 3), "op": op, **arguments}
+            updated = apply(session, command)
+            line = _encode(command)
+            await run_in_threadpool(append_line, self._path(meeting_id), line)
+            self._log[meeting_id].append((command["seq"], line))
+            self.sessions[meeting_id] = updated
+            self.counters["commands"] += 1
+        self._schedule(meeting_id, urgent=op in TRANSITIONS)
+        return updated
+
+    # -------------------------------------------------------------------------
+    # Snapshots
+    # -------------------------------------------------------------------------
+
+    def _schedule(self, meeting_id: int, urgent: bool):
+        if urgent:
+            self._urgent.add(meeting_id)
+            self._wakeup.set()
+
+    async def snapshot(self, meeting_id: int):
+        async with self._snapshot_locks.setdefault(meeting_id, asyncio.Lock()):
+            session = self.sessions.get(meeting_id)
+            persisted_seq, persisted_statuses = self._persisted.get(meeting_id, (0, {}))
+            if session is None or session.seq == persisted_seq:
+                return
+            statuses = {item["id"]: item["status"] for item in session.items}
+            changed = {item_id: status for item_id, status in statuses.items()
+                       if persisted_statuses.get(item_id) != status}
+            meeting_status = None
+            if session.ended_at is not None or persisted_seq == 0:
+                meeting_status = COMPLETED if session.ended_at is not None else IN_PROGRESS
+            async with self.transaction() as query:
+                await query(
+                    """
+                    INSERT INTO live_sessions (meeting_id, seq, state, started_at, ended_at, snapshot_at)
+                    VALUES (%s, %s, %s, %s, %s, NOW(3))
+                    ON DUPLICATE KEY UPDATE seq = VALUES(seq), state = VALUES(state), started_at = VALUES(started_at),
+                        ended_at = VALUES(ended_at), snapshot_at = VALUES(snapshot_at)
+                    """,
+                    (meeting_id, session.seq, json.dumps(asdict(session)),
+                     _timestamp(session.started_at), _timestamp(session.ended_at)),
+                )
+                if changed:
+                    whens = " ".join(["WHEN %s THEN %s"] * len(changed))
+                    placeholders = ", ".join(["%s"] * len(changed))
+                    await query(
+                        f"UPDATE agenda_items SET status = CASE id {whens} END WHERE id IN ({placeholders})",
+                        [value for item in changed.items() for value in item] + list(changed),
+                    )
+                if meeting_status:
+                    # A meeting closed by other means while the session ran stays closed
+                    await query(
+                        f"UPDATE meetings SET status = %s WHERE id = %s "
+                        f"AND status NOT IN ({', '.join(['%s'] * len(CLOSED_STATUSES))})",
+                        (meeting_status, meeting_id, *CLOSED_STATUSES),
+                    )
+                if self.in_transaction and (changed or meeting_status):
+                    await self.in_transaction(query, session, changed, meeting_status)
+            self.counters["snapshots"] += 1
+            await self._truncate(meeting_id, session, statuses)
+        if self.on_snapshot and (changed or meeting_status):
+            await self.on_snapshot(session, changed, meeting_status)
+
+    async def _truncate(self, meeting_id: int, session: LiveSession, statuses: dict):
+        """Drop what the snapshot of `session` covers, unless a new run has started since"""
+        async with self._lock(meeting_id):
+            current = self.sessions.get(meeting_id)
+            if current is None or current.started_at != session.started_at:
+                return
+            if session.ended_at is not None:
+                del self.sessions[meeting_id]
+                self._log.pop(meeting_id, None)
+                self._persisted.pop(meeting_id, None)
+                await run_in_threadpool(self._path(meeting_id).unlink, missing_ok=True)
+                return
+            self._persisted[meeting_id] = (session.seq, statuses)
+            log = self._log[meeting_id]
+            kept = log[:1] + [entry for entry in log[1:] if entry[0] > session.seq]
+            if len(kept) < len(log):
+                await run_in_threadpool(write_lines, self._path(meeting_id), [line for _, line in kept])
+                self._log[meeting_id] = kept
+
+    async def snapshot_all(self, meeting_ids) -> int:
+        count = 0
+        for meeting_id in list(meeting_ids):
+            try:
+                await self.snapshot(meeting_id)
+                count += 1
+            except Exception as e:
+                # The log still has everything, so the next pass retries
+                self.counters["errors"] += 1
+                print(f"Live session snapshot failed for meeting {meeting_id}: {e}")
+        return count
+
+    async def run_forever(self):
+        deadline = time.monotonic() + self.interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                if time.monotonic() >= deadline:
+                    self._urgent.clear()
+                    await self.snapshot_all(self.sessions)
+                    deadline = time.monotonic() + self.interval
+                else:
+                    urgent, self._urgent = self._urgent, set()
+                    await self.snapshot_all(urgent)
+            except Exception as e:
+                print(f"Live session snapshotter error: {e}")
+
+    async def close(self):
+        await self.snapshot_all(self.sessions)
+
+    # -------------------------------------------------------------------------
+    # Recovery
+    # -------------------------------------------------------------------------
+
+    async def recover(self) -> int:
+        """Rebuild running sessions from their snapshots and logs"""
+        rows = await self.query(
+            "SELECT meeting_id, state FROM live_sessions WHERE ended_at IS NULL", fetch_all=True
+        )
+        snapshots = {row["meeting_id"]: LiveSession(**json.loads(row["state"])) for row in rows}
+        logged = {}
+        if self.root.is_dir():
+            for path in self.root.glob("meeting-*.wal"):
+                meeting_id = path.stem.split("-", 1)[1]
+                if meeting_id.isdigit():
+                    logged[int(meeting_id)] = await run_in_threadpool(read_log, path)
+
+        for meeting_id in set(snapshots) | set(logged):
+            commands = logged.get(meeting_id, [])
+            session = snapshots.get(meeting_id)
+            if commands and commands[0]["op"] == "start" and (
+                session is None or session.started_at != commands[0]["at"]
+            ):
+                # No snapshot of this run yet; the statuses it started from are in the database
+                session = start(commands[0])
+                persisted = (0, {item["id"]: item["status"] for item in session.items})
+            elif session is not None:
+                persisted = (session.seq, {item["id"]: item["status"] for item in session.items})
+            else:
+                continue
+            for command in commands[1:]:
+                if command["seq"] <= session.seq:
+                    continue
+                try:
+                    session = apply(session, command)
+                except HTTPException as e:
+                    print(f"Live session log for meeting {meeting_id} stops at seq {command['seq']}: {e.detail}")
+                    break
+                self.counters["replayed"] += 1
+            self.sessions[meeting_id] = session
+            self._log[meeting_id] = [(command["seq"], _encode(command)) for command in commands
+                                     if command["op"] == "start" or command["seq"] > persisted[0]]
+            self._persisted[meeting_id] = persisted
+            self.counters["recovered"] += 1
+        # Sessions replayed past their snapshot, or ended before it was written, are snapshotted now
+        self._urgent.update(self.sessions)
+        self._wakeup.set()
+        return len(self.sessions)
+
+    def stats(self) -> dict:
+        return {
+            "directory": str(self.root),
+            "running": sum(1 for session in self.sessions.values() if session.ended_at is None),
+            "log_lines": sum(len(log) for log in self._log.values()),
+            "snapshot_seconds": self.interval,
+            **self.counters,
+        }
@@ -0,0 +1,221 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A heartbeat task measures how late the event loop wakes it up and records the
+lag in a histogram. A watchdog thread checks the heartbeat; when the loop has
+been stuck for longer than the threshold it captures the loop thread's stack,
+which shows the coroutine (and the blocking call inside it) holding the loop.
+
+Setting LOOP_BLOCK_FAIL_MS turns on test mode: any request whose endpoint
+blocks the loop for longer than that raises EventLoopBlockedError, which
+surfaces as a failure in tests using Starlette's TestClient.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50")) / 1000
+BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000
+BLOCK_FAIL_MS = float(os.getenv("LOOP_BLOCK_FAIL_MS", "0"))
+
+# Upper bounds of the lag histogram buckets, in milliseconds
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class EventLoopBlockedError(RuntimeError):
+    pass
+
+
+@dataclass
+class BlockedCall:
+    sequence: int
+    started: float
+    stack: list[str]
+    code_objects: set = field(default_factory=set, repr=False)
+    duration: Optional[float] = None
+    endpoint: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "sequence": self.sequence,
+            "duration_ms": round(self.duration * 1000, 1) if self.duration is not None else None,
+            "endpoint": self.endpoint,
+            "stack": self.stack,
+        }
+
+
+class LagHistogram:
+    def __init__(self, buckets_ms=LAG_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, lag_ms: float):
+        for i, bound in enumerate(self.buckets_ms):
+            if lag_ms <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total_ms += lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+
+    def as_dict(self) -> dict:
+        buckets = {f"le_{bound}ms": n for bound, n in zip(self.buckets_ms, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets": buckets,
+        }
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        interval: float = LAG_INTERVAL,
+        threshold: float = BLOCK_THRESHOLD,
+        history: int = 50,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.histogram = LagHistogram()
+        self.stalls: deque[BlockedCall] = deque(maxlen=history)
+        self.stall_count = 0
+        self._heartbeat = time.monotonic()
+        self._pending: Optional[BlockedCall] = None
+        self._lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.histogram.observe(max(0.0, now - expected) * 1000)
+            self._heartbeat = now
+            self.finish_pending()
+
+    def _watch(self):
+        poll = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(poll):
+            expected = self._heartbeat + self.interval
+            if time.monotonic() - expected < self.threshold:
+                continue
+            with self._lock:
+                if self._pending is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                code_objects = set()
+                walker = frame
+                while walker is not None:
+                    code_objects.add(walker.f_code)
+                    walker = walker.f_back
+                self.stall_count += 1
+                self._pending = BlockedCall(
+                    sequence=self.stall_count,
+                    started=expected,
+                    stack=traceback.format_stack(frame),
+                    code_objects=code_objects,
+                )
+
+    def finish_pending(self):
+        """Close the stall in progress, if any, now that the loop is running again"""
+        with self._lock:
+            stall = self._pending
+            if stall is None:
+                return
+            self._pending = None
+        stall.duration = time.monotonic() - stall.started
+        self.stalls.append(stall)
+
+    def stalls_since(self, sequence: int, endpoint) -> list[BlockedCall]:
+        """Stalls recorded after `sequence` whose captured stack ran through `endpoint`"""
+        self.finish_pending()
+        code = getattr(endpoint, "__code__", None)
+        return [
+            stall for stall in self.stalls
+            if stall.sequence > sequence and (code is None or code in stall.code_objects)
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "lag": self.histogram.as_dict(),
+            "stall_count": self.stall_count,
+            "recent_stalls": [stall.as_dict() for stall in self.stalls],
+        }
+
+
+loop_monitor = LoopMonitor(
+    threshold=min(BLOCK_THRESHOLD, BLOCK_FAIL_MS / 1000) if BLOCK_FAIL_MS else BLOCK_THRESHOLD
+)
+
+
+class LoopBlockMiddleware:
+    """Attributes captured stalls to endpoints and enforces LOOP_BLOCK_FAIL_MS in test mode"""
+
+    def __init__(self, app, monitor: LoopMonitor = loop_monitor, fail_ms: float = BLOCK_FAIL_MS):
+        self.app = app
+        self.monitor = monitor
+        self.fail_ms = fail_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sequence = self.monitor.stall_count
+        await self.app(scope, receive, send)
+
+        endpoint = scope.get("endpoint")
+        if endpoint is None or self.monitor.stall_count == sequence:
+            return
+        stalls = self.monitor.stalls_since(sequence, endpoint)
+        for stall in stalls:
+            stall.endpoint = f"{scope['method']} {scope['path']}"
+
+        if self.fail_ms:
+            worst = max((stall.duration or 0.0 for stall in stalls), default=0.0) * 1000
+            if worst > self.fail_ms:
+                raise EventLoopBlockedError(
+                    f"{scope['method']} {scope['path']} blocked the event loop for "
+                    f"{worst:.0f} ms (limit {self.fail_ms:.0f} ms):\n" + "".join(stalls[-1].stack)
+                )
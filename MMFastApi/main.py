@@ -1,22 +1,30 @@
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File as FastAPIFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 import os
 import shutil
 import uuid
 import json
 from pathlib import Path
 from database import get_db, engine
-from models import Base, User, Meeting, Committee, Vote, File, Task, Comment, Announcement
+from loop_monitor import loop_monitor, LoopBlockMiddleware
+from signed_urls import signed_download_url, verify_download
+from sendfile_response import SendfileResponse, open_files
+from auth import (
+    CurrentUser, get_current_user, hash_password, verify_password,
+    password_needs_rehash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+)
+from authorization import ADMIN_ROLE
+from models import Base, User, Role, UserRole, Meeting, Committee, Vote, File, Task, Comment, Announcement
 from schemas import (
     UserCreate, UserResponse, MeetingCreate, MeetingResponse,
     CommitteeCreate, CommitteeResponse, VoteCreate, VoteResponse,
     FileCreate, FileResponse, FileUpload, TaskCreate, TaskResponse,
-    CommentCreate, CommentResponse, AnnouncementCreate, AnnouncementResponse
+    CommentCreate, CommentResponse, AnnouncementCreate, AnnouncementResponse,
+    LoginRequest, TokenResponse
 )
 import uvicorn
 
@@ -24,6 +32,7 @@ import uvicorn
 async def lifespan(app: FastAPI):
     # Startup
     print("Starting up FastAPI server...")
+    loop_monitor.start()
     try:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
@@ -33,16 +42,17 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown
     print("Shutting down FastAPI server...")
+    await loop_monitor.stop()
 
 app = FastAPI(title="Meetings Management API", version="1.0.0", lifespan=lifespan)
 
+# Attribute event-loop stalls to endpoints (and fail requests in LOOP_BLOCK_FAIL_MS test mode)
+app.add_middleware(LoopBlockMiddleware)
+
 # Create uploads directory if it doesn't exist
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
-# Mount static files for file serving
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
-
 # CORS middleware for React frontend
 app.add_middleware(
     CORSMiddleware,
@@ -52,14 +62,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def save_upload(source, destination: Path) -> int:
+    with open(destination, "wb") as buffer:
+        shutil.copyfileobj(source, buffer)
+    return os.path.getsize(destination)
+
+def remove_upload(file_path: Path):
+    file_path.unlink(missing_ok=True)
+
+def with_download_url(file: File) -> File:
+    file_path = file.file_path or str(UPLOAD_DIR / file.filename)
+    file.download_url = signed_download_url(
+        file_path, file.file_type, file.original_name or file.filename
+    )
+    return file
+
 @app.get("/")
 def read_root():
     return {"message": "Meetings Management API", "version": "1.0.0"}
 
+async def require_admin(
+    current_user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> CurrentUser:
+    result = await db.execute(
+        select(UserRole.user_id)
+        .join(Role, Role.id == UserRole.role_id)
+        .where(UserRole.user_id == current_user.id, Role.name == ADMIN_ROLE)
+    )
+    if result.first() is None:
+        raise HTTPException(status_code=403, detail="Administrator role required")
+    return current_user
+
+@app.get("/metrics/loop")
+async def loop_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return loop_monitor.stats()
+
+@app.get("/metrics/downloads")
+async def download_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return open_files.stats()
+
+# Auth endpoints
+@app.post("/auth/login", response_model=TokenResponse)
+async def login(credentials: LoginRequest, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(User).where(User.email == credentials.email))
+    user = result.scalar_one_or_none()
+    if not user or not await verify_password(credentials.password, user.password_hash):
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = await hash_password(credentials.password)
+        await db.commit()
+    
+    return TokenResponse(
+        access_token=create_access_token(user.id, user.email),
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    )
+
 # Users endpoints
 @app.post("/users/", response_model=UserResponse)
 async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
-    db_user = User(email=user.email, name=user.name, password_hash="hashed_" + user.password)
+    password_hash = await hash_password(user.password)
+    db_user = User(email=user.email, name=user.name, password_hash=password_hash)
     db.add(db_user)
     await db.commit()
     await db.refresh(db_user)
@@ -88,13 +152,17 @@ async def get_committees(db: AsyncSession = Depends(get_db)):
 
 # Meetings endpoints
 @app.post("/meetings/", response_model=MeetingResponse)
-async def create_meeting(meeting: MeetingCreate, db: AsyncSession = Depends(get_db)):
+async def create_meeting(
+    meeting: MeetingCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     db_meeting = Meeting(
         title=meeting.title,
         description=meeting.description,
         scheduled_at=meeting.scheduled_at,
         committee_id=meeting.committee_id,
-        created_by=1  # TODO: Get from authentication
+        created_by=current_user.id
     )
     db.add(db_meeting)
     await db.commit()
@@ -109,11 +177,15 @@ async def get_meetings(db: AsyncSession = Depends(get_db)):
 
 # Votes endpoints
 @app.post("/votes/", response_model=VoteResponse)
-async def create_vote(vote: VoteCreate, db: AsyncSession = Depends(get_db)):
+async def create_vote(
+    vote: VoteCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     db_vote = Vote(
         meeting_id=vote.meeting_id,
         opt=vote.opt,
-        user_id=1  # TODO: Get from authentication
+        user_id=current_user.id
     )
     db.add(db_vote)
     await db.commit()
@@ -135,7 +207,8 @@ async def upload_file(
     category: str = "general",
     tags: str = None,
     is_public: bool = True,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     try:
         # Generate unique filename
@@ -143,12 +216,8 @@ async def upload_file(
         unique_filename = f"{uuid.uuid4()}{file_extension}"
         file_path = UPLOAD_DIR / unique_filename
         
-        # Save file to disk
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
+        # Save file to disk in the thread pool so large uploads don't block the event loop
+        file_size = await run_in_threadpool(save_upload, file.file, file_path)
         
         # Create database record
         db_file = File(
@@ -156,7 +225,7 @@ async def upload_file(
             original_name=file.filename,
             url=f"/uploads/{unique_filename}",
             file_path=str(file_path),
-            uploaded_by=1,  # TODO: Get from authentication
+            uploaded_by=current_user.id,
             size=file_size,
             file_type=file.content_type,
             description=description,
@@ -171,7 +240,7 @@ async def upload_file(
         await db.commit()
         await db.refresh(db_file)
         
-        return db_file
+        return with_download_url(db_file)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
@@ -180,7 +249,7 @@ async def upload_file(
 async def get_files(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(File))
     files = result.scalars().all()
-    return files
+    return [with_download_url(file) for file in files]
 
 @app.get("/files/{file_id}", response_model=FileResponse)
 async def get_file(file_id: int, db: AsyncSession = Depends(get_db)):
@@ -188,7 +257,7 @@ async def get_file(file_id: int, db: AsyncSession = Depends(get_db)):
     file = result.scalar_one_or_none()
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
-    return file
+    return with_download_url(file)
 
 @app.get("/files/{file_id}/download")
 async def download_file(file_id: int, db: AsyncSession = Depends(get_db)):
@@ -205,12 +274,25 @@ async def download_file(file_id: int, db: AsyncSession = Depends(get_db)):
     file.download_count = (file.download_count or 0) + 1
     await db.commit()
     
-    return FileResponse(
+    return SendfileResponse(
         path=str(file_path),
         filename=file.original_name or file.filename,
         media_type=file.file_type or 'application/octet-stream'
     )
 
+@app.get("/downloads/{token}")
+async def download_signed_file(token: str):
+    # The signature authorises the download, so no database lookup is needed
+    download = verify_download(token, UPLOAD_DIR)
+    if not download.path.exists():
+        raise HTTPException(status_code=404, detail="File not found on disk")
+    
+    return SendfileResponse(
+        path=str(download.path),
+        filename=download.filename,
+        media_type=download.media_type
+    )
+
 @app.delete("/files/{file_id}")
 async def delete_file(file_id: int, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(File).where(File.id == file_id))
@@ -220,8 +302,8 @@ async def delete_file(file_id: int, db: AsyncSession = Depends(get_db)):
     
     # Delete file from disk
     file_path = Path(file.file_path) if file.file_path else UPLOAD_DIR / file.filename
-    if file_path.exists():
-        os.remove(file_path)
+    await run_in_threadpool(remove_upload, file_path)
+    open_files.invalidate(str(file_path))
     
     # Delete from database
     await db.execute(delete(File).where(File.id == file_id))
@@ -251,11 +333,15 @@ async def get_tasks(db: AsyncSession = Depends(get_db)):
 
 # Comments endpoints
 @app.post("/comments/", response_model=CommentResponse)
-async def create_comment(comment: CommentCreate, db: AsyncSession = Depends(get_db)):
+async def create_comment(
+    comment: CommentCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     db_comment = Comment(
         meeting_id=comment.meeting_id,
         message=comment.message,
-        user_id=1  # TODO: Get from authentication
+        user_id=current_user.id
     )
     db.add(db_comment)
     await db.commit()
@@ -270,11 +356,15 @@ async def get_comments(db: AsyncSession = Depends(get_db)):
 
 # Announcements endpoints
 @app.post("/announcements/", response_model=AnnouncementResponse)
-async def create_announcement(announcement: AnnouncementCreate, db: AsyncSession = Depends(get_db)):
+async def create_announcement(
+    announcement: AnnouncementCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     db_announcement = Announcement(
         meeting_id=announcement.meeting_id,
         message=announcement.message,
-        created_by=1  # TODO: Get from authentication
+        created_by=current_user.id
     )
     db.add(db_announcement)
     await db.commit()
@@ -1,12 +1,13 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import uvicorn
 import asyncio
 import aiomysql
+from contextlib import asynccontextmanager
 import os
 import aiofiles
 from datetime import datetime, timedelta
@@ -15,11 +16,55 @@ from pathlib import Path
 from dotenv import load_dotenv
 import hashlib
 import mimetypes
+import shutil
+from singleflight import SingleFlight, freeze_params, copy_rows
+from admission import admission, AdmissionMiddleware
+from loop_monitor import loop_monitor, LoopBlockMiddleware
+from signed_urls import signed_download_url, verify_download, EXPIRY_STEP_SECONDS
+from sendfile_response import SendfileResponse, open_files, content_disposition
+from resumable_uploads import UploadSessionStore
+from zip_stream import plan_entries, archive_etag, stream_zip
+import thumbnails
+import document_previews
+from file_gc import FileReconciler
+import storage_tiers
+import tag_index
+import library_bodies
+import change_feed
+import meeting_read_model
+import vote_ingest
+import vote_tally
+import vote_codes
+import vote_archive
+import vote_analytics
+import attendance_live
+import live_sessions
+import table_versions as table_versions_module
+from table_versions import table_versions
+from tag_index import TagIndex, parse_tags, tag_filter, file_facets, library_facets
+from library_bodies import LibraryBodies
+from sparse_fields import Projection, partial_model, make_excerpt, backfill_excerpts
+from process_pool import shutdown_pool
+from auth import (
+    CurrentUser, get_current_user, hash_password, verify_password,
+    password_needs_rehash, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+)
+from authorization import (
+    membership, ensure_committee_access, committee_filter, require_admin,
+    ADMIN_ROLE, MEMBERSHIP_REFRESH_SECONDS
+)
 
 load_dotenv()
 
 app = FastAPI(title="Meetings Management API", version="2.0.0")
 
+# Attribute event-loop stalls to endpoints (and fail requests in LOOP_BLOCK_FAIL_MS test mode)
+app.add_middleware(LoopBlockMiddleware)
+
+# Admission control: per-class concurrency, rate limits and load shedding.
+# Added before CORS so rejected requests still carry CORS headers.
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
 # CORS middleware for React frontend
 app.add_middleware(
     CORSMiddleware,
@@ -33,8 +78,11 @@ app.add_middleware(
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
-# Mount static files for file downloads
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.ogg')
+
+upload_sessions = UploadSessionStore(UPLOAD_DIR)
+FILE_GC_ENABLED = os.getenv("FILE_GC_ENABLED", "true").lower() == "true"
+STORAGE_TIERING_ENABLED = os.getenv("STORAGE_TIERING_ENABLED", "true").lower() == "true"
 
 # Database connection parameters
 DB_CONFIG = {
@@ -46,10 +94,22 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
+read_coalescer = SingleFlight("read_queries")
+
 # =============================================================================
 # PYDANTIC MODELS
 # =============================================================================
 
+# Auth Models
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
 # Committee Models
 class CommitteeCreate(BaseModel):
     name: str
@@ -61,6 +121,9 @@ class CommitteeResponse(BaseModel):
     description: Optional[str] = None
     created_at: Optional[str] = None
 
+class CommitteeMemberCreate(BaseModel):
+    user_id: int
+
 # Meeting Models
 class MeetingCreate(BaseModel):
     title: str
@@ -101,19 +164,50 @@ class FileResponse(BaseModel):
     description: Optional[str] = None
     uploaded_by: int
     created_at: str
+    download_url: Optional[str] = None
+    page_count: Optional[int] = None
+    document_title: Optional[str] = None
+    preview_url: Optional[str] = None
+    tags: List[str] = []
+
+# Resumable upload Models
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    category: str = "general"
+    committee_id: Optional[int] = None
+    meeting_id: Optional[int] = None
+    description: Optional[str] = None
+    sha256: Optional[str] = None  # digest of the complete file, checked on finalize
+    purpose: str = "file"  # 'file' or 'transcription'
+    tags: Optional[List[str]] = None
 
 # Vote Models
 class VoteCreate(BaseModel):
     meeting_id: int
     opt: str  # 'for', 'against', 'abstain'
+    agenda_item_id: Optional[int] = None  # roll-call on one agenda item
 
 class VoteResponse(BaseModel):
     id: int
     meeting_id: int
+    agenda_item_id: Optional[int] = None
     user_id: int
     opt: str
     created_at: str
 
+# Attendance Models
+class AttendanceCheckIn(BaseModel):
+    user_id: Optional[int] = None  # defaults to the caller
+    status: str = "present"  # 'present', 'absent', 'excused'
+
+class AttendanceBulk(BaseModel):
+    entries: List[AttendanceCheckIn]
+
+# Live Session Models
+class SpeakerRequest(BaseModel):
+    user_id: Optional[int] = None  # defaults to the caller
+
 # Announcement Models
 class AnnouncementCreate(BaseModel):
     title: str
@@ -185,10 +279,27 @@ class LibraryDocumentResponse(BaseModel):
     created_by: int
     created_at: str
 
+# List views: every field optional so sparse fieldsets validate, long bodies replaced by excerpts
+CommitteeSummary = partial_model(CommitteeResponse, "CommitteeSummary")
+MeetingSummary = partial_model(MeetingResponse, "MeetingSummary", excerpt=str)
+FileSummary = partial_model(FileResponse, "FileSummary")
+AnnouncementSummary = partial_model(AnnouncementResponse, "AnnouncementSummary")
+TaskSummary = partial_model(TaskResponse, "TaskSummary")
+LibraryDocumentSummary = partial_model(LibraryDocumentResponse, "LibraryDocumentSummary", excerpt=str)
+
 # =============================================================================
 # DATABASE HELPER FUNCTIONS
 # =============================================================================
 
+background_tasks = set()
+
+def run_in_background(coro):
+    # Keep a reference so post-upload work is not garbage collected mid-flight
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
 async def get_db_connection():
     try:
         connection = await aiomysql.connect(**DB_CONFIG)
@@ -197,26 +308,356 @@ async def get_db_connection():
         print(f"Database connection error: {e}")
         raise HTTPException(status_code=500, detail="Database connection failed")
 
-async def execute_query(query: str, params=None, fetch_one=False, fetch_all=False):
+async def execute_query(query: str, params=None, fetch_one=False, fetch_all=False, coalesce=False):
+    # Hot read paths opt in to sharing one in-flight query between identical concurrent requests
+    if coalesce and (fetch_one or fetch_all):
+        key = (query, freeze_params(params), fetch_one)
+        result = await read_coalescer.do(
+            key, lambda: run_query(query, params, fetch_one=fetch_one, fetch_all=fetch_all)
+        )
+        return copy_rows(result)
+    return await run_query(query, params, fetch_one=fetch_one, fetch_all=fetch_all)
+
+async def run_query(query: str, params=None, fetch_one=False, fetch_all=False):
+    # Each request class may only hold its own budget of database connections
+    async with admission.db_slot():
+        connection = await get_db_connection()
+        try:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params)
+                if fetch_one:
+                    result = await cursor.fetchone()
+                elif fetch_all:
+                    result = await cursor.fetchall()
+                else:
+                    result = cursor.lastrowid
+                await connection.commit()
+                return result
+        except Exception as e:
+            await connection.rollback()
+            print(f"Query error: {e}")
+            raise HTTPException(status_code=500, detail=f"Database query failed: {str(e)}")
+        finally:
+            connection.close()
+
+@asynccontextmanager
+async def transaction():
+    """
+    Yield a query function (like execute_query without coalescing) whose
+    statements commit together when the block exits, or not at all
+    """
+    async with admission.db_slot():
+        connection = await get_db_connection()
+        try:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                async def query(query: str, params=None, fetch_one=False, fetch_all=False):
+                    await cursor.execute(query, params)
+                    if fetch_one:
+                        return await cursor.fetchone()
+                    if fetch_all:
+                        return await cursor.fetchall()
+                    return cursor.lastrowid
+                yield query
+            await connection.commit()
+        except HTTPException:
+            await connection.rollback()
+            raise
+        except Exception as e:
+            await connection.rollback()
+            print(f"Query error: {e}")
+            raise HTTPException(status_code=500, detail=f"Database query failed: {str(e)}")
+        finally:
+            connection.close()
+
+file_reconciler = FileReconciler(UPLOAD_DIR, execute_query)
+file_access = storage_tiers.AccessTracker(execute_query)
+tag_store = TagIndex(execute_query)
+library_store = LibraryBodies(execute_query)
+sync_feed = change_feed.ChangeFeed(execute_query)
+read_model = meeting_read_model.MeetingReadModel(execute_query)
+
+async def record_ballots(query, changes: list, rows: list):
+    # Runs inside the ballot batch's transaction, so results, /sync and the
+    # read-model outbox never disagree with the ballots
+    items = await vote_tally.apply_changes(query, [(key[1], previous, opt) for key, previous, opt in changes])
+    await sync_feed.record_many("votes", [(row["id"], row["committee_id"]) for row in rows], query=query)
+    committees = {row["agenda_item_id"]: row["committee_id"] for row in rows}
+    await sync_feed.record_many("vote_results", [(item, committees[item]) for item in items], query=query)
+    await read_model.enqueue_many(sorted({row["meeting_id"] for row in rows}), "vote", query=query)
+
+async def votes_committed(rows: list):
+    # Once per batch rather than once per ballot, and only after the commit
+    table_versions.bump("votes")
+    if any(row["agenda_item_id"] for row in rows):
+        table_versions.bump("vote_results")
+
+vote_history = vote_archive.VoteArchive(execute_query)
+vote_insights = vote_analytics.VoteAnalytics(execute_query, vote_history)
+
+# Holds one connection of its own, outside the admission budgets
+vote_batcher = vote_ingest.VoteBatcher(
+    lambda: aiomysql.connect(**DB_CONFIG), on_commit=votes_committed, in_transaction=record_ballots
+)
+
+async def attendance_flushed(meeting_ids: list):
+    # Attendance decides quorum, so the tallied items of these meetings are decided again
+    placeholders = ", ".join(["%s"] * len(meeting_ids))
+    async with transaction() as query:
+        items = await query(
+            f"""
+            SELECT r.agenda_item_id, m.committee_id FROM vote_results r
+            JOIN agenda_items a ON a.id = r.agenda_item_id
+            JOIN meetings m ON m.id = a.meeting_id
+            WHERE a.meeting_id IN ({placeholders})
+            """,
+            meeting_ids, fetch_all=True,
+        )
+        for row in items:
+            await vote_tally.redecide(query, row['agenda_item_id'])
+        if items:
+            await sync_feed.record_many(
+                "vote_results", [(row['agenda_item_id'], row['committee_id']) for row in items], query=query
+            )
+            await read_model.enqueue_many(meeting_ids, "attendance", query=query)
+    if items:
+        table_versions.bump("vote_results")
+
+attendance_book = attendance_live.AttendanceBook(execute_query, membership, on_flush=attendance_flushed)
+
+async def record_session_snapshot(
+    query, session: live_sessions.LiveSession, changed_items: dict, meeting_status: Optional[str]
+):
+    # Agenda item and meeting statuses are written by the snapshot, not by each action
+    if meeting_status:
+        await sync_feed.record("meetings", session.meeting_id, committee_id=session.committee_id, query=query)
+    await sync_feed.record_many(
+        "agenda_items", [(item_id, session.committee_id) for item_id in changed_items], query=query
+    )
+    await read_model.enqueue(session.meeting_id, "session", query=query)
+
+async def session_snapshotted(session: live_sessions.LiveSession, changed_items: dict, meeting_status: Optional[str]):
+    if meeting_status:
+        table_versions.bump("meetings")
+
+meeting_sessions = live_sessions.LiveSessions(
+    execute_query, transaction=transaction, in_transaction=record_session_snapshot, on_snapshot=session_snapshotted
+)
+table_versions.bind(execute_query)
+def file_moved(file_path: str):
+    open_files.invalidate(file_path)
+    table_versions.bump("files")
+
+storage_tierer = storage_tiers.StorageTierer(UPLOAD_DIR, execute_query, on_moved=file_moved)
+
+# Schema additions on top of create_schema_with_data.sql, applied at startup
+SCHEMA_COLUMNS = [
+    ("files", "content_sha256", "CHAR(64) NULL, ADD INDEX idx_files_content_sha256 (content_sha256)"),
+    ("files", "missing_since", "DATETIME NULL"),
+    ("files", "last_accessed_at", "DATETIME NULL"),
+    ("files", "storage_tier", "ENUM('hot', 'cold') NOT NULL DEFAULT 'hot', ADD INDEX idx_files_tier_access (storage_tier, last_accessed_at)"),
+    ("files", "compression", "VARCHAR(8) NULL"),
+    ("files", "stored_size", "BIGINT NULL"),
+    ("meetings", "excerpt", "VARCHAR(300) NULL"),
+    ("library", "excerpt", "VARCHAR(300) NULL"),
+    *library_bodies.SCHEMA_COLUMNS,
+    *vote_ingest.SCHEMA_COLUMNS,
+    *vote_codes.SCHEMA_COLUMNS,
+    *vote_archive.SCHEMA_COLUMNS,
+]
+
+SCHEMA_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS document_previews (
+        content_sha256 CHAR(64) PRIMARY KEY,
+        page_count INT NULL,
+        title VARCHAR(500) NULL,
+        preview_path VARCHAR(500) NULL,
+        rendered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    *tag_index.SCHEMA_TABLES,
+    table_versions_module.SCHEMA_TABLE,
+    *library_bodies.SCHEMA_TABLES,
+    change_feed.SCHEMA_TABLE,
+    *meeting_read_model.SCHEMA_TABLES,
+    vote_tally.SCHEMA_TABLE,
+    vote_codes.SCHEMA_TABLE,
+    live_sessions.SCHEMA_TABLE,
+]
+
+# (table, index name, definition, statement that makes existing rows satisfy it)
+SCHEMA_INDEXES = [
+    (*vote_ingest.SCHEMA_INDEX, vote_ingest.DEDUPLICATE_SQL),
+    (*attendance_live.SCHEMA_INDEX, attendance_live.DEDUPLICATE_SQL),
+    (*library_bodies.SCHEMA_INDEX, None),
+]
+SCHEMA_DROPPED_INDEXES = [
+    *vote_ingest.OBSOLETE_INDEXES,
+]
+
+async def init_database():
+    """Apply schema additions; safe to run on every startup"""
     connection = await get_db_connection()
     try:
-        async with connection.cursor(aiomysql.DictCursor) as cursor:
-            await cursor.execute(query, params)
-            if fetch_one:
-                result = await cursor.fetchone()
-            elif fetch_all:
-                result = await cursor.fetchall()
-            else:
-                result = cursor.lastrowid
-            await connection.commit()
-            return result
+        async with connection.cursor() as cursor:
+            for table, column, definition in SCHEMA_COLUMNS:
+                try:
+                    await cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                except aiomysql.OperationalError as e:
+                    if e.args[0] != 1060:  # duplicate column: already migrated
+                        raise
+            for statement in SCHEMA_TABLES:
+                await cursor.execute(statement)
+            for table, name, definition, prepare in SCHEMA_INDEXES:
+                await cursor.execute(
+                    "SELECT 1 FROM information_schema.statistics "
+                    "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1",
+                    (table, name),
+                )
+                if await cursor.fetchone():
+                    continue
+                if prepare:
+                    await cursor.execute(prepare)
+                await cursor.execute(f"ALTER TABLE {table} ADD {definition}")
+            for table, name in SCHEMA_DROPPED_INDEXES:
+                try:
+                    await cursor.execute(f"ALTER TABLE {table} DROP INDEX {name}")
+                except aiomysql.OperationalError as e:
+                    if e.args[0] != 1091:  # no such index: already dropped
+                        raise
+        await connection.commit()
     except Exception as e:
         await connection.rollback()
-        print(f"Query error: {e}")
-        raise HTTPException(status_code=500, detail=f"Database query failed: {str(e)}")
+        print(f"Database initialization error: {e}")
     finally:
         connection.close()
 
+async def init_facet_counts():
+    # Counters are maintained incrementally; only a fresh table needs a full count
+    existing = await execute_query("SELECT 1 FROM facet_counts LIMIT 1", fetch_one=True)
+    if not existing:
+        await tag_store.backfill_library_tags()
+        await tag_store.rebuild_counts()
+
+async def init_excerpts():
+    try:
+        await backfill_excerpts(execute_query, "meetings", ("description", "agenda"))
+        await backfill_excerpts(execute_query, "library", ("content",))
+    except Exception as e:
+        print(f"Excerpt backfill error: {e}")
+
+async def init_vote_codes():
+    try:
+        await vote_codes.seed(execute_query)
+        unmapped = await vote_codes.migrate_text(execute_query)
+        if unmapped:
+            print(f"Vote option migration: {unmapped} ballots kept their unrecognised text")
+    except Exception as e:
+        print(f"Vote option migration error: {e}")
+
+async def init_library_text():
+    # Excerpts are cut from the inline text, so they are backfilled before it moves out of the row
+    await init_excerpts()
+    try:
+        await library_store.compress_table()
+        await library_store.migrate_compressed()
+        await library_store.migrate_inline()
+    except Exception as e:
+        print(f"Library body migration error: {e}")
+
+# =============================================================================
+# AUTHORIZATION HELPERS
+# =============================================================================
+
+async def load_membership_index():
+    """Load committee membership, admins and meeting ownership into memory"""
+    members = await execute_query(
+        "SELECT committee_id, user_id FROM committee_members", fetch_all=True
+    )
+    admins = await execute_query(
+        """
+        SELECT ur.user_id FROM user_roles ur
+        JOIN roles r ON ur.role_id = r.id
+        WHERE r.name = %s
+        """,
+        (ADMIN_ROLE,), fetch_all=True
+    )
+    meetings = await execute_query("SELECT id, committee_id FROM meetings", fetch_all=True)
+    
+    membership.replace(
+        ((row['committee_id'], row['user_id']) for row in members),
+        (row['user_id'] for row in admins),
+        ((row['id'], row['committee_id']) for row in meetings)
+    )
+    attendance_book.committee_changed(None)
+    print(f"Membership index loaded: {len(members)} memberships, {len(admins)} admins")
+
+async def refresh_membership_periodically():
+    # Picks up membership changes made by other workers or directly in the database
+    while True:
+        await asyncio.sleep(MEMBERSHIP_REFRESH_SECONDS)
+        try:
+            await load_membership_index()
+        except Exception as e:
+            print(f"Membership index refresh error: {e}")
+
+async def get_meeting_committee(meeting_id: int) -> Optional[int]:
+    known, committee_id = membership.lookup_meeting(meeting_id)
+    if not known:
+        query = "SELECT committee_id FROM meetings WHERE id = %s"
+        result = await execute_query(query, (meeting_id,), fetch_one=True)
+        if not result:
+            raise HTTPException(status_code=404, detail="Meeting not found")
+        committee_id = result['committee_id']
+        membership.set_meeting_committee(meeting_id, committee_id)
+    return committee_id
+
+async def ensure_meeting_access(user: CurrentUser, meeting_id: int) -> Optional[int]:
+    committee_id = await get_meeting_committee(meeting_id)
+    ensure_committee_access(user, committee_id)
+    return committee_id
+
+@app.on_event("startup")
+async def startup_event():
+    loop_monitor.start()
+    await init_database()
+    try:
+        await init_facet_counts()
+    except Exception as e:
+        print(f"Facet count initialization error: {e}")
+    run_in_background(init_library_text())
+    run_in_background(table_versions.refresh_forever())
+    run_in_background(sync_feed.prune_forever())
+    run_in_background(read_model.run_forever())
+    run_in_background(init_vote_codes())
+    run_in_background(vote_history.run_forever())
+    run_in_background(attendance_book.run_forever())
+    try:
+        recovered = await meeting_sessions.recover()
+        if recovered:
+            print(f"Live sessions recovered: {recovered}")
+    except Exception as e:
+        print(f"Live session recovery error: {e}")
+    run_in_background(meeting_sessions.run_forever())
+    try:
+        await load_membership_index()
+    except Exception as e:
+        print(f"Membership index load error: {e}")
+    asyncio.create_task(refresh_membership_periodically())
+    if FILE_GC_ENABLED:
+        run_in_background(file_reconciler.run_forever())
+    run_in_background(file_access.run_forever())
+    if STORAGE_TIERING_ENABLED:
+        run_in_background(storage_tierer.run_forever())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await loop_monitor.stop()
+    await vote_batcher.close()
+    await attendance_book.close()
+    await meeting_sessions.close()
+    shutdown_pool()
+
 # =============================================================================
 # BASIC ENDPOINTS
 # =============================================================================
@@ -241,17 +682,110 @@ async def health_check():
     except Exception as e:
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
 
+@app.get("/metrics/coalescing")
+async def coalescing_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return read_coalescer.stats()
+
+@app.get("/metrics/admission")
+async def admission_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return admission.stats()
+
+@app.get("/metrics/loop")
+async def loop_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return loop_monitor.stats()
+
+@app.get("/metrics/downloads")
+async def download_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return open_files.stats()
+
+@app.get("/metrics/library")
+async def library_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return await library_store.stats()
+
+@app.get("/metrics/read-model")
+async def read_model_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return await read_model.stats()
+
+@app.get("/metrics/votes")
+async def vote_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return vote_batcher.stats()
+
+@app.get("/metrics/vote-archive")
+async def vote_archive_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return vote_history.stats()
+
+@app.get("/metrics/vote-analytics")
+async def vote_analytics_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return vote_insights.stats()
+
+@app.get("/metrics/attendance")
+async def attendance_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return attendance_book.stats()
+
+@app.get("/metrics/live-sessions")
+async def live_session_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return meeting_sessions.stats()
+
+@app.get("/metrics/sync")
+async def sync_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return sync_feed.stats()
+
+@app.get("/metrics/etags")
+async def etag_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return table_versions.stats()
+
+@app.get("/admin/storage/report")
+async def storage_report(limit: int = 100, current_user: CurrentUser = Depends(require_admin)):
+    dangling = await execute_query(
+        """
+        SELECT id, name, file_path, committee_id, meeting_id, missing_since
+        FROM files WHERE missing_since IS NOT NULL
+        ORDER BY missing_since DESC LIMIT %s
+        """,
+        (limit,), fetch_all=True
+    )
+    for row in dangling:
+        row['missing_since'] = str(row['missing_since'])
+    
+    report = file_reconciler.report()
+    report["dangling_rows"] = dangling
+    report["tiering"] = storage_tierer.stats()
+    return report
+
+# =============================================================================
+# AUTH ENDPOINTS
+# =============================================================================
+
+@app.post("/auth/login", response_model=TokenResponse)
+async def login(credentials: LoginRequest):
+    query = "SELECT id, email, password_hash FROM users WHERE email = %s"
+    user = await execute_query(query, (credentials.email,), fetch_one=True)
+    if not user or not await verify_password(credentials.password, user['password_hash']):
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    
+    if password_needs_rehash(user['password_hash']):
+        new_hash = await hash_password(credentials.password)
+        query = "UPDATE users SET password_hash = %s WHERE id = %s"
+        await execute_query(query, (new_hash, user['id']))
+    
+    return TokenResponse(
+        access_token=create_access_token(user['id'], user['email']),
+        expires_in=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    )
+
 # =============================================================================
 # COMMITTEE ENDPOINTS
 # =============================================================================
 
 @app.post("/committees/", response_model=CommitteeResponse)
 async def create_committee(committee: CommitteeCreate):
-    query = "INSERT INTO committees (name, description, created_at) VALUES (%s, %s, %s)"
-    committee_id = await execute_query(
-        query, 
-        (committee.name, committee.description, datetime.now())
-    )
+    async with transaction() as query:
+        committee_id = await query(
+            "INSERT INTO committees (name, description, created_at) VALUES (%s, %s, %s)",
+            (committee.name, committee.description, datetime.now())
+        )
+        await sync_feed.record("committees", committee_id, query=query)
+    table_versions.bump("committees")
     
     query = "SELECT * FROM committees WHERE id = %s"
     result = await execute_query(query, (committee_id,), fetch_one=True)
@@ -259,14 +793,24 @@ async def create_committee(committee: CommitteeCreate):
     
     return CommitteeResponse(**result)
 
-@app.get("/committees/", response_model=List[CommitteeResponse])
-async def get_committees():
-    query = "SELECT * FROM committees ORDER BY created_at DESC"
+COMMITTEE_FIELDS = Projection(
+    {"id": "id", "name": "name", "description": "description", "created_at": "created_at"},
+    default=("id", "name", "description", "created_at"),
+)
+
+@app.get("/committees/", response_model=List[CommitteeSummary], response_model_exclude_unset=True)
+async def get_committees(request: Request, response: Response, fields: Optional[str] = None):
+    not_modified = table_versions.check(request, response, ("committees",))
+    if not_modified:
+        return not_modified
+    
+    requested = COMMITTEE_FIELDS.resolve(fields)
+    query = f"SELECT {COMMITTEE_FIELDS.select_list(requested)} FROM committees ORDER BY created_at DESC"
     results = await execute_query(query, fetch_all=True)
     for result in results:
         if result.get('created_at'):
             result['created_at'] = str(result['created_at'])
-    return [CommitteeResponse(**row) for row in results]
+    return [CommitteeSummary(**row) for row in results]
 
 @app.get("/committees/{committee_id}", response_model=CommitteeResponse)
 async def get_committee(committee_id: int):
@@ -277,21 +821,59 @@ async def get_committee(committee_id: int):
     result['created_at'] = str(result['created_at'])
     return CommitteeResponse(**result)
 
+@app.get("/committees/{committee_id}/members")
+async def get_committee_members(committee_id: int, current_user: CurrentUser = Depends(get_current_user)):
+    ensure_committee_access(current_user, committee_id)
+    return {"committee_id": committee_id, "user_ids": sorted(membership.members_of(committee_id))}
+
+@app.post("/committees/{committee_id}/members")
+async def add_committee_member(
+    committee_id: int,
+    member: CommitteeMemberCreate,
+    current_user: CurrentUser = Depends(require_admin)
+):
+    query = "INSERT IGNORE INTO committee_members (committee_id, user_id) VALUES (%s, %s)"
+    await execute_query(query, (committee_id, member.user_id))
+    membership.add_member(committee_id, member.user_id)
+    table_versions.bump("committee_members")
+    attendance_book.committee_changed(committee_id)
+    return {"committee_id": committee_id, "user_id": member.user_id}
+
+@app.delete("/committees/{committee_id}/members/{user_id}")
+async def remove_committee_member(
+    committee_id: int,
+    user_id: int,
+    current_user: CurrentUser = Depends(require_admin)
+):
+    query = "DELETE FROM committee_members WHERE committee_id = %s AND user_id = %s"
+    await execute_query(query, (committee_id, user_id))
+    membership.remove_member(committee_id, user_id)
+    table_versions.bump("committee_members")
+    attendance_book.committee_changed(committee_id)
+    return {"message": "Member removed successfully"}
+
 # =============================================================================
 # MEETING ENDPOINTS
 # =============================================================================
 
 @app.post("/meetings/", response_model=MeetingResponse)
-async def create_meeting(meeting: MeetingCreate):
-    query = """
-    INSERT INTO meetings (committee_id, title, description, scheduled_at, agenda, status, created_by, created_at) 
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+async def create_meeting(meeting: MeetingCreate, current_user: CurrentUser = Depends(get_current_user)):
+    ensure_committee_access(current_user, meeting.committee_id)
+    
+    insert = """
+    INSERT INTO meetings (committee_id, title, description, scheduled_at, agenda, excerpt, status, created_by, created_at) 
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
-    meeting_id = await execute_query(
-        query, 
-        (meeting.committee_id, meeting.title, meeting.description, 
-         meeting.scheduled_at, meeting.agenda, meeting.status, 1, datetime.now())
-    )
+    async with transaction() as query:
+        meeting_id = await query(
+            insert, 
+            (meeting.committee_id, meeting.title, meeting.description, meeting.scheduled_at, meeting.agenda,
+             make_excerpt(meeting.description, meeting.agenda), meeting.status, current_user.id, datetime.now())
+        )
+        await sync_feed.record("meetings", meeting_id, committee_id=meeting.committee_id, query=query)
+        await read_model.enqueue(meeting_id, "meeting", query=query)
+    membership.set_meeting_committee(meeting_id, meeting.committee_id)
+    table_versions.bump("meetings")
     
     query = "SELECT * FROM meetings WHERE id = %s"
     result = await execute_query(query, (meeting_id,), fetch_one=True)
@@ -303,28 +885,61 @@ async def create_meeting(meeting: MeetingCreate):
     
     return MeetingResponse(**result)
 
-@app.get("/meetings/", response_model=List[MeetingResponse])
-async def get_meetings(committee_id: Optional[int] = None):
+MEETING_FIELDS = Projection(
+    {
+        "id": "id", "committee_id": "committee_id", "title": "title", "excerpt": "excerpt",
+        "scheduled_at": "scheduled_at", "status": "status", "created_by": "created_by",
+        "created_at": "created_at",
+    },
+    default=("id", "committee_id", "title", "excerpt", "scheduled_at", "status", "created_by", "created_at"),
+)
+
+@app.get("/meetings/", response_model=List[MeetingSummary], response_model_exclude_unset=True)
+async def get_meetings(
+    request: Request,
+    response: Response,
+    committee_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    # Visible rows depend on the caller's committees
+    not_modified = table_versions.check(
+        request, response, ("meetings", "committee_members"), current_user.id
+    )
+    if not_modified:
+        return not_modified
+    
+    conditions = []
+    params = []
+    
+    allowed_condition, allowed_params = committee_filter(current_user)
+    if allowed_condition:
+        conditions.append(allowed_condition)
+        params.extend(allowed_params)
     if committee_id:
-        query = "SELECT * FROM meetings WHERE committee_id = %s ORDER BY scheduled_at DESC"
-        results = await execute_query(query, (committee_id,), fetch_all=True)
-    else:
-        query = "SELECT * FROM meetings ORDER BY scheduled_at DESC"
-        results = await execute_query(query, fetch_all=True)
+        conditions.append("committee_id = %s")
+        params.append(committee_id)
+    
+    requested = MEETING_FIELDS.resolve(fields)
+    where_clause = " WHERE " + " AND ".join(conditions) if conditions else ""
+    query = f"SELECT {MEETING_FIELDS.select_list(requested)} FROM meetings{where_clause} ORDER BY scheduled_at DESC"
+    results = await execute_query(query, params if params else None, fetch_all=True)
     
     for result in results:
-        if result['scheduled_at']:
+        if result.get('scheduled_at'):
             result['scheduled_at'] = str(result['scheduled_at'])
-        result['created_at'] = str(result['created_at'])
+        if result.get('created_at'):
+            result['created_at'] = str(result['created_at'])
     
-    return [MeetingResponse(**row) for row in results]
+    return [MeetingSummary(**row) for row in results]
 
 @app.get("/meetings/{meeting_id}", response_model=MeetingResponse)
-async def get_meeting(meeting_id: int):
+async def get_meeting(meeting_id: int, current_user: CurrentUser = Depends(get_current_user)):
     query = "SELECT * FROM meetings WHERE id = %s"
     result = await execute_query(query, (meeting_id,), fetch_one=True)
     if not result:
         raise HTTPException(status_code=404, detail="Meeting not found")
+    ensure_committee_access(current_user, result['committee_id'])
     
     if result['scheduled_at']:
         result['scheduled_at'] = str(result['scheduled_at'])
@@ -332,23 +947,148 @@ async def get_meeting(meeting_id: int):
     
     return MeetingResponse(**result)
 
+@app.get("/meetings/{meeting_id}/view")
+async def get_meeting_view(
+    meeting_id: int,
+    response: Response,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Meeting with committee, agenda, results, comments, files and tally from the read model"""
+    view = await read_model.get(meeting_id)
+    if view:
+        ensure_committee_access(current_user, view['committee_id'])
+        document = json.loads(view['document'])
+        built_at = view['built_at']
+    else:
+        # Not projected yet (consumer behind or never backfilled): build it now
+        await ensure_meeting_access(current_user, meeting_id)
+        document = await read_model.refresh(meeting_id, 0)
+        if document is None:
+            raise HTTPException(status_code=404, detail="Meeting not found")
+        built_at = datetime.now()
+    
+    # Paths change when files move between tiers, so views link to the id-based route
+    for file in document['files']:
+        file['download_url'] = f"/files/{file['id']}/download"
+    response.headers["X-Read-Model-Built-At"] = str(built_at)
+    return document
+
 # =============================================================================
 # FILE MANAGEMENT ENDPOINTS
 # =============================================================================
 
+async def resolve_file_committee(
+    current_user: CurrentUser,
+    committee_id: Optional[int],
+    meeting_id: Optional[int]
+) -> Optional[int]:
+    # Files attached to a meeting inherit its committee so list filtering stays in SQL
+    if meeting_id:
+        meeting_committee_id = await ensure_meeting_access(current_user, meeting_id)
+        if committee_id is None:
+            committee_id = meeting_committee_id
+    ensure_committee_access(current_user, committee_id)
+    return committee_id
+
+def unique_upload_path(filename: str, prefix: str = "") -> tuple[Path, str]:
+    """Return (path, file_hash) for a new file in its UPLOAD_DIR shard"""
+    file_extension = filename.split(".")[-1] if "." in filename else ""
+    file_hash = hashlib.md5(f"{filename}{datetime.now()}".encode()).hexdigest()
+    path = storage_tiers.shard_path(UPLOAD_DIR, file_hash, f"{prefix}{file_hash}.{file_extension}")
+    return path, file_hash
+
+async def register_file(
+    filename: str,
+    file_path: Path,
+    file_size: int,
+    mime_type: str,
+    category: str,
+    committee_id: Optional[int],
+    meeting_id: Optional[int],
+    description: Optional[str],
+    uploaded_by: int,
+    sha256: Optional[str] = None,
+    tag_names: Optional[List[str]] = None
+) -> dict:
+    insert = """
+    INSERT INTO files (name, file_path, file_size, mime_type, category, committee_id, meeting_id, description, uploaded_by, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    async with transaction() as query:
+        file_id = await query(
+            insert,
+            (filename, str(file_path), file_size, mime_type, category, 
+             committee_id, meeting_id, description, uploaded_by, datetime.now())
+        )
+        await sync_feed.record("files", file_id, committee_id=committee_id, query=query)
+        await read_model.enqueue(meeting_id, "file", query=query)
+        # Tag links and facet counters commit with the row, so they never drift from it
+        tag_names = await tag_store.set_tags(tag_index.FILES, file_id, tag_names or [], query=query)
+        partition, facets = file_facets(
+            {"category": category, "mime_type": mime_type, "committee_id": committee_id}, tag_names
+        )
+        await tag_store.adjust(tag_index.FILES, partition, facets, 1, query=query)
+    table_versions.bump("files")
+    
+    if thumbnails.is_raster_image(mime_type):
+        run_in_background(thumbnails.generate_default_variants(file_path))
+    elif document_previews.is_pdf(mime_type):
+        run_in_background(process_pdf_upload(file_id, file_path, committee_id, sha256))
+    
+    return {
+        "id": file_id,
+        "filename": filename,
+        "size": file_size,
+        "category": category,
+        "tags": tag_names,
+        "download_url": signed_download_url(str(file_path), mime_type, filename)
+    }
+
+async def process_pdf_upload(
+    file_id: int, file_path: Path, committee_id: Optional[int], sha256: Optional[str] = None
+):
+    """Background stage: record the content hash, then reuse or render the preview"""
+    try:
+        content_sha256 = await document_previews.content_hash(file_path, sha256)
+        async with transaction() as query:
+            await query("UPDATE files SET content_sha256 = %s WHERE id = %s", (content_sha256, file_id))
+            cached = await query(
+                "SELECT 1 FROM document_previews WHERE content_sha256 = %s", (content_sha256,), fetch_one=True
+            )
+            if cached:
+                await sync_feed.record("files", file_id, committee_id=committee_id, query=query)
+        if cached:
+            table_versions.bump("files")
+            return
+        
+        info = await document_previews.render_document(file_path, content_sha256, UPLOAD_DIR)
+        async with transaction() as query:
+            await query(
+                """
+                INSERT IGNORE INTO document_previews (content_sha256, page_count, title, preview_path)
+                VALUES (%s, %s, %s, %s)
+                """,
+                (info.content_sha256, info.page_count, info.title, info.preview_path)
+            )
+            await sync_feed.record("files", file_id, committee_id=committee_id, query=query)
+        table_versions.bump("files")
+    except Exception as e:
+        print(f"PDF preview failed for file {file_id}: {e}")
+
 @app.post("/files/upload")
 async def upload_file(
     file: UploadFile = File(...),
     category: str = Form(...),
     committee_id: Optional[int] = Form(None),
     meeting_id: Optional[int] = Form(None),
-    description: Optional[str] = Form(None)
+    description: Optional[str] = Form(None),
+    tags: Optional[str] = Form(None),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
+    committee_id = await resolve_file_committee(current_user, committee_id, meeting_id)
+    
     # Generate unique filename
-    file_extension = file.filename.split(".")[-1] if "." in file.filename else ""
-    file_hash = hashlib.md5(f"{file.filename}{datetime.now()}".encode()).hexdigest()
-    unique_filename = f"{file_hash}.{file_extension}"
-    file_path = UPLOAD_DIR / unique_filename
+    file_path, _ = unique_upload_path(file.filename)
     
     # Save file
     async with aiofiles.open(file_path, 'wb') as f:
@@ -360,115 +1100,605 @@ async def upload_file(
     mime_type = mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
     
     # Save to database
-    query = """
-    INSERT INTO files (name, file_path, file_size, mime_type, category, committee_id, meeting_id, description, uploaded_by, created_at)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    """
-    file_id = await execute_query(
-        query,
-        (file.filename, str(file_path), file_size, mime_type, category, 
-         committee_id, meeting_id, description, 1, datetime.now())
+    return await register_file(
+        file.filename, file_path, file_size, mime_type, category,
+        committee_id, meeting_id, description, current_user.id,
+        tag_names=parse_tags(tags)
     )
-    
-    return {
-        "id": file_id,
-        "filename": file.filename,
-        "size": file_size,
-        "category": category,
-        "download_url": f"/files/{file_id}/download"
-    }
 
-@app.get("/files/", response_model=List[FileResponse])
-async def get_files(
+def file_conditions(
+    current_user: CurrentUser,
+    alias: str,
     category: Optional[str] = None,
     committee_id: Optional[int] = None,
-    meeting_id: Optional[int] = None
-):
+    meeting_id: Optional[int] = None,
+    mime_type: Optional[str] = None,
+    tag_names: Optional[List[str]] = None,
+    tag_mode: str = tag_index.MATCH_ALL
+) -> tuple[list, list]:
     conditions = []
     params = []
     
+    allowed_condition, allowed_params = committee_filter(current_user, f"{alias}.committee_id")
+    if allowed_condition:
+        conditions.append(allowed_condition)
+        params.extend(allowed_params)
     if category:
-        conditions.append("category = %s")
+        conditions.append(f"{alias}.category = %s")
         params.append(category)
     if committee_id:
-        conditions.append("committee_id = %s")
+        conditions.append(f"{alias}.committee_id = %s")
         params.append(committee_id)
     if meeting_id:
-        conditions.append("meeting_id = %s")
+        conditions.append(f"{alias}.meeting_id = %s")
         params.append(meeting_id)
+    if mime_type:
+        conditions.append(f"{alias}.mime_type = %s")
+        params.append(mime_type)
+    tag_condition, tag_params = tag_filter(tag_index.FILES, tag_names or [], tag_mode, f"{alias}.id")
+    if tag_condition:
+        conditions.append(tag_condition)
+        params.extend(tag_params)
+    return conditions, params
+
+def check_tag_mode(tag_mode: str):
+    if tag_mode not in (tag_index.MATCH_ALL, tag_index.MATCH_ANY):
+        raise HTTPException(status_code=400, detail="tag_mode must be 'all' or 'any'")
+
+FILE_FIELDS = Projection(
+    {
+        "id": "f.id", "name": "f.name", "file_path": "f.file_path", "file_size": "f.file_size",
+        "mime_type": "f.mime_type", "category": "f.category", "committee_id": "f.committee_id",
+        "meeting_id": "f.meeting_id", "description": "f.description", "uploaded_by": "f.uploaded_by",
+        "created_at": "f.created_at", "page_count": "p.page_count", "document_title": "p.title",
+    },
+    computed={
+        "download_url": {"file_path": "f.file_path", "mime_type": "f.mime_type", "name": "f.name"},
+        "preview_url": {"preview_path": "p.preview_path"},
+        "tags": {},
+    },
+    default=(
+        "id", "name", "file_path", "file_size", "mime_type", "category", "committee_id", "meeting_id",
+        "description", "uploaded_by", "created_at", "download_url", "page_count", "document_title",
+        "preview_url", "tags",
+    ),
+)
+
+async def decorate_file_rows(results: list, requested: List[str]) -> list:
+    """Fill computed FILE_FIELDS and drop the helper columns they were derived from"""
+    file_tags = {}
+    if "tags" in requested:
+        file_tags = await tag_store.tags_for_items(tag_index.FILES, [result['id'] for result in results])
+    
+    for result in results:
+        if result.get('created_at'):
+            result['created_at'] = str(result['created_at'])
+        if "download_url" in requested:
+            result['download_url'] = signed_download_url(
+                result['file_path'], result['mime_type'], result['name']
+            )
+        if "tags" in requested:
+            result['tags'] = file_tags.get(result['id'], [])
+        if result.get('preview_path'):
+            result['preview_url'] = f"/files/{result['id']}/preview"
+    return FILE_FIELDS.prune(results, requested)
+
+@app.get("/files/", response_model=List[FileSummary], response_model_exclude_unset=True)
+async def get_files(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    committee_id: Optional[int] = None,
+    meeting_id: Optional[int] = None,
+    mime_type: Optional[str] = None,
+    tags: Optional[str] = None,
+    tag_mode: str = tag_index.MATCH_ALL,
+    fields: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    check_tag_mode(tag_mode)
+    # Signed download URLs are re-issued once per expiry step so cached copies never hold dead links
+    url_bucket = int(datetime.now().timestamp() // EXPIRY_STEP_SECONDS)
+    not_modified = table_versions.check(
+        request, response, ("files", "committee_members"), current_user.id, url_bucket
+    )
+    if not_modified:
+        return not_modified
+    conditions, params = file_conditions(
+        current_user, "f", category, committee_id, meeting_id, mime_type, parse_tags(tags), tag_mode
+    )
     
+    requested = FILE_FIELDS.resolve(fields)
     where_clause = " WHERE " + " AND ".join(conditions) if conditions else ""
-    query = f"SELECT * FROM files{where_clause} ORDER BY created_at DESC"
+    query = f"""
+    SELECT {FILE_FIELDS.select_list(requested)}
+    FROM files f
+    LEFT JOIN document_previews p ON p.content_sha256 = f.content_sha256
+    {where_clause}
+    ORDER BY f.created_at DESC
+    """
     
     results = await execute_query(query, params if params else None, fetch_all=True)
+    await decorate_file_rows(results, requested)
+    return [FileSummary(**row) for row in results]
+
+@app.get("/files/facets")
+async def get_file_facets(
+    category: Optional[str] = None,
+    committee_id: Optional[int] = None,
+    meeting_id: Optional[int] = None,
+    mime_type: Optional[str] = None,
+    tags: Optional[str] = None,
+    tag_mode: str = tag_index.MATCH_ALL,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    check_tag_mode(tag_mode)
+    tag_names = parse_tags(tags)
     
-    for result in results:
-        result['created_at'] = str(result['created_at'])
+    # Access and committee filters map onto counter partitions; anything narrower is aggregated
+    if not (category or meeting_id or mime_type or tag_names):
+        if committee_id:
+            ensure_committee_access(current_user, committee_id)
+            partitions = [committee_id]
+        elif membership.is_admin(current_user.id):
+            partitions = None
+        else:
+            partitions = [tag_index.NO_COMMITTEE, *sorted(membership.committees_for(current_user.id))]
+        return await tag_store.counted_facets(tag_index.FILES, partitions)
     
-    return [FileResponse(**row) for row in results]
+    conditions, params = file_conditions(
+        current_user, "i", category, committee_id, meeting_id, mime_type, tag_names, tag_mode
+    )
+    where_clause = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return await tag_store.aggregated_facets(tag_index.FILES, where_clause, params)
+
+def remove_stored_file(file_path: Path):
+    file_path.unlink(missing_ok=True)
+    shutil.rmtree(thumbnails.variant_dir(file_path), ignore_errors=True)
+
+@app.delete("/files/{file_id}")
+async def delete_file(file_id: int, current_user: CurrentUser = Depends(get_current_user)):
+    query = "SELECT id, file_path, category, mime_type, committee_id, meeting_id, uploaded_by FROM files WHERE id = %s"
+    result = await execute_query(query, (file_id,), fetch_one=True)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="File not found")
+    ensure_committee_access(current_user, result['committee_id'])
+    if result['uploaded_by'] != current_user.id and not membership.is_admin(current_user.id):
+        raise HTTPException(status_code=403, detail="Only the uploader can delete this file")
+    
+    async with transaction() as query:
+        file_tags = await tag_store.tags_of(tag_index.FILES, file_id, query=query)
+        await query("DELETE FROM files WHERE id = %s", (file_id,))
+        await sync_feed.record("files", file_id, change_feed.DELETE, result['committee_id'], query=query)
+        await read_model.enqueue(result['meeting_id'], "file", query=query)
+        partition, facets = file_facets(result, file_tags)
+        await tag_store.adjust(tag_index.FILES, partition, facets, -1, query=query)
+    table_versions.bump("files")
+    
+    await run_in_threadpool(remove_stored_file, Path(result['file_path']))
+    open_files.invalidate(result['file_path'])
+    return {"message": "File deleted successfully"}
+
+def cold_file_response(
+    path: Path,
+    codec: str,
+    filename: str,
+    media_type: str,
+    file_size: Optional[int] = None
+) -> StreamingResponse:
+    # Compressed cold files are decompressed while streaming; ranges are not supported
+    headers = {"Content-Disposition": content_disposition(filename), "Accept-Ranges": "none"}
+    if file_size is not None:
+        headers["Content-Length"] = str(file_size)
+    return StreamingResponse(storage_tiers.iter_blob(path, codec), media_type=media_type, headers=headers)
 
 @app.get("/files/{file_id}/download")
-async def download_file(file_id: int):
+async def download_file(file_id: int, current_user: CurrentUser = Depends(get_current_user)):
     query = "SELECT * FROM files WHERE id = %s"
     result = await execute_query(query, (file_id,), fetch_one=True)
     
     if not result:
         raise HTTPException(status_code=404, detail="File not found")
+    ensure_committee_access(current_user, result['committee_id'])
     
     file_path = Path(result['file_path'])
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found on disk")
     
-    return FileResponse(
+    file_access.touch(result['file_path'])
+    if result['compression']:
+        return cold_file_response(file_path, result['compression'], result['name'], result['mime_type'], result['file_size'])
+    return SendfileResponse(
         path=file_path,
         filename=result['name'],
         media_type=result['mime_type']
     )
 
+@app.get("/files/{file_id}/thumbnail")
+async def get_file_thumbnail(
+    file_id: int,
+    request: Request,
+    w: Optional[int] = None,
+    format: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    query = "SELECT file_path, mime_type, committee_id FROM files WHERE id = %s"
+    result = await execute_query(query, (file_id,), fetch_one=True)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="File not found")
+    ensure_committee_access(current_user, result['committee_id'])
+    if not thumbnails.is_raster_image(result['mime_type']):
+        raise HTTPException(status_code=415, detail="File has no image thumbnail")
+    
+    if format is None:
+        format = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+    if format not in thumbnails.VARIANT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported thumbnail format")
+    
+    file_path = Path(result['file_path'])
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found on disk")
+    
+    try:
+        variant = await thumbnails.ensure_variant(file_path, thumbnails.snap_width(w), format)
+    except Exception as e:
+        print(f"Thumbnail error for file {file_id}: {e}")
+        raise HTTPException(status_code=422, detail="Could not render thumbnail")
+    
+    return SendfileResponse(path=variant, media_type=f"image/{format}")
+
+@app.get("/files/{file_id}/preview")
+async def get_file_preview(file_id: int, current_user: CurrentUser = Depends(get_current_user)):
+    query = """
+    SELECT f.committee_id, p.preview_path
+    FROM files f
+    LEFT JOIN document_previews p ON p.content_sha256 = f.content_sha256
+    WHERE f.id = %s
+    """
+    result = await execute_query(query, (file_id,), fetch_one=True)
+    
+    if not result:
+        raise HTTPException(status_code=404, detail="File not found")
+    ensure_committee_access(current_user, result['committee_id'])
+    if not result['preview_path']:
+        raise HTTPException(status_code=404, detail="Preview not available")
+    
+    return SendfileResponse(path=result['preview_path'], media_type="image/webp")
+
+@app.get("/downloads/{token}")
+async def download_signed_file(token: str):
+    # Links are only issued to users allowed to see the file, and the signature
+    # carries everything needed to serve it, so no database lookup is needed
+    download = verify_download(token, UPLOAD_DIR)
+    if not download.path.exists():
+        raise HTTPException(status_code=404, detail="File not found on disk")
+    
+    file_access.touch(str(download.path))
+    codec = storage_tiers.codec_of(UPLOAD_DIR, download.path)
+    if codec:
+        return cold_file_response(download.path, codec, download.filename, download.media_type)
+    return SendfileResponse(
+        path=download.path,
+        filename=download.filename,
+        media_type=download.media_type
+    )
+
+async def zip_files_response(rows: list, archive_name: str, request: Request) -> Response:
+    entries, missing = await run_in_threadpool(
+        plan_entries,
+        [(row['name'], row['file_path'], row['mime_type'], row['compression'], row['file_size']) for row in rows]
+    )
+    
+    # The archive is deterministic for a given entry list, so the ETag needs no file reads
+    headers = {
+        "ETag": archive_etag(entries),
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": content_disposition(archive_name)
+    }
+    if missing:
+        headers["X-Missing-Files"] = str(len(missing))
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    
+    return StreamingResponse(
+        stream_zip(entries, storage_tiers.open_blob), media_type="application/zip", headers=headers
+    )
+
+@app.get("/meetings/{meeting_id}/files.zip")
+async def download_meeting_files_zip(
+    meeting_id: int,
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    await ensure_meeting_access(current_user, meeting_id)
+    query = "SELECT name, file_path, mime_type, compression, file_size FROM files WHERE meeting_id = %s ORDER BY id"
+    results = await execute_query(query, (meeting_id,), fetch_all=True)
+    return await zip_files_response(results, f"meeting_{meeting_id}_files.zip", request)
+
+@app.get("/committees/{committee_id}/files.zip")
+async def download_committee_files_zip(
+    committee_id: int,
+    request: Request,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    ensure_committee_access(current_user, committee_id)
+    query = "SELECT name, file_path, mime_type, compression, file_size FROM files WHERE committee_id = %s ORDER BY id"
+    results = await execute_query(query, (committee_id,), fetch_all=True)
+    return await zip_files_response(results, f"committee_{committee_id}_files.zip", request)
+
+# =============================================================================
+# RESUMABLE UPLOAD ENDPOINTS
+# =============================================================================
+
+@app.post("/upload-sessions")
+async def create_upload_session(
+    upload: UploadSessionCreate,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    if upload.size <= 0:
+        raise HTTPException(status_code=400, detail="File size must be positive")
+    if upload.purpose not in ("file", "transcription"):
+        raise HTTPException(status_code=400, detail="Unknown upload purpose")
+    if upload.purpose == "transcription" and not upload.filename.lower().endswith(AUDIO_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Unsupported audio format")
+    
+    committee_id = await resolve_file_committee(current_user, upload.committee_id, upload.meeting_id)
+    session = await upload_sessions.create(
+        user_id=current_user.id,
+        filename=upload.filename,
+        size=upload.size,
+        mime_type=mimetypes.guess_type(upload.filename)[0] or "application/octet-stream",
+        purpose=upload.purpose,
+        category=upload.category,
+        committee_id=committee_id,
+        meeting_id=upload.meeting_id,
+        description=upload.description,
+        sha256=upload.sha256,
+        tags=parse_tags(upload.tags)
+    )
+    return session.status()
+
+@app.get("/upload-sessions/{upload_id}")
+async def get_upload_session(upload_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    session = await upload_sessions.get(upload_id, current_user.id)
+    return session.status()
+
+@app.put("/upload-sessions/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    x_chunk_sha256: Optional[str] = Header(None),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    session = await upload_sessions.write_chunk(
+        upload_id, current_user.id, offset, request.stream(), x_chunk_sha256
+    )
+    return session.status()
+
+@app.post("/upload-sessions/{upload_id}/finalize")
+async def finalize_upload_session(upload_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    session = await upload_sessions.get(upload_id, current_user.id)
+    prefix = "audio_" if session.purpose == "transcription" else ""
+    file_path, file_hash = unique_upload_path(session.filename, prefix)
+    
+    session, sha256 = await upload_sessions.finalize(upload_id, current_user.id, file_path)
+    registered = await register_file(
+        session.filename, file_path, session.size, session.mime_type, session.category,
+        session.committee_id, session.meeting_id, session.description, current_user.id,
+        sha256=sha256, tag_names=session.tags
+    )
+    registered["sha256"] = sha256
+    if session.purpose == "transcription":
+        registered["transcription_id"] = f"trans_{file_hash}"
+        registered["status"] = "processing"
+    return registered
+
+@app.delete("/upload-sessions/{upload_id}")
+async def cancel_upload_session(upload_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    await upload_sessions.discard(upload_id, current_user.id)
+    return {"message": "Upload session cancelled"}
+
+# =============================================================================
+# ATTENDANCE ENDPOINTS
+# =============================================================================
+
+def ensure_self_or_admin(current_user: CurrentUser, user_id: Optional[int]) -> int:
+    if user_id is None or user_id == current_user.id:
+        return current_user.id
+    if not membership.is_admin(current_user.id):
+        raise HTTPException(status_code=403, detail="Administrator role required")
+    return user_id
+
+async def ensure_users_exist(user_ids: set):
+    # Checked up front: one unknown user would fail the whole write-behind batch
+    placeholders = ", ".join(["%s"] * len(user_ids))
+    rows = await execute_query(
+        f"SELECT id FROM users WHERE id IN ({placeholders})", sorted(user_ids), fetch_all=True
+    )
+    unknown = user_ids - {row['id'] for row in rows}
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Unknown users: {sorted(unknown)}")
+
+def check_in_status(status: str) -> str:
+    if status not in attendance_live.STATUSES:
+        raise HTTPException(status_code=422, detail=f"status must be one of {', '.join(attendance_live.STATUSES)}")
+    return status
+
+@app.post("/meetings/{meeting_id}/attendance")
+async def check_in(
+    meeting_id: int,
+    entry: AttendanceCheckIn,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Check yourself in (or, as an administrator, anyone); returns the live quorum"""
+    committee_id = await ensure_meeting_access(current_user, meeting_id)
+    status = check_in_status(entry.status)
+    user_id = ensure_self_or_admin(current_user, entry.user_id)
+    if user_id != current_user.id:
+        await ensure_users_exist({user_id})
+    return await attendance_book.check_in(meeting_id, committee_id, [(user_id, status)])
+
+@app.post("/meetings/{meeting_id}/attendance/bulk")
+async def check_in_bulk(
+    meeting_id: int,
+    bulk: AttendanceBulk,
+    current_user: CurrentUser = Depends(require_admin)
+):
+    """Record a roll call in one request"""
+    committee_id = await ensure_meeting_access(current_user, meeting_id)
+    if not bulk.entries:
+        raise HTTPException(status_code=422, detail="No entries")
+    if len(bulk.entries) > attendance_live.MAX_BULK:
+        raise HTTPException(status_code=413, detail=f"At most {attendance_live.MAX_BULK} entries per request")
+    if any(entry.user_id is None for entry in bulk.entries):
+        raise HTTPException(status_code=422, detail="Every entry needs a user_id")
+    entries = [(entry.user_id, check_in_status(entry.status)) for entry in bulk.entries]
+    await ensure_users_exist({user_id for user_id, _ in entries})
+    return await attendance_book.check_in(meeting_id, committee_id, entries)
+
+@app.get("/meetings/{meeting_id}/attendance")
+async def get_attendance(meeting_id: int, current_user: CurrentUser = Depends(get_current_user)):
+    """Who has checked in, and whether the meeting is quorate, from memory"""
+    committee_id = await ensure_meeting_access(current_user, meeting_id)
+    presence = await attendance_book.meeting(meeting_id, committee_id)
+    return attendance_book.snapshot(presence)
+
+@app.get("/meetings/{meeting_id}/attendance/stream")
+async def stream_attendance(meeting_id: int, current_user: CurrentUser = Depends(get_current_user)):
+    """Server-Sent Events: a snapshot, then the quorum counter on every check-in"""
+    committee_id = await ensure_meeting_access(current_user, meeting_id)
+    return StreamingResponse(
+        attendance_book.events(meeting_id, committee_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# =============================================================================
+# LIVE SESSION ENDPOINTS
+# =============================================================================
+
+ITEM_TRANSITIONS = {"start": "start_item", "complete": "complete_item", "defer": "defer_item"}
+
+@app.post("/meetings/{meeting_id}/session")
+async def start_session(meeting_id: int, current_user: CurrentUser = Depends(require_admin)):
+    """Open the live session: the agenda is loaded once and run from memory until the session ends"""
+    committee_id = await ensure_meeting_access(current_user, meeting_id)
+    session = await meeting_sessions.start(meeting_id, committee_id)
+    return live_sessions.view(session)
+
+@app.get("/meetings/{meeting_id}/session")
+async def get_session(meeting_id: int, current_user: CurrentUser = Depends(get_current_user)):
+    """Agenda progress, item clocks and speakers; from memory while the session runs"""
+    await ensure_meeting_access(current_user, meeting_id)
+    session = meeting_sessions.get(meeting_id) or await meeting_sessions.last_snapshot(meeting_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="No session for this meeting")
+    return live_sessions.view(session)
+
+@app.post("/meetings/{meeting_id}/session/items/{agenda_item_id}/{transition}")
+async def transition_agenda_item(
+    meeting_id: int,
+    agenda_item_id: int,
+    transition: str,
+    current_user: CurrentUser = Depends(require_admin)
+):
+    """Take up (`start`), `complete` or `defer` an agenda item"""
+    if transition not in ITEM_TRANSITIONS:
+        raise HTTPException(status_code=404, detail=f"transition must be one of {', '.join(ITEM_TRANSITIONS)}")
+    await ensure_meeting_access(current_user, meeting_id)
+    session = await meeting_sessions.execute(meeting_id, ITEM_TRANSITIONS[transition], agenda_item_id=agenda_item_id)
+    return live_sessions.view(session)
+
+@app.post("/meetings/{meeting_id}/session/speakers")
+async def request_floor(
+    meeting_id: int,
+    request: SpeakerRequest,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Join the speaker queue for the item under discussion"""
+    await ensure_meeting_access(current_user, meeting_id)
+    user_id = ensure_self_or_admin(current_user, request.user_id)
+    session = await meeting_sessions.execute(meeting_id, "request_floor", user_id=user_id)
+    return live_sessions.view(session)
+
+@app.post("/meetings/{meeting_id}/session/speakers/next")
+async def next_speaker(meeting_id: int, current_user: CurrentUser = Depends(require_admin)):
+    """Give the floor to the first member in the queue"""
+    await ensure_meeting_access(current_user, meeting_id)
+    session = await meeting_sessions.execute(meeting_id, "next_speaker")
+    return live_sessions.view(session)
+
+@app.delete("/meetings/{meeting_id}/session/speakers/{user_id}")
+async def withdraw_from_floor(meeting_id: int, user_id: int, current_user: CurrentUser = Depends(get_current_user)):
+    await ensure_meeting_access(current_user, meeting_id)
+    user_id = ensure_self_or_admin(current_user, user_id)
+    session = await meeting_sessions.execute(meeting_id, "withdraw", user_id=user_id)
+    return live_sessions.view(session)
+
+@app.post("/meetings/{meeting_id}/session/end")
+async def end_session(meeting_id: int, current_user: CurrentUser = Depends(require_admin)):
+    """Close the session; the meeting is marked completed with the final snapshot"""
+    await ensure_meeting_access(current_user, meeting_id)
+    session = await meeting_sessions.execute(meeting_id, "end")
+    return live_sessions.view(session)
+
 # =============================================================================
 # VOTE ENDPOINTS
 # =============================================================================
 
 @app.post("/votes/", response_model=VoteResponse)
-async def create_vote(vote: VoteCreate):
-    # Check if user already voted for this meeting
-    check_query = "SELECT id FROM votes WHERE meeting_id = %s AND user_id = %s"
-    existing = await execute_query(check_query, (vote.meeting_id, 1), fetch_one=True)
-    
-    if existing:
-        # Update existing vote
-        query = "UPDATE votes SET opt = %s WHERE id = %s"
-        await execute_query(query, (vote.opt, existing['id']))
-        vote_id = existing['id']
-    else:
-        # Create new vote
-        query = "INSERT INTO votes (meeting_id, user_id, opt, created_at) VALUES (%s, %s, %s, %s)"
-        vote_id = await execute_query(
-            query, 
-            (vote.meeting_id, 1, vote.opt, datetime.now())
+async def create_vote(vote: VoteCreate, current_user: CurrentUser = Depends(get_current_user)):
+    await ensure_meeting_access(current_user, vote.meeting_id)
+    opt_code = vote_codes.code_of(vote.opt)
+    if opt_code is None:
+        raise HTTPException(status_code=422, detail=f"Unknown ballot option: {vote.opt}")
+    if vote.agenda_item_id is not None:
+        item = await execute_query(
+            "SELECT meeting_id FROM agenda_items WHERE id = %s", (vote.agenda_item_id,), fetch_one=True
         )
-    
-    # Fetch the vote
-    query = "SELECT * FROM votes WHERE id = %s"
-    result = await execute_query(query, (vote_id,), fetch_one=True)
+        if not item or item['meeting_id'] != vote.meeting_id:
+            raise HTTPException(status_code=404, detail="Agenda item not found in this meeting")
+
+    # Queued with concurrent ballots and committed in one multi-row upsert;
+    # returns once the batch is durable. A repeat ballot replaces the member's earlier one,
+    # and the batch refuses ballots for meetings that are completed or cancelled.
+    try:
+        result = await vote_batcher.submit(vote.meeting_id, current_user.id, opt_code, vote.agenda_item_id or 0)
+    except vote_ingest.VotingClosedError:
+        raise HTTPException(status_code=409, detail="Voting for this meeting is closed")
+    except aiomysql.IntegrityError as e:
+        # Only this ballot was rejected; the rest of its batch committed
+        print(f"Ballot rejected: {e}")
+        raise HTTPException(status_code=404, detail="Meeting or member no longer exists")
+    except Exception as e:
+        print(f"Vote batch error: {e}")
+        raise HTTPException(status_code=500, detail="Ballot could not be recorded")
+    result.pop('committee_id', None)
     result['created_at'] = str(result['created_at'])
+    result['agenda_item_id'] = result['agenda_item_id'] or None
+    result['opt'] = vote_codes.name(result.pop('opt_code'))
     
     return VoteResponse(**result)
 
 @app.get("/votes/meeting/{meeting_id}")
-async def get_votes_by_meeting(meeting_id: int):
-    # Get vote counts
-    query = """
-    SELECT opt, COUNT(*) as count 
+async def get_votes_by_meeting(meeting_id: int, current_user: CurrentUser = Depends(get_current_user)):
+    await ensure_meeting_access(current_user, meeting_id)
+    
+    # Get vote counts (meeting-level ballots; agenda item tallies are in vote_results)
+    query = f"""
+    SELECT {vote_codes.name_sql()} AS opt, COUNT(*) as count 
     FROM votes 
-    WHERE meeting_id = %s 
-    GROUP BY opt
+    WHERE meeting_id = %s AND agenda_item_id = 0
+    GROUP BY opt_code, opt
     """
-    results = await execute_query(query, (meeting_id,), fetch_all=True)
+    results = await execute_query(query, (meeting_id,), fetch_all=True, coalesce=True)
     
     # Get total voters
-    total_query = "SELECT COUNT(DISTINCT user_id) as total FROM votes WHERE meeting_id = %s"
-    total_result = await execute_query(total_query, (meeting_id,), fetch_one=True)
+    total_query = "SELECT COUNT(DISTINCT user_id) as total FROM votes WHERE meeting_id = %s AND agenda_item_id = 0"
+    total_result = await execute_query(total_query, (meeting_id,), fetch_one=True, coalesce=True)
     
     return {
         "meeting_id": meeting_id,
@@ -476,21 +1706,97 @@ async def get_votes_by_meeting(meeting_id: int):
         "total_voters": total_result['total'] if total_result else 0
     }
 
+@app.get("/agenda-items/{agenda_item_id}/vote-result")
+async def get_agenda_item_vote_result(agenda_item_id: int, current_user: CurrentUser = Depends(get_current_user)):
+    """Server-maintained tally for an agenda item, with the quorum it was decided against"""
+    numbers = await vote_tally.standing(execute_query, agenda_item_id)
+    if not numbers:
+        raise HTTPException(status_code=404, detail="Agenda item not found")
+    await ensure_meeting_access(current_user, numbers['meeting_id'])
+    result = await execute_query(
+        "SELECT * FROM vote_results WHERE agenda_item_id = %s", (agenda_item_id,), fetch_one=True
+    )
+    if result:
+        result['voted_at'] = str(result['voted_at'])
+    return {
+        "agenda_item_id": agenda_item_id,
+        "result": result,
+        **vote_tally.quorum(numbers['members'], numbers['present']),
+    }
+
+@app.get("/committees/{committee_id}/vote-history")
+async def get_vote_history(
+    committee_id: int,
+    year: Optional[int] = None,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Archived ballots of closed meetings, read from the columnar archive instead of `votes`"""
+    ensure_committee_access(current_user, committee_id)
+    if year is None:
+        return {"committee_id": committee_id, "years": vote_history.years(committee_id)}
+    columns = await vote_history.read(committee_id, year)
+    options: Dict[str, int] = {}
+    for code in columns["opt_code"]:
+        name = vote_codes.name(code) or "other"
+        options[name] = options.get(name, 0) + 1
+    return {
+        "committee_id": committee_id,
+        "year": year,
+        "ballots": len(columns["opt_code"]),
+        "meetings": len(set(columns["meeting_id"])),
+        "options": options,
+    }
+
+@app.get("/committees/{committee_id}/vote-analytics")
+async def get_vote_analytics(
+    committee_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    period: str = "month",
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Participation, abstention, pairwise agreement/similarity and trends for the committee's members"""
+    ensure_committee_access(current_user, committee_id)
+    if not vote_analytics.available():
+        raise HTTPException(status_code=503, detail="Vote analytics require numpy")
+    if period not in vote_analytics.PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(vote_analytics.PERIODS)}")
+    report = await vote_insights.report(committee_id, since, until, period)
+
+    names = {}
+    if report["member_ids"]:
+        placeholders = ", ".join(["%s"] * len(report["member_ids"]))
+        users = await execute_query(
+            f"SELECT id, name FROM users WHERE id IN ({placeholders})", report["member_ids"], fetch_all=True
+        )
+        names = {row['id']: row['name'] for row in users}
+    return {
+        "committee_id": committee_id,
+        **report,
+        "members": [{**member, "name": names.get(member["user_id"])} for member in report["members"]],
+    }
+
 # =============================================================================
 # ANNOUNCEMENT ENDPOINTS
 # =============================================================================
 
 @app.post("/announcements/", response_model=AnnouncementResponse)
-async def create_announcement(announcement: AnnouncementCreate):
-    query = """
+async def create_announcement(
+    announcement: AnnouncementCreate,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    insert = """
     INSERT INTO announcements (title, content, priority, category, expires_at, created_by, created_at)
     VALUES (%s, %s, %s, %s, %s, %s, %s)
     """
-    announcement_id = await execute_query(
-        query,
-        (announcement.title, announcement.content, announcement.priority,
-         announcement.category, announcement.expires_at, 1, datetime.now())
-    )
+    async with transaction() as query:
+        announcement_id = await query(
+            insert,
+            (announcement.title, announcement.content, announcement.priority,
+             announcement.category, announcement.expires_at, current_user.id, datetime.now())
+        )
+        await sync_feed.record("announcements", announcement_id, query=query)
+    table_versions.bump("announcements")
     
     query = "SELECT * FROM announcements WHERE id = %s"
     result = await execute_query(query, (announcement_id,), fetch_one=True)
@@ -501,41 +1807,69 @@ async def create_announcement(announcement: AnnouncementCreate):
     
     return AnnouncementResponse(**result)
 
-@app.get("/announcements/", response_model=List[AnnouncementResponse])
-async def get_announcements(active_only: bool = True):
+ANNOUNCEMENT_FIELDS = Projection(
+    {
+        "id": "id", "title": "title", "content": "content", "priority": "priority", "category": "category",
+        "expires_at": "expires_at", "created_by": "created_by", "created_at": "created_at",
+    },
+    default=("id", "title", "content", "priority", "category", "expires_at", "created_by", "created_at"),
+)
+
+@app.get("/announcements/", response_model=List[AnnouncementSummary], response_model_exclude_unset=True)
+async def get_announcements(
+    request: Request,
+    response: Response,
+    active_only: bool = True,
+    fields: Optional[str] = None
+):
+    # Active announcements also change as they expire, so the tag rolls over every minute
+    expiry_bucket = int(datetime.now().timestamp() // 60) if active_only else 0
+    not_modified = table_versions.check(request, response, ("announcements",), expiry_bucket)
+    if not_modified:
+        return not_modified
+    
+    columns = ANNOUNCEMENT_FIELDS.select_list(ANNOUNCEMENT_FIELDS.resolve(fields))
     if active_only:
-        query = """
-        SELECT * FROM announcements 
+        query = f"""
+        SELECT {columns} FROM announcements 
         WHERE expires_at IS NULL OR expires_at > %s 
         ORDER BY priority DESC, created_at DESC
         """
         results = await execute_query(query, (datetime.now(),), fetch_all=True)
     else:
-        query = "SELECT * FROM announcements ORDER BY created_at DESC"
+        query = f"SELECT {columns} FROM announcements ORDER BY created_at DESC"
         results = await execute_query(query, fetch_all=True)
     
     for result in results:
         if result.get('expires_at'):
             result['expires_at'] = str(result['expires_at'])
-        result['created_at'] = str(result['created_at'])
+        if result.get('created_at'):
+            result['created_at'] = str(result['created_at'])
     
-    return [AnnouncementResponse(**row) for row in results]
+    return [AnnouncementSummary(**row) for row in results]
 
 # =============================================================================
 # TASK ENDPOINTS
 # =============================================================================
 
 @app.post("/tasks/", response_model=TaskResponse)
-async def create_task(task: TaskCreate):
-    query = """
+async def create_task(task: TaskCreate, current_user: CurrentUser = Depends(get_current_user)):
+    committee_id = None
+    if task.meeting_id:
+        committee_id = await ensure_meeting_access(current_user, task.meeting_id)
+    
+    insert = """
     INSERT INTO tasks (title, description, assigned_to, meeting_id, due_date, priority, status, created_by, created_at)
     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
-    task_id = await execute_query(
-        query,
-        (task.title, task.description, task.assigned_to, task.meeting_id,
-         task.due_date, task.priority, "pending", 1, datetime.now())
-    )
+    async with transaction() as query:
+        task_id = await query(
+            insert,
+            (task.title, task.description, task.assigned_to, task.meeting_id,
+             task.due_date, task.priority, "pending", current_user.id, datetime.now())
+        )
+        await sync_feed.record("tasks", task_id, committee_id=committee_id, query=query)
+    table_versions.bump("tasks")
     
     query = "SELECT * FROM tasks WHERE id = %s"
     result = await execute_query(query, (task_id,), fetch_one=True)
@@ -546,8 +1880,20 @@ async def create_task(task: TaskCreate):
     
     return TaskResponse(**result)
 
-@app.get("/tasks/", response_model=List[TaskResponse])
-async def get_tasks(assigned_to: Optional[int] = None, status: Optional[str] = None):
+TASK_FIELDS = Projection(
+    {
+        "id": "id", "title": "title", "description": "description", "assigned_to": "assigned_to",
+        "meeting_id": "meeting_id", "due_date": "due_date", "priority": "priority", "status": "status",
+        "created_by": "created_by", "created_at": "created_at",
+    },
+    default=(
+        "id", "title", "description", "assigned_to", "meeting_id", "due_date", "priority", "status",
+        "created_by", "created_at",
+    ),
+)
+
+@app.get("/tasks/", response_model=List[TaskSummary], response_model_exclude_unset=True)
+async def get_tasks(assigned_to: Optional[int] = None, status: Optional[str] = None, fields: Optional[str] = None):
     conditions = []
     params = []
     
@@ -559,70 +1905,253 @@ async def get_tasks(assigned_to: Optional[int] = None, status: Optional[str] = N
         params.append(status)
     
     where_clause = " WHERE " + " AND ".join(conditions) if conditions else ""
-    query = f"SELECT * FROM tasks{where_clause} ORDER BY due_date ASC"
+    columns = TASK_FIELDS.select_list(TASK_FIELDS.resolve(fields))
+    query = f"SELECT {columns} FROM tasks{where_clause} ORDER BY due_date ASC"
     
     results = await execute_query(query, params if params else None, fetch_all=True)
     
     for result in results:
         if result.get('due_date'):
             result['due_date'] = str(result['due_date'])
-        result['created_at'] = str(result['created_at'])
+        if result.get('created_at'):
+            result['created_at'] = str(result['created_at'])
     
-    return [TaskResponse(**row) for row in results]
+    return [TaskSummary(**row) for row in results]
 
 # =============================================================================
 # LIBRARY ENDPOINTS
 # =============================================================================
 
 @app.post("/library/", response_model=LibraryDocumentResponse)
-async def create_library_document(document: LibraryDocumentCreate):
-    query = """
-    INSERT INTO library (title, category, content, tags, is_public, created_by, created_at)
-    VALUES (%s, %s, %s, %s, %s, %s, %s)
+async def create_library_document(
+    document: LibraryDocumentCreate,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    insert = """
+    INSERT INTO library (title, category, content, content_sha256, excerpt, tags, is_public, created_by, created_at)
+    VALUES (%s, %s, '', %s, %s, %s, %s, %s, %s)
     """
-    doc_id = await execute_query(
-        query,
-        (document.title, document.category, document.content,
-         document.tags, document.is_public, 1, datetime.now())
-    )
+    content_sha256 = await library_store.put(document.content)
+    async with transaction() as query:
+        doc_id = await query(
+            insert,
+            (document.title, document.category, content_sha256, make_excerpt(document.content),
+             document.tags, document.is_public, current_user.id, datetime.now())
+        )
+        await sync_feed.record("library", doc_id, query=query)
+        tag_names = await tag_store.set_tags(tag_index.LIBRARY, doc_id, parse_tags(document.tags), query=query)
+        partition, facets = library_facets(
+            {"category": document.category, "is_public": document.is_public}, tag_names
+        )
+        await tag_store.adjust(tag_index.LIBRARY, partition, facets, 1, query=query)
+    table_versions.bump("library")
     
     query = "SELECT * FROM library WHERE id = %s"
     result = await execute_query(query, (doc_id,), fetch_one=True)
     result['created_at'] = str(result['created_at'])
+    result['content'] = document.content
     
     return LibraryDocumentResponse(**result)
 
-@app.get("/library/", response_model=List[LibraryDocumentResponse])
-async def get_library_documents(
-    category: Optional[str] = None,
-    search: Optional[str] = None,
-    public_only: bool = True
-):
+def library_conditions(
+    category: Optional[str],
+    search: Optional[str],
+    public_only: bool,
+    tag_names: List[str],
+    tag_mode: str,
+    alias: str = "library"
+) -> tuple[list, list]:
     conditions = []
     params = []
     
     if public_only:
-        conditions.append("is_public = %s")
+        conditions.append(f"{alias}.is_public = %s")
         params.append(True)
     
     if category:
-        conditions.append("category = %s")
+        conditions.append(f"{alias}.category = %s")
         params.append(category)
     
     if search:
-        conditions.append("(title LIKE %s OR content LIKE %s OR tags LIKE %s)")
+        # Bodies live out of row and are matched through their FULLTEXT index;
+        # the inline column still covers rows not yet migrated
+        conditions.append(
+            f"({alias}.title LIKE %s OR {alias}.excerpt LIKE %s OR {alias}.tags LIKE %s"
+            f" OR {alias}.content LIKE %s"
+            f" OR {library_bodies.SEARCH_CONDITION.format(alias=alias)})"
+        )
         search_term = f"%{search}%"
-        params.extend([search_term, search_term, search_term])
+        params.extend([search_term] * 4)
+        params.append(search)
     
+    tag_condition, tag_params = tag_filter(tag_index.LIBRARY, tag_names, tag_mode, f"{alias}.id")
+    if tag_condition:
+        conditions.append(tag_condition)
+        params.extend(tag_params)
+    return conditions, params
+
+LIBRARY_FIELDS = Projection(
+    {
+        "id": "id", "title": "title", "category": "category", "excerpt": "excerpt", "tags": "tags",
+        "is_public": "is_public", "created_by": "created_by", "created_at": "created_at",
+    },
+    default=("id", "title", "category", "excerpt", "tags", "is_public", "created_by", "created_at"),
+)
+
+@app.get("/library/", response_model=List[LibraryDocumentSummary], response_model_exclude_unset=True)
+async def get_library_documents(
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    public_only: bool = True,
+    tags: Optional[str] = None,
+    tag_mode: str = tag_index.MATCH_ALL,
+    fields: Optional[str] = None
+):
+    check_tag_mode(tag_mode)
+    conditions, params = library_conditions(category, search, public_only, parse_tags(tags), tag_mode)
+    
+    columns = LIBRARY_FIELDS.select_list(LIBRARY_FIELDS.resolve(fields))
     where_clause = " WHERE " + " AND ".join(conditions) if conditions else ""
-    query = f"SELECT * FROM library{where_clause} ORDER BY created_at DESC"
+    query = f"SELECT {columns} FROM library{where_clause} ORDER BY created_at DESC"
     
     results = await execute_query(query, params if params else None, fetch_all=True)
     
     for result in results:
-        result['created_at'] = str(result['created_at'])
+        if result.get('created_at'):
+            result['created_at'] = str(result['created_at'])
     
-    return [LibraryDocumentResponse(**row) for row in results]
+    return [LibraryDocumentSummary(**row) for row in results]
+
+@app.get("/library/facets")
+async def get_library_facets(
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    public_only: bool = True,
+    tags: Optional[str] = None,
+    tag_mode: str = tag_index.MATCH_ALL
+):
+    check_tag_mode(tag_mode)
+    tag_names = parse_tags(tags)
+    if not (category or search or tag_names):
+        return await tag_store.counted_facets(tag_index.LIBRARY, [1] if public_only else None)
+    
+    conditions, params = library_conditions(category, search, public_only, tag_names, tag_mode, "i")
+    where_clause = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return await tag_store.aggregated_facets(tag_index.LIBRARY, where_clause, params)
+
+@app.get("/library/{doc_id}", response_model=LibraryDocumentResponse)
+async def get_library_document(doc_id: int):
+    query = "SELECT * FROM library WHERE id = %s"
+    result = await execute_query(query, (doc_id,), fetch_one=True)
+    if not result:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if result['content_sha256']:
+        result['content'] = await library_store.get(result['content_sha256'])
+        if result['content'] is None:
+            raise HTTPException(status_code=500, detail="Document body is missing")
+    result['created_at'] = str(result['created_at'])
+    return LibraryDocumentResponse(**result)
+
+# =============================================================================
+# SYNC ENDPOINTS
+# =============================================================================
+
+VOTE_FIELDS = Projection(
+    {"id": "id", "meeting_id": "meeting_id", "agenda_item_id": "NULLIF(agenda_item_id, 0)",
+     "user_id": "user_id", "opt": vote_codes.name_sql(), "created_at": "created_at"},
+    default=("id", "meeting_id", "agenda_item_id", "user_id", "opt", "created_at"),
+)
+
+AGENDA_ITEM_FIELDS = Projection(
+    {
+        "id": "id", "meeting_id": "meeting_id", "order_index": "order_index", "title": "title",
+        "description": "description", "category": "category", "presenter": "presenter",
+        "estimated_duration": "estimated_duration", "status": "status",
+        "introduction_file": "introduction_file", "decision_file": "decision_file",
+        "created_at": "created_at", "updated_at": "updated_at",
+    },
+    default=("id", "meeting_id", "order_index", "title", "description", "category", "presenter",
+             "estimated_duration", "status", "introduction_file", "decision_file", "created_at", "updated_at"),
+)
+
+AGENDA_COMMENT_FIELDS = Projection(
+    {"id": "id", "agenda_item_id": "agenda_item_id", "user_id": "user_id", "comment": "comment",
+     "created_at": "created_at", "updated_at": "updated_at"},
+    default=("id", "agenda_item_id", "user_id", "comment", "created_at", "updated_at"),
+)
+
+# Logged by agenda item, the row's unique key
+VOTE_RESULT_FIELDS = Projection(
+    {"agenda_item_id": "agenda_item_id", "votes_for": "votes_for", "votes_against": "votes_against",
+     "votes_abstain": "votes_abstain", "total_votes": "total_votes", "result": "result", "voted_at": "voted_at"},
+    default=("agenda_item_id", "votes_for", "votes_against", "votes_abstain", "total_votes", "result", "voted_at"),
+    key="agenda_item_id",
+)
+
+# Entity name in change_log -> (FROM clause, projection); rows are sent in their list-view shape
+SYNC_SOURCES = {
+    "committees": ("committees", COMMITTEE_FIELDS),
+    "meetings": ("meetings", MEETING_FIELDS),
+    "files": ("files f LEFT JOIN document_previews p ON p.content_sha256 = f.content_sha256", FILE_FIELDS),
+    "votes": ("votes", VOTE_FIELDS),
+    "announcements": ("announcements", ANNOUNCEMENT_FIELDS),
+    "tasks": ("tasks", TASK_FIELDS),
+    "library": ("library", LIBRARY_FIELDS),
+    "agenda_items": ("agenda_items", AGENDA_ITEM_FIELDS),
+    "agenda_comments": ("agenda_comments", AGENDA_COMMENT_FIELDS),
+    "vote_results": ("vote_results", VOTE_RESULT_FIELDS),
+}
+
+async def load_sync_rows(entity: str, ids: List[int]) -> list:
+    source, projection = SYNC_SOURCES[entity]
+    requested = projection.default
+    placeholders = ", ".join(["%s"] * len(ids))
+    query = f"""
+    SELECT {projection.select_list(requested)} FROM {source}
+    WHERE {projection.columns[projection.key]} IN ({placeholders})
+    """
+    results = await execute_query(query, ids, fetch_all=True)
+    if entity == "files":
+        return await decorate_file_rows(results, requested)
+    for result in results:
+        for column, value in result.items():
+            if isinstance(value, datetime):
+                result[column] = str(value)
+    return results
+
+@app.get("/sync")
+async def sync_changes(
+    since: Optional[str] = None,
+    limit: int = change_feed.SYNC_BATCH_SIZE,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    try:
+        since_seq = int(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    limit = max(1, min(limit, change_feed.SYNC_MAX_BATCH_SIZE))
+    
+    if membership.is_admin(current_user.id):
+        visible = lambda committee_id: True
+    else:
+        committee_ids = membership.committees_for(current_user.id)
+        visible = lambda committee_id: committee_id is None or committee_id in committee_ids
+    batch = await sync_feed.changes(since_seq, visible, limit)
+    
+    changes = {}
+    for entity, ids in batch["entities"].items():
+        if entity not in SYNC_SOURCES:
+            continue
+        # A row deleted after its upsert entry is simply absent; its tombstone follows in a later batch
+        upserts = await load_sync_rows(entity, ids["upserts"]) if ids["upserts"] else []
+        changes[entity] = {"upserts": upserts, "deletes": ids["deletes"]}
+    
+    return {
+        "token": str(batch["token"]),
+        "reset": batch["reset"],
+        "has_more": batch["has_more"],
+        "changes": changes,
+    }
 
 # =============================================================================
 # TRANSCRIPTION ENDPOINTS
@@ -634,14 +2163,11 @@ async def upload_audio_for_transcription(
     meeting_id: Optional[int] = Form(None)
 ):
     # Basic file validation
-    if not file.filename.lower().endswith(('.mp3', '.wav', '.m4a', '.ogg')):
+    if not file.filename.lower().endswith(AUDIO_EXTENSIONS):
         raise HTTPException(status_code=400, detail="Unsupported audio format")
     
     # Save file
-    file_extension = file.filename.split(".")[-1]
-    file_hash = hashlib.md5(f"{file.filename}{datetime.now()}".encode()).hexdigest()
-    unique_filename = f"audio_{file_hash}.{file_extension}"
-    file_path = UPLOAD_DIR / unique_filename
+    file_path, file_hash = unique_upload_path(file.filename, "audio_")
     
     async with aiofiles.open(file_path, 'wb') as f:
         content = await file.read()
@@ -675,11 +2201,16 @@ async def get_transcription_status(transcription_id: str):
 @app.get("/calendar/events")
 async def get_calendar_events(
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     conditions = []
     params = []
     
+    allowed_condition, allowed_params = committee_filter(current_user, "m.committee_id")
+    if allowed_condition:
+        conditions.append(allowed_condition)
+        params.extend(allowed_params)
     if start_date:
         conditions.append("scheduled_at >= %s")
         params.append(start_date)
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
@@ -6,7 +6,16 @@ import uvicorn
 import asyncio
 import aiomysql
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+from auth import CurrentUser, get_current_user
+from authorization import ADMIN_ROLE
+from singleflight import SingleFlight, freeze_params, copy_rows
+import vote_tally
+import vote_codes
+import vote_ingest
+from meeting_read_model import ENQUEUE_SQL, ENQUEUE_FOR_AGENDA_ITEM_SQL
+from change_feed import RECORD_SQL, RECORD_FOR_MEETING_SQL, RECORD_FOR_AGENDA_ITEM_SQL, UPSERT
 
 load_dotenv()
 
@@ -31,6 +40,8 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
+read_coalescer = SingleFlight("read_queries")
+
 # Pydantic models for request/response
 class CommitteeCreate(BaseModel):
     name: str
@@ -90,12 +101,8 @@ class AgendaItemResponse(BaseModel):
 
 # Vote Result models
 class VoteResultCreate(BaseModel):
+    # Counts and result are computed from the item's ballots (vote_tally)
     agenda_item_id: int
-    votes_for: int = 0
-    votes_against: int = 0
-    votes_abstain: int = 0
-    total_votes: int = 0
-    result: str  # 'approved', 'rejected', 'no_quorum'
 
 class VoteResultResponse(BaseModel):
     id: int
@@ -125,10 +132,12 @@ class AgendaCommentResponse(BaseModel):
 class VoteCreate(BaseModel):
     meeting_id: int
     opt: str
+    agenda_item_id: Optional[int] = None
 
 class VoteResponse(BaseModel):
     id: int
     meeting_id: int
+    agenda_item_id: Optional[int] = None
     user_id: int
     opt: str
     created_at: str
@@ -142,7 +151,17 @@ async def get_db_connection():
         print(f"Database connection error: {e}")
         raise HTTPException(status_code=500, detail="Database connection failed")
 
-async def execute_query(query: str, params=None, fetch_one=False, fetch_all=False):
+async def execute_query(query: str, params=None, fetch_one=False, fetch_all=False, coalesce=False):
+    # Hot read paths opt in to sharing one in-flight query between identical concurrent requests
+    if coalesce and (fetch_one or fetch_all):
+        key = (query, freeze_params(params), fetch_one)
+        result = await read_coalescer.do(
+            key, lambda: run_query(query, params, fetch_one=fetch_one, fetch_all=fetch_all)
+        )
+        return copy_rows(result)
+    return await run_query(query, params, fetch_one=fetch_one, fetch_all=fetch_all)
+
+async def run_query(query: str, params=None, fetch_one=False, fetch_all=False):
     connection = await get_db_connection()
     try:
         async with connection.cursor(aiomysql.DictCursor) as cursor:
@@ -166,14 +185,42 @@ async def execute_query(query: str, params=None, fetch_one=False, fetch_all=Fals
 def read_root():
     return {"message": "Extended Meetings Management API with MySQL", "version": "2.0.0", "features": ["agenda_items", "vote_results", "agenda_comments"]}
 
+@asynccontextmanager
+async def transaction():
+    """
+    Yield a query function whose statements commit together when the block
+    exits, or not at all. Writes record their change_log entry (for /sync) and
+    meeting_outbox row (for main_complete's read model) through it.
+    """
+    connection = await get_db_connection()
+    try:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            async def query(query: str, params=None, fetch_one=False, fetch_all=False):
+                await cursor.execute(query, params)
+                if fetch_one:
+                    return await cursor.fetchone()
+                if fetch_all:
+                    return await cursor.fetchall()
+                return cursor.lastrowid
+            yield query
+        await connection.commit()
+    except HTTPException:
+        await connection.rollback()
+        raise
+    except Exception as e:
+        await connection.rollback()
+        print(f"Query error: {e}")
+        raise HTTPException(status_code=500, detail=f"Database query failed: {str(e)}")
+    finally:
+        connection.close()
+
 # Committee endpoints
 @app.post("/committees/", response_model=CommitteeResponse)
 async def create_committee(committee: CommitteeCreate):
     query = "INSERT INTO committees (name, description) VALUES (%s, %s)"
-    committee_id = await execute_query(
-        query, 
-        (committee.name, committee.description)
-    )
+    async with transaction() as db:
+        committee_id = await db(query, (committee.name, committee.description))
+        await db(RECORD_SQL, ("committees", committee_id, UPSERT, committee_id))
     
     # Fetch the created committee
     query = "SELECT * FROM committees WHERE id = %s"
@@ -194,11 +241,14 @@ async def create_meeting(meeting: MeetingCreate):
     INSERT INTO meetings (committee_id, title, description, scheduled_at, location, status, created_by) 
     VALUES (%s, %s, %s, %s, %s, %s, %s)
     """
-    meeting_id = await execute_query(
-        query, 
-        (meeting.committee_id, meeting.title, meeting.description, 
-         meeting.scheduled_at, meeting.location, meeting.status, 1)
-    )
+    async with transaction() as db:
+        meeting_id = await db(
+            query, 
+            (meeting.committee_id, meeting.title, meeting.description, 
+             meeting.scheduled_at, meeting.location, meeting.status, 1)
+        )
+        await db(RECORD_SQL, ("meetings", meeting_id, UPSERT, meeting.committee_id))
+        await db(ENQUEUE_SQL, (meeting_id, "meeting"))
     
     # Fetch the created meeting
     query = "SELECT * FROM meetings WHERE id = %s"
@@ -247,11 +297,14 @@ async def create_agenda_item(item: AgendaItemCreate):
                              presenter, estimated_duration, status, introduction_file, decision_file) 
     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
-    item_id = await execute_query(
-        query, 
-        (item.meeting_id, item.order_index, item.title, item.description, item.category,
-         item.presenter, item.estimated_duration, item.status, item.introduction_file, item.decision_file)
-    )
+    async with transaction() as db:
+        item_id = await db(
+            query, 
+            (item.meeting_id, item.order_index, item.title, item.description, item.category,
+             item.presenter, item.estimated_duration, item.status, item.introduction_file, item.decision_file)
+        )
+        await db(RECORD_FOR_MEETING_SQL, ("agenda_items", item_id, UPSERT, item.meeting_id))
+        await db(ENQUEUE_SQL, (item.meeting_id, "agenda_item"))
     
     query = "SELECT * FROM agenda_items WHERE id = %s"
     result = await execute_query(query, (item_id,), fetch_one=True)
@@ -264,7 +317,7 @@ async def create_agenda_item(item: AgendaItemCreate):
 @app.get("/meetings/{meeting_id}/agenda-items/", response_model=List[AgendaItemResponse])
 async def get_meeting_agenda_items(meeting_id: int):
     query = "SELECT * FROM agenda_items WHERE meeting_id = %s ORDER BY order_index"
-    results = await execute_query(query, (meeting_id,), fetch_all=True)
+    results = await execute_query(query, (meeting_id,), fetch_all=True, coalesce=True)
     
     for result in results:
         result['created_at'] = str(result['created_at'])
@@ -275,23 +328,13 @@ async def get_meeting_agenda_items(meeting_id: int):
 # Vote Results endpoints
 @app.post("/vote-results/", response_model=VoteResultResponse)
 async def create_vote_result(vote_result: VoteResultCreate):
-    query = """
-    INSERT INTO vote_results (agenda_item_id, votes_for, votes_against, votes_abstain, 
-                             total_votes, result) 
-    VALUES (%s, %s, %s, %s, %s, %s)
-    ON DUPLICATE KEY UPDATE
-    votes_for = VALUES(votes_for),
-    votes_against = VALUES(votes_against),
-    votes_abstain = VALUES(votes_abstain),
-    total_votes = VALUES(total_votes),
-    result = VALUES(result),
-    voted_at = CURRENT_TIMESTAMP
-    """
-    await execute_query(
-        query, 
-        (vote_result.agenda_item_id, vote_result.votes_for, vote_result.votes_against,
-         vote_result.votes_abstain, vote_result.total_votes, vote_result.result)
-    )
+    # Recounts the item from its ballots; client-supplied tallies are no longer accepted
+    async with transaction() as db:
+        if await vote_tally.recount(db, vote_result.agenda_item_id) is None:
+            raise HTTPException(status_code=404, detail="Agenda item not found")
+        await db(RECORD_FOR_AGENDA_ITEM_SQL, ("vote_results", vote_result.agenda_item_id, UPSERT,
+                                              vote_result.agenda_item_id))
+        await db(ENQUEUE_FOR_AGENDA_ITEM_SQL, ("vote_result", vote_result.agenda_item_id))
     
     query = "SELECT * FROM vote_results WHERE agenda_item_id = %s"
     result = await execute_query(query, (vote_result.agenda_item_id,), fetch_one=True)
@@ -303,7 +346,7 @@ async def create_vote_result(vote_result: VoteResultCreate):
 @app.get("/agenda-items/{agenda_item_id}/vote-result/", response_model=Optional[VoteResultResponse])
 async def get_agenda_item_vote_result(agenda_item_id: int):
     query = "SELECT * FROM vote_results WHERE agenda_item_id = %s"
-    result = await execute_query(query, (agenda_item_id,), fetch_one=True)
+    result = await execute_query(query, (agenda_item_id,), fetch_one=True, coalesce=True)
     
     if not result:
         return None
@@ -318,10 +361,10 @@ async def create_agenda_comment(comment: AgendaCommentCreate):
     INSERT INTO agenda_comments (agenda_item_id, user_id, comment) 
     VALUES (%s, %s, %s)
     """
-    comment_id = await execute_query(
-        query, 
-        (comment.agenda_item_id, comment.user_id, comment.comment)
-    )
+    async with transaction() as db:
+        comment_id = await db(query, (comment.agenda_item_id, comment.user_id, comment.comment))
+        await db(RECORD_FOR_AGENDA_ITEM_SQL, ("agenda_comments", comment_id, UPSERT, comment.agenda_item_id))
+        await db(ENQUEUE_FOR_AGENDA_ITEM_SQL, ("comment", comment.agenda_item_id))
     
     query = """
     SELECT ac.*, u.name as user_name 
@@ -345,7 +388,7 @@ async def get_agenda_item_comments(agenda_item_id: int):
     WHERE ac.agenda_item_id = %s 
     ORDER BY ac.created_at
     """
-    results = await execute_query(query, (agenda_item_id,), fetch_all=True)
+    results = await execute_query(query, (agenda_item_id,), fetch_all=True, coalesce=True)
     
     for result in results:
         result['created_at'] = str(result['created_at'])
@@ -356,16 +399,41 @@ async def get_agenda_item_comments(agenda_item_id: int):
 # Vote endpoints
 @app.post("/votes/", response_model=VoteResponse)
 async def create_vote(vote: VoteCreate):
-    query = "INSERT INTO votes (meeting_id, user_id, opt) VALUES (%s, %s, %s)"
-    vote_id = await execute_query(
-        query, 
-        (vote.meeting_id, 1, vote.opt)  # Using user_id = 1 for now
-    )
+    opt_code = vote_codes.code_of(vote.opt)
+    if opt_code is None:
+        raise HTTPException(status_code=422, detail=f"Unknown ballot option: {vote.opt}")
+    if vote.agenda_item_id is not None:
+        item = await execute_query(
+            "SELECT meeting_id FROM agenda_items WHERE id = %s", (vote.agenda_item_id,), fetch_one=True
+        )
+        if not item or item['meeting_id'] != vote.meeting_id:
+            raise HTTPException(status_code=404, detail="Agenda item not found in this meeting")
+
+    # votes is unique per (meeting_id, agenda_item_id, user_id);
+    # LAST_INSERT_ID(id) returns the existing row on a repeat ballot, and
+    # nothing is inserted once the meeting is completed or cancelled
+    async with transaction() as db:
+        vote_id = await db(
+            vote_ingest.UPSERT_IF_OPEN_SQL,
+            (vote.agenda_item_id or 0, 1, opt_code, vote.meeting_id)  # Using user_id = 1 for now
+        )
+        if not vote_id:
+            if not await db("SELECT id FROM meetings WHERE id = %s", (vote.meeting_id,), fetch_one=True):
+                raise HTTPException(status_code=404, detail="Meeting not found")
+            raise HTTPException(status_code=409, detail="Voting for this meeting is closed")
+        await db(RECORD_FOR_MEETING_SQL, ("votes", vote_id, UPSERT, vote.meeting_id))
+        if vote.agenda_item_id is not None:
+            # This path does not know the replaced ballot, so the item is recounted
+            await vote_tally.recount(db, vote.agenda_item_id)
+            await db(RECORD_FOR_AGENDA_ITEM_SQL, ("vote_results", vote.agenda_item_id, UPSERT, vote.agenda_item_id))
+        await db(ENQUEUE_SQL, (vote.meeting_id, "vote"))
     
     # Fetch the created vote
     query = "SELECT * FROM votes WHERE id = %s"
     result = await execute_query(query, (vote_id,), fetch_one=True)
     result['created_at'] = str(result['created_at'])
+    result['agenda_item_id'] = result['agenda_item_id'] or None
+    result['opt'] = vote_codes.name(result['opt_code'], result['opt'])
     
     return VoteResponse(**result)
 
@@ -376,6 +444,8 @@ async def get_votes():
     
     for result in results:
         result['created_at'] = str(result['created_at'])
+        result['agenda_item_id'] = result['agenda_item_id'] or None
+        result['opt'] = vote_codes.name(result['opt_code'], result['opt'])
     
     return [VoteResponse(**row) for row in results]
 
@@ -394,6 +464,24 @@ async def get_users():
             {"id": 1, "email": "ada@demo.gr", "name": "Ada", "created_at": "2025-09-18T08:00:00"}
         ]
 
+async def require_admin(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    admin = await execute_query(
+        """
+        SELECT 1 FROM user_roles ur
+        JOIN roles r ON ur.role_id = r.id
+        WHERE ur.user_id = %s AND r.name = %s
+        """,
+        (current_user.id, ADMIN_ROLE), fetch_one=True
+    )
+    if not admin:
+        raise HTTPException(status_code=403, detail="Administrator role required")
+    return current_user
+
+# Request coalescing counters
+@app.get("/metrics/coalescing")
+async def coalescing_metrics(current_user: CurrentUser = Depends(require_admin)):
+    return read_coalescer.stats()
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,333 @@
+"""
+Denormalized meeting read model.
+
+Showing a meeting needs the meeting, its committee, agenda items with their
+vote results and comments (with author names), attachments and the vote
+tally. Instead of joining all of that on every view, `meeting_views` holds
+one JSON document per meeting, so a read is a primary-key lookup.
+
+Write handlers append the meeting id to `meeting_outbox` after changing any
+of the source tables (in this app or in main_extended). A background
+consumer claims outbox rows in batches, rebuilds each affected document once
+and marks the rows processed. Documents carry the highest outbox id they
+include as `version`, and an older rebuild never overwrites a newer one, so
+several workers can consume concurrently. Claims expire, so rows held by a
+worker that died are picked up again.
+
+`rebuild_all()` (also `python rebuild_meeting_views.py`) regenerates every
+document from the source tables, for the initial backfill or after writes
+made outside the API.
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+import vote_codes
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_POLL_SECONDS = float(os.getenv("READ_MODEL_POLL_SECONDS", "1"))
+CLAIM_TIMEOUT_SECONDS = 30
+OUTBOX_RETENTION_HOURS = 24
+REBUILD_BATCH_SIZE = 200
+LAG_SAMPLES = 1000
+
+QueryFn = Callable[..., Awaitable]
+
+OUTBOX_TABLE = """
+CREATE TABLE IF NOT EXISTS meeting_outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    meeting_id INT NOT NULL,
+    reason VARCHAR(32) NOT NULL,
+    created_at DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+    claimed_by VARCHAR(64) NULL,
+    claimed_at DATETIME(3) NULL,
+    processed_at DATETIME(3) NULL,
+    INDEX idx_meeting_outbox_pending (processed_at, id)
+) ENGINE=InnoDB
+"""
+
+SCHEMA_TABLES = [
+    OUTBOX_TABLE,
+    """
+    CREATE TABLE IF NOT EXISTS meeting_views (
+        meeting_id INT PRIMARY KEY,
+        committee_id INT NULL,
+        document JSON NOT NULL,
+        version BIGINT NOT NULL DEFAULT 0,
+        built_at DATETIME(3) NOT NULL
+    ) ENGINE=InnoDB
+    """,
+]
+
+# Also used by main_extended/main_mysql, which write agenda items, results and comments
+ENQUEUE_SQL = "INSERT INTO meeting_outbox (meeting_id, reason) VALUES (%s, %s)"
+ENQUEUE_FOR_AGENDA_ITEM_SQL = """
+INSERT INTO meeting_outbox (meeting_id, reason)
+SELECT meeting_id, %s FROM agenda_items WHERE id = %s
+"""
+
+
+def _plain(row: Optional[dict]) -> Optional[dict]:
+    """Stringify dates and decimals so the row can be stored as JSON"""
+    if row is None:
+        return None
+    return {key: value if value is None or isinstance(value, (str, int, float, bool)) else str(value)
+            for key, value in row.items()}
+
+
+async def build_document(query: QueryFn, meeting_id: int) -> Optional[dict]:
+    meeting = await query(
+        """
+        SELECT m.*, c.name AS committee_name, u.name AS created_by_name
+        FROM meetings m
+        LEFT JOIN committees c ON c.id = m.committee_id
+        LEFT JOIN users u ON u.id = m.created_by
+        WHERE m.id = %s
+        """,
+        (meeting_id,), fetch_one=True,
+    )
+    if not meeting:
+        return None
+
+    agenda_items = await query(
+        """
+        SELECT a.*, r.votes_for, r.votes_against, r.votes_abstain, r.total_votes, r.result, r.voted_at
+        FROM agenda_items a
+        LEFT JOIN vote_results r ON r.agenda_item_id = a.id
+        WHERE a.meeting_id = %s
+        ORDER BY a.order_index
+        """,
+        (meeting_id,), fetch_all=True,
+    )
+    comments = await query(
+        """
+        SELECT ac.id, ac.agenda_item_id, ac.user_id, u.name AS user_name, ac.comment, ac.created_at
+        FROM agenda_comments ac
+        JOIN agenda_items a ON a.id = ac.agenda_item_id
+        LEFT JOIN users u ON u.id = ac.user_id
+        WHERE a.meeting_id = %s
+        ORDER BY ac.created_at, ac.id
+        """,
+        (meeting_id,), fetch_all=True,
+    )
+    files = await query(
+        """
+        SELECT id, name, file_size, mime_type, category, uploaded_by, created_at
+        FROM files WHERE meeting_id = %s ORDER BY created_at
+        """,
+        (meeting_id,), fetch_all=True,
+    )
+    tally = await query(
+        f"""
+        SELECT {vote_codes.name_sql()} AS opt, COUNT(*) AS count
+        FROM votes WHERE meeting_id = %s AND agenda_item_id = 0
+        GROUP BY opt_code, opt
+        """,
+        (meeting_id,), fetch_all=True,
+    )
+
+    comments_by_item: dict[int, list] = {}
+    for comment in comments:
+        comments_by_item.setdefault(comment["agenda_item_id"], []).append(_plain(comment))
+
+    items = []
+    for row in agenda_items:
+        item = _plain(row)
+        result_fields = ("votes_for", "votes_against", "votes_abstain", "total_votes", "result", "voted_at")
+        vote_result = {field: item.pop(field) for field in result_fields}
+        item["vote_result"] = vote_result if vote_result["result"] is not None else None
+        item["comments"] = comments_by_item.get(row["id"], [])
+        items.append(item)
+
+    meeting = _plain(meeting)
+    committee = {"id": meeting["committee_id"], "name": meeting.pop("committee_name")}
+    return {
+        "meeting": meeting,
+        "committee": committee,
+        "agenda_items": items,
+        "files": [_plain(row) for row in files],
+        "votes": {
+            "results": {row["opt"]: row["count"] for row in tally},
+            "total": sum(row["count"] for row in tally),
+        },
+    }
+
+
+class MeetingReadModel:
+    def __init__(self, query: QueryFn):
+        self.query = query
+        self.consumer_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._lags: deque = deque(maxlen=LAG_SAMPLES)
+        self.last_processed_at: Optional[float] = None
+        self.counters = {"enqueued": 0, "rebuilt": 0, "deleted": 0, "outbox_processed": 0, "errors": 0}
+
+    async def enqueue(self, meeting_id: Optional[int], reason: str, query: Optional[QueryFn] = None):
+        """Pass the `query` of the transaction that changes the meeting, so the entry commits with it"""
+        if not meeting_id:
+            return
+        await (query or self.query)(ENQUEUE_SQL, (meeting_id, reason))
+        self.counters["enqueued"] += 1
+        self._wakeup.set()
+
+    async def enqueue_many(self, meeting_ids, reason: str, query: Optional[QueryFn] = None):
+        meeting_ids = sorted({meeting_id for meeting_id in meeting_ids if meeting_id})
+        if not meeting_ids:
+            return
+        values = ", ".join(["(%s, %s)"] * len(meeting_ids))
+        params = [value for meeting_id in meeting_ids for value in (meeting_id, reason)]
+        await (query or self.query)(f"INSERT INTO meeting_outbox (meeting_id, reason) VALUES {values}", params)
+        self.counters["enqueued"] += len(meeting_ids)
+        self._wakeup.set()
+
+    async def get(self, meeting_id: int) -> Optional[dict]:
+        return await self.query(
+            "SELECT meeting_id, committee_id, document, version, built_at FROM meeting_views WHERE meeting_id = %s",
+            (meeting_id,), fetch_one=True,
+        )
+
+    async def refresh(self, meeting_id: int, version: int) -> Optional[dict]:
+        """Rebuild one document from the source tables and store it unless a newer one exists"""
+        document = await build_document(self.query, meeting_id)
+        if document is None:
+            await self.query(
+                "DELETE FROM meeting_views WHERE meeting_id = %s AND version <= %s", (meeting_id, version)
+            )
+            self.counters["deleted"] += 1
+            return None
+        # version must be assigned last: later assignments see the updated value
+        await self.query(
+            """
+            INSERT INTO meeting_views (meeting_id, committee_id, document, version, built_at)
+            VALUES (%s, %s, %s, %s, NOW(3))
+            ON DUPLICATE KEY UPDATE
+                committee_id = IF(VALUES(version) >= version, VALUES(committee_id), committee_id),
+                document = IF(VALUES(version) >= version, VALUES(document), document),
+                built_at = IF(VALUES(version) >= version, VALUES(built_at), built_at),
+                version = GREATEST(version, VALUES(version))
+            """,
+            (meeting_id, document["meeting"]["committee_id"], json.dumps(document, ensure_ascii=False), version),
+        )
+        self.counters["rebuilt"] += 1
+        return document
+
+    async def _claim(self, limit: int) -> list:
+        await self.query(
+            """
+            UPDATE meeting_outbox SET claimed_by = %s, claimed_at = NOW(3)
+            WHERE processed_at IS NULL
+              AND (claimed_at IS NULL OR claimed_at < NOW(3) - INTERVAL %s SECOND)
+            ORDER BY id LIMIT %s
+            """,
+            (self.consumer_id, CLAIM_TIMEOUT_SECONDS, limit),
+        )
+        return await self.query(
+            """
+            SELECT id, meeting_id, TIMESTAMPDIFF(MICROSECOND, created_at, NOW(3)) / 1000 AS age_ms
+            FROM meeting_outbox WHERE claimed_by = %s AND processed_at IS NULL ORDER BY id
+            """,
+            (self.consumer_id,), fetch_all=True,
+        )
+
+    async def process_batch(self, limit: int = OUTBOX_BATCH_SIZE) -> int:
+        rows = await self._claim(limit)
+        if not rows:
+            return 0
+
+        # One rebuild per meeting, at the newest outbox id seen for it
+        versions: dict[int, int] = {}
+        for row in rows:
+            versions[row["meeting_id"]] = max(versions.get(row["meeting_id"], 0), row["id"])
+        done = []
+        for meeting_id, version in versions.items():
+            try:
+                await self.refresh(meeting_id, version)
+                done.extend(row for row in rows if row["meeting_id"] == meeting_id)
+            except Exception as e:
+                # Left claimed; retried once the claim expires
+                self.counters["errors"] += 1
+                print(f"Read model rebuild failed for meeting {meeting_id}: {e}")
+
+        if done:
+            placeholders = ", ".join(["%s"] * len(done))
+            await self.query(
+                f"UPDATE meeting_outbox SET processed_at = NOW(3) WHERE id IN ({placeholders})",
+                [row["id"] for row in done],
+            )
+            self._lags.extend(float(row["age_ms"]) for row in done)
+            self.counters["outbox_processed"] += len(done)
+            self.last_processed_at = time.time()
+        return len(rows)
+
+    async def purge_processed(self):
+        await self.query(
+            """
+            DELETE FROM meeting_outbox
+            WHERE processed_at IS NOT NULL AND processed_at < NOW() - INTERVAL %s HOUR
+            LIMIT 10000
+            """,
+            (OUTBOX_RETENTION_HOURS,),
+        )
+
+    async def run_forever(self):
+        last_purge = 0.0
+        while True:
+            try:
+                while await self.process_batch() == OUTBOX_BATCH_SIZE:
+                    pass
+                if time.time() - last_purge > 3600:
+                    await self.purge_processed()
+                    last_purge = time.time()
+            except Exception as e:
+                print(f"Read model consumer error: {e}")
+            # Local writes wake the consumer at once; other processes' are found by polling
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def rebuild_all(self) -> int:
+        head = await self.query("SELECT COALESCE(MAX(id), 0) AS version FROM meeting_outbox", fetch_one=True)
+        rebuilt = 0
+        cursor = 0
+        while True:
+            rows = await self.query(
+                "SELECT id FROM meetings WHERE id > %s ORDER BY id LIMIT %s",
+                (cursor, REBUILD_BATCH_SIZE), fetch_all=True,
+            )
+            for row in rows:
+                await self.refresh(row["id"], head["version"])
+                rebuilt += 1
+            if len(rows) < REBUILD_BATCH_SIZE:
+                break
+            cursor = rows[-1]["id"]
+        await self.query(
+            "DELETE FROM meeting_views WHERE meeting_id NOT IN (SELECT id FROM meetings)"
+        )
+        return rebuilt
+
+    async def stats(self) -> dict:
+        pending = await self.query(
+            """
+            SELECT COUNT(*) AS pending,
+                   TIMESTAMPDIFF(MICROSECOND, MIN(created_at), NOW(3)) / 1000 AS oldest_pending_ms
+            FROM meeting_outbox WHERE processed_at IS NULL
+            """,
+            fetch_one=True,
+        )
+        lags = sorted(self._lags)
+        percentile = lambda p: lags[min(len(lags) - 1, int(p * len(lags)))] if lags else None
+        return {
+            "pending": pending["pending"],
+            "oldest_pending_ms": float(pending["oldest_pending_ms"]) if pending["oldest_pending_ms"] is not None else None,
+            "lag_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": lags[-1] if lags else None},
+            "last_processed_at": self.last_processed_at,
+            "consumer_id": self.consumer_id,
+            **self.counters,
+        }
@@ -0,0 +1,34 @@
+"""
+Shared process pool for CPU-bound media work (image resizing, PDF rendering).
+
+Workers are started lazily on first use and shut down with the application.
+Jobs submitted here must be plain module-level functions taking and returning
+picklable values.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=MEDIA_WORKERS)
+    return _pool
+
+
+async def run_in_process(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), fn, *args)
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,15 @@
+import asyncio
+
+from main_complete import init_database, read_model
+
+
+async def rebuild_meeting_views():
+    """Regenerate every meeting_views document from the source tables"""
+    await init_database()
+    rebuilt = await read_model.rebuild_all()
+    print(f"✅ Rebuilt {rebuilt} meeting views")
+
+
+if __name__ == "__main__":
+    print("🔧 Rebuilding meeting read model...")
+    asyncio.run(rebuild_meeting_views())
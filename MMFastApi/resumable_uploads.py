@@ -0,0 +1,232 @@
+"""
+Resumable chunked uploads.
+
+Protocol:
+    POST   /upload-sessions                    create a session for a file of known size
+    PUT    /upload-sessions/{id}?offset=N      send the next chunk starting at byte N
+    GET    /upload-sessions/{id}               ask how many bytes have been received
+    POST   /upload-sessions/{id}/finalize      verify and register the completed file
+    DELETE /upload-sessions/{id}               abandon the upload
+
+Chunks are written straight into a sparse temp file preallocated to the final
+size, each verified against an optional X-Chunk-SHA256 header before the
+received offset advances. Session metadata lives in a JSON sidecar next to the
+temp file, so an upload can resume after the client or the server restarts.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+MAX_CHUNK_SIZE = int(os.getenv("UPLOAD_MAX_CHUNK_MB", "16")) * 1024 * 1024
+SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24")) * 3600
+WRITE_BUFFER_SIZE = 1024 * 1024
+SESSION_DIR_NAME = ".sessions"
+
+
+@dataclass
+class UploadSession:
+    id: str
+    user_id: int
+    filename: str
+    size: int
+    mime_type: str
+    purpose: str
+    category: str
+    committee_id: Optional[int]
+    meeting_id: Optional[int]
+    description: Optional[str]
+    sha256: Optional[str]
+    offset: int
+    created_at: float
+    updated_at: float
+    tags: Optional[list] = None
+
+    def status(self) -> dict:
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "offset": self.offset,
+            "size": self.size,
+            "complete": self.offset == self.size,
+            "max_chunk_size": MAX_CHUNK_SIZE,
+        }
+
+
+def _write_json(path: Path, data: dict):
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _create_sparse(path: Path, size: int):
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+
+def _write_at(f, offset: int, data: bytes):
+    f.seek(offset)
+    f.write(data)
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(WRITE_BUFFER_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _purge_expired(directory: Path, cutoff: float) -> int:
+    removed = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                upload_id = entry.name[:-5]
+                for suffix in (".json", ".part"):
+                    (directory / f"{upload_id}{suffix}").unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+
+class UploadSessionStore:
+    def __init__(self, upload_dir: Path):
+        self.directory = upload_dir / SESSION_DIR_NAME
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._locks: dict[str, asyncio.Lock] = {}
+        # Running whole-file digests for sessions received in order by this process
+        self._digests: dict[str, "hashlib._Hash"] = {}
+
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.json"
+
+    def part_path(self, upload_id: str) -> Path:
+        return self.directory / f"{upload_id}.part"
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(upload_id, asyncio.Lock())
+
+    def _forget(self, upload_id: str):
+        self._locks.pop(upload_id, None)
+        self._digests.pop(upload_id, None)
+
+    async def create(self, **fields) -> UploadSession:
+        await run_in_threadpool(_purge_expired, self.directory, time.time() - SESSION_TTL_SECONDS)
+
+        now = time.time()
+        session = UploadSession(id=uuid.uuid4().hex, offset=0, created_at=now, updated_at=now, **fields)
+        await run_in_threadpool(_create_sparse, self.part_path(session.id), session.size)
+        await run_in_threadpool(_write_json, self._meta_path(session.id), asdict(session))
+        self._digests[session.id] = hashlib.sha256()
+        return session
+
+    async def get(self, upload_id: str, user_id: int) -> UploadSession:
+        if not upload_id.isalnum():
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        try:
+            text = await run_in_threadpool(self._meta_path(upload_id).read_text, encoding="utf-8")
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        session = UploadSession(**json.loads(text))
+        if session.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        return session
+
+    async def write_chunk(
+        self,
+        upload_id: str,
+        user_id: int,
+        offset: int,
+        body: AsyncIterator[bytes],
+        chunk_sha256: Optional[str] = None,
+    ) -> UploadSession:
+        async with self._lock(upload_id):
+            session = await self.get(upload_id, user_id)
+            if offset != session.offset:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Expected offset {session.offset}",
+                    headers={"Upload-Offset": str(session.offset)},
+                )
+
+            running = self._digests.get(upload_id) if offset > 0 else hashlib.sha256()
+            candidate = running.copy() if running is not None else None
+            chunk_digest = hashlib.sha256()
+            written = 0
+            buffer = bytearray()
+
+            f = await run_in_threadpool(open, self.part_path(upload_id), "r+b")
+            try:
+                async for data in body:
+                    if not data:
+                        continue
+                    if written + len(buffer) + len(data) > MAX_CHUNK_SIZE:
+                        raise HTTPException(status_code=413, detail="Chunk too large")
+                    if offset + written + len(buffer) + len(data) > session.size:
+                        raise HTTPException(status_code=413, detail="Chunk exceeds declared file size")
+                    chunk_digest.update(data)
+                    if candidate is not None:
+                        candidate.update(data)
+                    buffer += data
+                    if len(buffer) >= WRITE_BUFFER_SIZE:
+                        await run_in_threadpool(_write_at, f, offset + written, bytes(buffer))
+                        written += len(buffer)
+                        buffer.clear()
+                if buffer:
+                    await run_in_threadpool(_write_at, f, offset + written, bytes(buffer))
+                    written += len(buffer)
+            finally:
+                await run_in_threadpool(f.close)
+
+            # The bytes are on disk but only count once the chunk checksum matches
+            if chunk_sha256 and not hmac.compare_digest(chunk_digest.hexdigest(), chunk_sha256.lower()):
+                raise HTTPException(status_code=422, detail="Chunk checksum mismatch")
+
+            session.offset += written
+            session.updated_at = time.time()
+            await run_in_threadpool(_write_json, self._meta_path(upload_id), asdict(session))
+            if candidate is not None:
+                self._digests[upload_id] = candidate
+            return session
+
+    async def finalize(self, upload_id: str, user_id: int, destination: Path) -> tuple[UploadSession, str]:
+        """Verify the completed upload and move it to `destination`; returns its sha256"""
+        async with self._lock(upload_id):
+            session = await self.get(upload_id, user_id)
+            if session.offset != session.size:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Upload incomplete: {session.offset} of {session.size} bytes received",
+                    headers={"Upload-Offset": str(session.offset)},
+                )
+
+            running = self._digests.get(upload_id)
+            if running is not None:
+                digest = running.hexdigest()
+            else:
+                digest = await run_in_threadpool(_sha256_file, self.part_path(upload_id))
+            if session.sha256 and not hmac.compare_digest(digest, session.sha256.lower()):
+                raise HTTPException(status_code=422, detail="File checksum mismatch")
+
+            await run_in_threadpool(os.replace, self.part_path(upload_id), destination)
+            await run_in_threadpool(self._meta_path(upload_id).unlink, missing_ok=True)
+        self._forget(upload_id)
+        return session, digest
+
+    async def discard(self, upload_id: str, user_id: int):
+        async with self._lock(upload_id):
+            await self.get(upload_id, user_id)
+            await run_in_threadpool(self.part_path(upload_id).unlink, missing_ok=True)
+            await run_in_threadpool(self._meta_path(upload_id).unlink, missing_ok=True)
+        self._forget(upload_id)
@@ -17,6 +17,16 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+# Auth schemas
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
 # Role schemas
 class RoleBase(BaseModel):
     name: str
@@ -107,6 +117,7 @@ class FileResponse(FileBase):
     size: Optional[int] = None
     file_type: Optional[str] = None
     download_count: Optional[int] = 0
+    download_url: Optional[str] = None  # Signed, expiring link served by /downloads/{token}
 
     class Config:
         from_attributes = True
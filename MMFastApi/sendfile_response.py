@@ -0,0 +1,251 @@
+"""
+Download responder with an open-file cache and zero-copy sending.
+
+Hot files keep an open descriptor and their stat result in a bounded LRU
+cache, so repeated downloads skip open()/stat() and are only revalidated
+against the path every few seconds. When the ASGI server advertises the
+"http.response.zerocopysend" extension the body is handed over for
+os.sendfile; otherwise it is streamed with positional reads (os.pread) in the
+thread pool, which never touch a shared file offset.
+
+Single byte ranges are supported so audio and video can be seeked.
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Optional
+from urllib.parse import quote
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import FileResponse, Response
+
+CHUNK_SIZE = 256 * 1024
+ZERO_COPY_EXTENSION = "http.response.zerocopysend"
+HAS_PREAD = hasattr(os, "pread")
+
+
+class OpenFile:
+    __slots__ = ("path", "fd", "stat", "checked_at", "refs", "evicted")
+
+    def __init__(self, path: str, fd: int, stat: os.stat_result):
+        self.path = path
+        self.fd = fd
+        self.stat = stat
+        self.checked_at = time.monotonic()
+        self.refs = 0
+        self.evicted = False
+
+
+def _same_file(a: os.stat_result, b: os.stat_result) -> bool:
+    return (a.st_ino, a.st_dev, a.st_size, a.st_mtime_ns) == (b.st_ino, b.st_dev, b.st_size, b.st_mtime_ns)
+
+
+class OpenFileCache:
+    def __init__(self, max_files: int = 256, revalidate_after: float = 2.0):
+        self.max_files = max_files
+        self.revalidate_after = revalidate_after
+        self._entries: "OrderedDict[str, OpenFile]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def acquire(self, path: str) -> OpenFile:
+        """Return a referenced entry for `path`; raises FileNotFoundError if it is gone"""
+        entry = self._entries.get(path)
+        if entry is None or time.monotonic() - entry.checked_at >= self.revalidate_after:
+            current = await run_in_threadpool(os.stat, path)
+            entry = self._entries.get(path)
+            if entry is not None and _same_file(entry.stat, current):
+                entry.checked_at = time.monotonic()
+            else:
+                if entry is not None:
+                    self._discard(path)
+                entry = await self._open(path)
+                self.misses += 1
+                entry.refs += 1
+                return entry
+
+        self.hits += 1
+        self._entries.move_to_end(path)
+        entry.refs += 1
+        return entry
+
+    async def _open(self, path: str) -> OpenFile:
+        fd = await run_in_threadpool(os.open, path, os.O_RDONLY)
+        entry = self._entries.get(path)
+        if entry is not None:
+            # Another request opened it while we were waiting
+            os.close(fd)
+            self._entries.move_to_end(path)
+            return entry
+
+        entry = OpenFile(path, fd, os.fstat(fd))
+        self._entries[path] = entry
+        while len(self._entries) > self.max_files:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+        return entry
+
+    def release(self, entry: OpenFile):
+        entry.refs -= 1
+        if entry.evicted and entry.refs == 0:
+            os.close(entry.fd)
+
+    def _discard(self, path: str):
+        entry = self._entries.pop(path)
+        entry.evicted = True
+        if entry.refs == 0:
+            os.close(entry.fd)
+
+    def invalidate(self, path: str):
+        if path in self._entries:
+            self._discard(path)
+
+    def stats(self) -> dict:
+        return {
+            "open_files": len(self._entries),
+            "max_files": self.max_files,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+open_files = OpenFileCache(max_files=int(os.getenv("OPEN_FILE_CACHE_SIZE", "256")))
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Parse a single 'bytes=start-end' range into an inclusive (start, end)"""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[6:].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            start = size - int(end_text)
+            end = size - 1
+    except ValueError:
+        return None
+    start = max(start, 0)
+    end = min(end, size - 1)
+    if start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def content_disposition(filename: str, disposition: str = "attachment") -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+
+class SendfileResponse(Response):
+    def __init__(
+        self,
+        path,
+        filename: Optional[str] = None,
+        media_type: Optional[str] = None,
+        cache: OpenFileCache = open_files,
+    ):
+        self.path = str(path)
+        self.filename = filename
+        self.media_type = media_type or "application/octet-stream"
+        self.cache = cache
+        self.status_code = 200
+        self.background = None
+        self.init_headers({})
+
+    async def __call__(self, scope, receive, send):
+        if not HAS_PREAD:
+            fallback = FileResponse(self.path, filename=self.filename, media_type=self.media_type)
+            await fallback(scope, receive, send)
+            return
+
+        try:
+            entry = await self.cache.acquire(self.path)
+        except FileNotFoundError:
+            await Response("File not found on disk", status_code=404)(scope, receive, send)
+            return
+
+        try:
+            await self._send_file(entry, scope, send)
+        finally:
+            self.cache.release(entry)
+
+    async def _send_file(self, entry: OpenFile, scope, send):
+        stat = entry.stat
+        size = stat.st_size
+        etag = '"' + hashlib.md5(f"{stat.st_mtime_ns}-{size}".encode()).hexdigest() + '"'
+        request_headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+
+        headers = {
+            "content-type": self.media_type,
+            "accept-ranges": "bytes",
+            "etag": etag,
+            "last-modified": formatdate(stat.st_mtime, usegmt=True),
+        }
+        if self.filename:
+            headers["content-disposition"] = content_disposition(self.filename)
+
+        if request_headers.get("if-none-match") == etag:
+            await self._start(send, 304, headers)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        status = 200
+        offset, length = 0, size
+        try:
+            byte_range = _parse_range(request_headers.get("range"), size) if size else None
+        except ValueError:
+            headers["content-range"] = f"bytes */{size}"
+            headers["content-length"] = "0"
+            await self._start(send, 416, headers)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        if byte_range is not None:
+            status = 206
+            offset, length = byte_range[0], byte_range[1] - byte_range[0] + 1
+            headers["content-range"] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+        headers["content-length"] = str(length)
+
+        await self._start(send, status, headers)
+        if scope["method"] == "HEAD" or length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if ZERO_COPY_EXTENSION in (scope.get("extensions") or {}):
+            with os.fdopen(os.dup(entry.fd), "rb") as file:
+                await send({
+                    "type": ZERO_COPY_EXTENSION,
+                    "file": file,
+                    "offset": offset,
+                    "count": length,
+                    "more_body": False,
+                })
+            return
+
+        end = offset + length
+        while offset < end:
+            chunk = await run_in_threadpool(os.pread, entry.fd, min(CHUNK_SIZE, end - offset), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": offset < end})
+        if offset < end:
+            # File shrank underneath us; close the body so the client sees a short read
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    @staticmethod
+    async def _start(send, status: int, headers: dict):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+        })
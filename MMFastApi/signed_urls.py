@@ -0,0 +1,88 @@
+"""
+HMAC-signed, expiring download URLs.
+
+A token carries the file's path on disk, mime type and download filename plus
+an expiry, signed with HMAC-SHA256. The download route only has to check the
+signature (in constant time) and the expiry, so serving a file needs no
+database access. Expiries are rounded up to a fixed step so repeated listings
+hand out identical URLs that browsers can cache.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException
+
+from auth import SECRET_KEY
+
+DOWNLOAD_URL_SECRET = os.getenv("DOWNLOAD_URL_SECRET", SECRET_KEY).encode()
+DOWNLOAD_URL_TTL_SECONDS = int(os.getenv("DOWNLOAD_URL_TTL_SECONDS", "3600"))
+EXPIRY_STEP_SECONDS = 300
+DOWNLOAD_ROUTE = "/downloads"
+
+
+@dataclass(frozen=True)
+class SignedDownload:
+    path: Path
+    media_type: str
+    filename: str
+    expires_at: int
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _signature(payload: str) -> str:
+    return _b64encode(hmac.new(DOWNLOAD_URL_SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+def sign_download(
+    file_path: str,
+    media_type: Optional[str],
+    filename: str,
+    ttl: int = DOWNLOAD_URL_TTL_SECONDS,
+) -> str:
+    expires_at = math.ceil((time.time() + ttl) / EXPIRY_STEP_SECONDS) * EXPIRY_STEP_SECONDS
+    claims = {
+        "p": str(file_path),
+        "m": media_type or "application/octet-stream",
+        "n": filename,
+        "e": expires_at,
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":"), sort_keys=True).encode())
+    return f"{payload}.{_signature(payload)}"
+
+
+def signed_download_url(file_path: str, media_type: Optional[str], filename: str) -> str:
+    return f"{DOWNLOAD_ROUTE}/{sign_download(file_path, media_type, filename)}"
+
+
+def verify_download(token: str, root: Path) -> SignedDownload:
+    payload, _, signature = token.partition(".")
+    expected = _signature(payload).encode()
+    if not payload or not signature or not hmac.compare_digest(signature.encode(), expected):
+        raise HTTPException(status_code=403, detail="Invalid download link")
+
+    claims = json.loads(_b64decode(payload))
+    if claims["e"] < time.time():
+        raise HTTPException(status_code=410, detail="Download link expired")
+
+    # Only ever serve from inside the uploads directory, even for a validly signed path
+    path = Path(claims["p"])
+    if not path.resolve().is_relative_to(root.resolve()):
+        raise HTTPException(status_code=403, detail="Invalid download link")
+
+    return SignedDownload(path=path, media_type=claims["m"], filename=claims["n"], expires_at=claims["e"])
@@ -0,0 +1,70 @@
+"""
+Single-flight coalescing for identical concurrent work.
+
+Concurrent callers using the same key share one in-flight coroutine and all
+receive its result (or exception). The shared call runs as its own task, so a
+caller disconnecting does not cancel the work for everyone else.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.executions = 0
+        self.merged = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.merged += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "executions": self.executions,
+            "merged": self.merged,
+            "errors": self.errors,
+            "in_flight": len(self._inflight),
+            "merge_ratio": round(self.merged / self.calls, 4) if self.calls else 0.0,
+        }
+
+
+def freeze_params(params) -> Hashable:
+    """Turn query parameters into a hashable key component"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return tuple(sorted(params.items()))
+    if isinstance(params, (list, tuple)):
+        return tuple(params)
+    return params
+
+
+def copy_rows(result):
+    """Give each waiter its own row dicts, since endpoints mutate them in place"""
+    if isinstance(result, dict):
+        return dict(result)
+    if isinstance(result, (list, tuple)):
+        return [dict(row) if isinstance(row, dict) else row for row in result]
+    return result
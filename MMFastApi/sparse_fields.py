@@ -0,0 +1,133 @@
+"""
+Sparse fieldsets for list endpoints.
+
+List endpoints take `fields=id,title,...`. Each endpoint declares a
+`Projection` mapping its public fields to the SQL expressions behind them, and
+the requested names are turned into an explicit column list, so columns nobody
+asked for are neither read from MySQL nor serialized. Fields computed in
+Python (signed URLs, tags) name the columns they are derived from; those are
+selected as well and dropped from the rows afterwards.
+
+Without `fields` a list returns the endpoint's default set. Long text bodies
+(library content, meeting descriptions and agendas) are never part of a list:
+they are replaced by a short `excerpt` column written alongside the body, and
+the full text is served by the single-item endpoints only.
+"""
+
+from typing import Awaitable, Callable, Iterable, Optional, Sequence
+
+from fastapi import HTTPException
+from pydantic import BaseModel, create_model
+
+EXCERPT_LENGTH = 280  # the excerpt columns are VARCHAR(300)
+EXCERPT_BACKFILL_BATCH = 500
+
+QueryFn = Callable[..., Awaitable]
+
+
+def make_excerpt(*texts: Optional[str]) -> Optional[str]:
+    """First non-blank text with whitespace collapsed, cut at a word boundary"""
+    for text in texts:
+        if not text or not text.strip():
+            continue
+        collapsed = " ".join(text.split())
+        if len(collapsed) <= EXCERPT_LENGTH:
+            return collapsed
+        cut = collapsed[:EXCERPT_LENGTH]
+        space = cut.rfind(" ")
+        if space > EXCERPT_LENGTH // 2:
+            cut = cut[:space]
+        return cut.rstrip() + "…"
+    return None
+
+
+def partial_model(model: type[BaseModel], name: str, **extra) -> type[BaseModel]:
+    """
+    Copy of `model` with every field optional, plus `extra` fields, for use with
+    response_model_exclude_unset so fields left out of a projection are omitted.
+    """
+    fields = {field: (Optional[annotation], None) for field, annotation in model.__annotations__.items()}
+    fields.update({field: (Optional[annotation], None) for field, annotation in extra.items()})
+    return create_model(name, **fields)
+
+
+class Projection:
+    def __init__(
+        self,
+        columns: dict[str, str],
+        default: Iterable[str],
+        computed: Optional[dict[str, dict[str, str]]] = None,
+        key: str = "id",
+    ):
+        self.columns = columns
+        self.computed = computed or {}
+        self.default = list(default)
+        self.key = key
+
+    @property
+    def fields(self) -> list[str]:
+        return [*self.columns, *self.computed]
+
+    def resolve(self, fields: Optional[str]) -> list[str]:
+        """Requested field names, validated; the key is always included"""
+        if not fields:
+            return list(self.default)
+        requested = [self.key]
+        for name in (part.strip() for part in fields.split(",")):
+            if not name or name in requested:
+                continue
+            if name not in self.columns and name not in self.computed:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown field '{name}'; available: {', '.join(self.fields)}",
+                )
+            requested.append(name)
+        return requested
+
+    def select_list(self, requested: Sequence[str]) -> str:
+        selected = {}
+        for name in requested:
+            if name in self.columns:
+                selected[name] = self.columns[name]
+            else:
+                selected.update(self.computed[name])
+        return ", ".join(f"{expression} AS {alias}" for alias, expression in selected.items())
+
+    def prune(self, rows: list[dict], requested: Sequence[str]) -> list[dict]:
+        """Drop helper columns selected only to compute other fields"""
+        keep = set(requested)
+        for row in rows:
+            for column in [column for column in row if column not in keep]:
+                del row[column]
+        return rows
+
+
+async def backfill_excerpts(query: QueryFn, table: str, body_columns: Sequence[str]) -> int:
+    """Fill `excerpt` for rows written before the column existed; returns rows updated"""
+    updated = 0
+    cursor = 0
+    while True:
+        rows = await query(
+            f"""
+            SELECT id, {', '.join(body_columns)} FROM {table}
+            WHERE excerpt IS NULL AND id > %s ORDER BY id LIMIT %s
+            """,
+            (cursor, EXCERPT_BACKFILL_BATCH), fetch_all=True,
+        )
+        if not rows:
+            return updated
+        cursor = rows[-1]["id"]
+        excerpts = [
+            (row["id"], excerpt) for row in rows
+            if (excerpt := make_excerpt(*(row[column] for column in body_columns)))
+        ]
+        if excerpts:
+            cases = " ".join(["WHEN %s THEN %s"] * len(excerpts))
+            placeholders = ", ".join(["%s"] * len(excerpts))
+            params = [value for pair in excerpts for value in pair] + [row_id for row_id, _ in excerpts]
+            await query(
+                f"UPDATE {table} SET excerpt = CASE id {cases} END WHERE id IN ({placeholders})", params
+            )
+            updated += len(excerpts)
+        if len(rows) < EXCERPT_BACKFILL_BATCH:
+            return updated
@@ -0,0 +1,233 @@
+"""
+Tiered blob storage for uploads.
+
+Hot tier: new uploads are sharded by their hash into uploads/ab/cd/<name>, so
+no single directory grows to hundreds of thousands of entries.
+
+Cold tier: files not downloaded for COLD_AFTER_MONTHS are moved under
+uploads/cold/ (mount a cheaper volume there). Compressible types are
+compressed on the way, with zstd when the zstandard package is installed and
+xz otherwise; everything else is moved as is. The codec is recorded by the
+first directory below cold/ (zst/, xz/ or raw/) as well as in the files row
+(storage_tier, compression, stored_size), so a stored path is always enough
+to read the blob back. Reads decompress on the fly in fixed-size chunks.
+"""
+
+import asyncio
+import lzma
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from zip_stream import DEFLATED, compression_for
+
+try:
+    import zstandard
+except ImportError:  # optional; xz from the standard library is used instead
+    zstandard = None
+
+COLD_DIR_NAME = "cold"
+RAW = "raw"
+ZSTD = "zst"
+XZ = "xz"
+CODECS = (ZSTD, XZ)
+
+COLD_AFTER_DAYS = int(os.getenv("COLD_AFTER_MONTHS", "6")) * 30
+TIERING_BATCH_SIZE = int(os.getenv("TIERING_BATCH_SIZE", "50"))
+TIERING_INTERVAL_SECONDS = int(os.getenv("TIERING_INTERVAL_HOURS", "24")) * 3600
+ACCESS_FLUSH_SECONDS = 60
+CHUNK_SIZE = 256 * 1024
+ZSTD_LEVEL = 10
+XZ_PRESET = 6
+
+QueryFn = Callable[..., Awaitable]
+
+
+def preferred_codec() -> str:
+    return ZSTD if zstandard is not None else XZ
+
+
+def shard_path(upload_dir: Path, file_hash: str, name: str) -> Path:
+    """Hot-tier location for a new upload, creating its shard directory"""
+    directory = upload_dir / file_hash[:2] / file_hash[2:4]
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / name
+
+
+def cold_path_for(upload_dir: Path, hot_path: Path, codec: str) -> Path:
+    relative = os.path.relpath(hot_path, upload_dir)
+    if relative.startswith(".."):
+        raise ValueError(f"{hot_path} is outside {upload_dir}")
+    name = relative if codec == RAW else f"{relative}.{codec}"
+    return upload_dir / COLD_DIR_NAME / codec / name
+
+
+def codec_of(upload_dir: Path, path: Path) -> Optional[str]:
+    """Codec a stored path is compressed with, or None for plain files"""
+    try:
+        parts = Path(path).relative_to(upload_dir / COLD_DIR_NAME).parts
+    except ValueError:
+        return None
+    return parts[0] if parts and parts[0] in CODECS else None
+
+
+# -----------------------------------------------------------------------------
+# Reading
+# -----------------------------------------------------------------------------
+
+def open_blob(path: Path, codec: Optional[str]):
+    """Binary file object yielding the original bytes of a stored blob"""
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed cold files")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    if codec == XZ:
+        return lzma.open(path, "rb")
+    return open(path, "rb")
+
+
+async def iter_blob(path: Path, codec: Optional[str]) -> AsyncIterator[bytes]:
+    f = await run_in_threadpool(open_blob, path, codec)
+    try:
+        while True:
+            chunk = await run_in_threadpool(f.read, CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await run_in_threadpool(f.close)
+
+
+# -----------------------------------------------------------------------------
+# Moving to the cold tier
+# -----------------------------------------------------------------------------
+
+def _write_cold(source: Path, destination: Path, codec: str) -> int:
+    """Copy (and compress) source to destination atomically; returns the stored size"""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(destination.name + ".tmp")
+    with open(source, "rb") as src, open(tmp_path, "wb") as dst:
+        if codec == ZSTD:
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            compressor.copy_stream(src, dst, size=os.fstat(src.fileno()).st_size)
+        elif codec == XZ:
+            compressor = lzma.LZMACompressor(preset=XZ_PRESET)
+            for block in iter(lambda: src.read(CHUNK_SIZE), b""):
+                dst.write(compressor.compress(block))
+            dst.write(compressor.flush())
+        else:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_path, destination)
+    return destination.stat().st_size
+
+
+class AccessTracker:
+    """Buffers download timestamps and writes them in one batched UPDATE"""
+
+    def __init__(self, query: QueryFn):
+        self.query = query
+        self._touched: set[str] = set()
+
+    def touch(self, file_path: str):
+        self._touched.add(str(file_path))
+
+    async def flush(self):
+        if not self._touched:
+            return
+        paths, self._touched = list(self._touched), set()
+        placeholders = ", ".join(["%s"] * len(paths))
+        await self.query(
+            f"UPDATE files SET last_accessed_at = NOW() WHERE file_path IN ({placeholders})", paths
+        )
+
+    async def run_forever(self):
+        while True:
+            await asyncio.sleep(ACCESS_FLUSH_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Access time flush error: {e}")
+
+
+class StorageTierer:
+    """Moves files that have gone cold, a bounded batch at a time"""
+
+    def __init__(self, upload_dir: Path, query: QueryFn, on_moved: Optional[Callable[[str], None]] = None):
+        self.upload_dir = upload_dir
+        self.query = query
+        self.on_moved = on_moved
+        self.counters = {"moved": 0, "compressed": 0, "bytes_before": 0, "bytes_after": 0, "errors": 0}
+        self.last_run_at: Optional[float] = None
+
+    async def _demote(self, row: dict):
+        hot_path = Path(row["file_path"])
+        codec = preferred_codec() if compression_for(row["mime_type"]) == DEFLATED else RAW
+        cold_path = cold_path_for(self.upload_dir, hot_path, codec)
+
+        stored_size = await run_in_threadpool(_write_cold, hot_path, cold_path, codec)
+        # Repoint the row before removing the hot copy so downloads never see a gap
+        await self.query(
+            """
+            UPDATE files SET file_path = %s, storage_tier = 'cold', compression = %s, stored_size = %s
+            WHERE id = %s AND file_path = %s
+            """,
+            (str(cold_path), None if codec == RAW else codec, stored_size, row["id"], row["file_path"]),
+        )
+        current = await self.query("SELECT file_path FROM files WHERE id = %s", (row["id"],), fetch_one=True)
+        if not current or current["file_path"] != str(cold_path):
+            # The row changed underneath us; keep the hot copy and drop ours
+            await run_in_threadpool(cold_path.unlink, missing_ok=True)
+            return
+        await run_in_threadpool(hot_path.unlink, missing_ok=True)
+        if self.on_moved:
+            self.on_moved(row["file_path"])
+
+        self.counters["moved"] += 1
+        self.counters["bytes_before"] += row["file_size"] or 0
+        self.counters["bytes_after"] += stored_size
+        if codec != RAW:
+            self.counters["compressed"] += 1
+
+    async def run_once(self, batch_size: int = TIERING_BATCH_SIZE) -> int:
+        self.last_run_at = time.time()
+        rows = await self.query(
+            """
+            SELECT id, file_path, file_size, mime_type FROM files
+            WHERE storage_tier = 'hot' AND missing_since IS NULL
+              AND COALESCE(last_accessed_at, created_at) < NOW() - INTERVAL %s DAY
+            ORDER BY COALESCE(last_accessed_at, created_at)
+            LIMIT %s
+            """,
+            (COLD_AFTER_DAYS, batch_size), fetch_all=True,
+        )
+        for row in rows:
+            try:
+                await self._demote(row)
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"Cold tiering failed for file {row['id']}: {e}")
+        return len(rows)
+
+    async def run_forever(self):
+        while True:
+            try:
+                # Keep taking batches while a full one comes back, then sleep
+                while await self.run_once() == TIERING_BATCH_SIZE:
+                    await asyncio.sleep(1)
+            except Exception as e:
+                print(f"Storage tiering error: {e}")
+            await asyncio.sleep(TIERING_INTERVAL_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            "cold_after_days": COLD_AFTER_DAYS,
+            "codec": preferred_codec(),
+            "last_run_at": self.last_run_at,
+            **self.counters,
+        }
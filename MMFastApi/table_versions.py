@@ -0,0 +1,109 @@
+"""
+Per-table version counters and conditional GETs.
+
+Write handlers call `table_versions.bump("meetings")`. List endpoints derive a
+weak ETag from the versions of the tables they read plus whatever else shapes
+the response (query string, caller, time buckets), so a matching
+If-None-Match is answered with 304 from memory without running the query.
+
+Bumps apply to the local counters immediately and are mirrored to the
+`table_versions` table in the background. Every process reloads that table
+once per TABLE_VERSION_REFRESH_SECONDS and keeps the higher of the two
+values, so with several workers a write made elsewhere invalidates ETags here
+within one refresh interval.
+"""
+
+import asyncio
+import hashlib
+import os
+from typing import Awaitable, Callable, Iterable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+REFRESH_SECONDS = float(os.getenv("TABLE_VERSION_REFRESH_SECONDS", "1"))
+
+QueryFn = Callable[..., Awaitable]
+
+SCHEMA_TABLE = """
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB
+"""
+
+
+class TableVersions:
+    def __init__(self):
+        self.versions: dict[str, int] = {}
+        self._query: Optional[QueryFn] = None
+        self._pending: dict[str, int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.not_modified = 0
+
+    def bind(self, query: QueryFn):
+        self._query = query
+
+    def bump(self, *tables: str):
+        for table in tables:
+            self.versions[table] = self.versions.get(table, 0) + 1
+            self._pending[table] = self._pending.get(table, 0) + 1
+        if self._query is not None and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self):
+        while self._pending:
+            pending, self._pending = self._pending, {}
+            for table, increment in pending.items():
+                try:
+                    await self._query(
+                        """
+                        INSERT INTO table_versions (table_name, version) VALUES (%s, %s)
+                        ON DUPLICATE KEY UPDATE version = version + VALUES(version)
+                        """,
+                        (table, increment),
+                    )
+                except Exception as e:
+                    print(f"Table version flush error for {table}: {e}")
+
+    async def refresh(self):
+        rows = await self._query("SELECT table_name, version FROM table_versions", fetch_all=True)
+        for row in rows:
+            if row["version"] > self.versions.get(row["table_name"], 0):
+                self.versions[row["table_name"]] = row["version"]
+
+    async def refresh_forever(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Table version refresh error: {e}")
+            await asyncio.sleep(REFRESH_SECONDS)
+
+    def etag(self, tables: Iterable[str], *parts) -> str:
+        digest = hashlib.blake2b(digest_size=12)
+        for table in tables:
+            digest.update(f"{table}:{self.versions.get(table, 0)};".encode())
+        for part in parts:
+            digest.update(f"{part};".encode())
+        return f'W/"{digest.hexdigest()}"'
+
+    def check(self, request: Request, response: Response, tables: Iterable[str], *parts) -> Optional[Response]:
+        """
+        Return a 304 response when the client's copy is current; otherwise set
+        the ETag on `response` and return None so the handler runs its query.
+        """
+        etag = self.etag(tables, request.url.path, request.url.query, *parts)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+        return None
+
+    def stats(self) -> dict:
+        return {"versions": dict(self.versions), "not_modified": self.not_modified}
+
+
+table_versions = TableVersions()
@@ -0,0 +1,324 @@
+"""
+Normalized tags and incrementally maintained facet counts.
+
+Tags live in one `tags` table linked to files and library documents through
+`file_tags` / `library_tags`, both indexed by (tag_id, item_id), so tag
+filters are index lookups instead of LIKE scans over a JSON/text column.
+
+Facet counts (per category, tag, committee and mime type) are kept in
+`facet_counts` and adjusted by +1/-1 as items are created and deleted. Rows are
+partitioned the same way access is checked: files by committee (0 for files
+without one), library documents by visibility (1 public, 0 private). A
+request whose only restriction is access/committee is answered by summing a
+handful of counter rows; narrower filter sets fall back to aggregating the
+matching items.
+"""
+
+import json
+from typing import Awaitable, Callable, Iterable, Optional
+
+FILES = "files"
+LIBRARY = "library"
+MATCH_ALL = "all"
+MATCH_ANY = "any"
+MAX_TAG_LENGTH = 100
+NO_COMMITTEE = 0
+
+QueryFn = Callable[..., Awaitable]
+
+# scope -> (link table, item column, items table)
+_LINKS = {
+    FILES: ("file_tags", "file_id", "files"),
+    LIBRARY: ("library_tags", "document_id", "library"),
+}
+
+SCHEMA_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS tags (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        UNIQUE KEY unique_tag_name (name)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS file_tags (
+        file_id INT NOT NULL,
+        tag_id INT NOT NULL,
+        PRIMARY KEY (file_id, tag_id),
+        INDEX idx_file_tags_tag (tag_id, file_id),
+        FOREIGN KEY (file_id) REFERENCES files(id) ON DELETE CASCADE,
+        FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS library_tags (
+        document_id INT NOT NULL,
+        tag_id INT NOT NULL,
+        PRIMARY KEY (document_id, tag_id),
+        INDEX idx_library_tags_tag (tag_id, document_id),
+        FOREIGN KEY (document_id) REFERENCES library(id) ON DELETE CASCADE,
+        FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS facet_counts (
+        scope VARCHAR(16) NOT NULL,
+        partition_key INT NOT NULL,
+        facet VARCHAR(16) NOT NULL,
+        value VARCHAR(255) NOT NULL,
+        count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (scope, partition_key, facet, value)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin
+    """,
+]
+
+
+def parse_tags(raw) -> list[str]:
+    """Accept a JSON array, a comma-separated string or a list; return unique tag names"""
+    if not raw:
+        return []
+    if isinstance(raw, str):
+        text = raw.strip()
+        values = None
+        if text.startswith("["):
+            try:
+                values = json.loads(text)
+            except ValueError:
+                pass
+        if not isinstance(values, list):
+            values = text.split(",")
+    else:
+        values = list(raw)
+
+    tags = []
+    seen = set()
+    for value in values:
+        name = str(value).strip()[:MAX_TAG_LENGTH]
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            tags.append(name)
+    return tags
+
+
+def tag_filter(scope: str, tags: list[str], mode: str = MATCH_ALL, id_column: str = "id") -> tuple[Optional[str], list]:
+    """SQL condition selecting items carrying all (or any) of `tags`"""
+    if not tags:
+        return None, []
+    link_table, item_column, _ = _LINKS[scope]
+    placeholders = ", ".join(["%s"] * len(tags))
+    subquery = (
+        f"SELECT lt.{item_column} FROM {link_table} lt JOIN tags t ON t.id = lt.tag_id "
+        f"WHERE t.name IN ({placeholders})"
+    )
+    if mode == MATCH_ALL and len(tags) > 1:
+        subquery += f" GROUP BY lt.{item_column} HAVING COUNT(DISTINCT lt.tag_id) = %s"
+        return f"{id_column} IN ({subquery})", [*tags, len(tags)]
+    return f"{id_column} IN ({subquery})", list(tags)
+
+
+def file_facets(row: dict, tags: Iterable[str]) -> tuple[int, list[tuple[str, str]]]:
+    partition = row.get("committee_id") or NO_COMMITTEE
+    facets = [("total", ""), ("category", row.get("category") or ""), ("mime_type", row.get("mime_type") or "")]
+    if row.get("committee_id"):
+        facets.append(("committee", str(row["committee_id"])))
+    facets.extend(("tag", tag) for tag in tags)
+    return partition, facets
+
+
+def library_facets(row: dict, tags: Iterable[str]) -> tuple[int, list[tuple[str, str]]]:
+    partition = 1 if row.get("is_public") else 0
+    facets = [("total", ""), ("category", row.get("category") or "")]
+    facets.extend(("tag", tag) for tag in tags)
+    return partition, facets
+
+
+def _empty_facets() -> dict:
+    return {"total": 0, "category": {}, "tag": {}, "committee": {}, "mime_type": {}}
+
+
+class TagIndex:
+    def __init__(self, query: QueryFn):
+        self.query = query
+
+    async def set_tags(
+        self, scope: str, item_id: int, tags: list[str], query: Optional[QueryFn] = None
+    ) -> list[str]:
+        """
+        Link a newly created item to its tags; returns the canonical tag names.
+        Pass the `query` of the transaction that writes the item, so the links commit with it.
+        """
+        if not tags:
+            return []
+        query = query or self.query
+        link_table, item_column, _ = _LINKS[scope]
+        values = ", ".join(["(%s)"] * len(tags))
+        await query(f"INSERT IGNORE INTO tags (name) VALUES {values}", tags)
+        # The lookup goes through the column collation, so "Budget" finds an existing "budget"
+        placeholders = ", ".join(["%s"] * len(tags))
+        rows = await query(
+            f"SELECT id, name FROM tags WHERE name IN ({placeholders})", tags, fetch_all=True
+        )
+        if not rows:
+            return []
+        values = ", ".join(["(%s, %s)"] * len(rows))
+        params = []
+        for row in rows:
+            params.extend([item_id, row["id"]])
+        await query(f"INSERT IGNORE INTO {link_table} ({item_column}, tag_id) VALUES {values}", params)
+        return [row["name"] for row in rows]
+
+    async def tags_of(self, scope: str, item_id: int, query: Optional[QueryFn] = None) -> list[str]:
+        link_table, item_column, _ = _LINKS[scope]
+        rows = await (query or self.query)(
+            f"SELECT t.name FROM {link_table} lt JOIN tags t ON t.id = lt.tag_id "
+            f"WHERE lt.{item_column} = %s ORDER BY t.name",
+            (item_id,), fetch_all=True,
+        )
+        return [row["name"] for row in rows]
+
+    async def tags_for_items(self, scope: str, item_ids: list[int]) -> dict[int, list[str]]:
+        if not item_ids:
+            return {}
+        link_table, item_column, _ = _LINKS[scope]
+        placeholders = ", ".join(["%s"] * len(item_ids))
+        rows = await self.query(
+            f"SELECT lt.{item_column} AS item_id, t.name FROM {link_table} lt "
+            f"JOIN tags t ON t.id = lt.tag_id WHERE lt.{item_column} IN ({placeholders}) ORDER BY t.name",
+            item_ids, fetch_all=True,
+        )
+        tags: dict[int, list[str]] = {}
+        for row in rows:
+            tags.setdefault(row["item_id"], []).append(row["name"])
+        return tags
+
+    # -------------------------------------------------------------------------
+    # Facet counters
+    # -------------------------------------------------------------------------
+
+    async def adjust(
+        self, scope: str, partition: int, facets: list[tuple[str, str]], delta: int,
+        query: Optional[QueryFn] = None,
+    ):
+        """Add `delta` to each (facet, value) counter of one partition, in the item's transaction if given"""
+        query = query or self.query
+        facets = [(facet, value[:255]) for facet, value in facets]
+        if delta < 0:
+            # Decrements only touch existing counters and never go below zero
+            pairs = ", ".join(["(%s, %s)"] * len(facets))
+            await query(
+                f"""
+                UPDATE facet_counts SET count = GREATEST(count + %s, 0)
+                WHERE scope = %s AND partition_key = %s AND (facet, value) IN ({pairs})
+                """,
+                [delta, scope, partition, *[v for pair in facets for v in pair]],
+            )
+            return
+        values = ", ".join(["(%s, %s, %s, %s, %s)"] * len(facets))
+        params = []
+        for facet, value in facets:
+            params.extend([scope, partition, facet, value, delta])
+        await query(
+            f"""
+            INSERT INTO facet_counts (scope, partition_key, facet, value, count) VALUES {values}
+            ON DUPLICATE KEY UPDATE count = count + VALUES(count)
+            """,
+            params,
+        )
+
+    async def counted_facets(self, scope: str, partitions: Optional[list[int]]) -> dict:
+        """Sum counters over the given partitions (None means all)"""
+        conditions = ["scope = %s", "count > 0"]
+        params: list = [scope]
+        if partitions is not None:
+            if not partitions:
+                return _empty_facets()
+            conditions.append(f"partition_key IN ({', '.join(['%s'] * len(partitions))})")
+            params.extend(partitions)
+        rows = await self.query(
+            f"SELECT partition_key, facet, value, count FROM facet_counts WHERE {' AND '.join(conditions)}",
+            params, fetch_all=True,
+        )
+        result = _empty_facets()
+        for row in rows:
+            if row["facet"] == "total":
+                result["total"] += row["count"]
+            else:
+                bucket = result[row["facet"]]
+                bucket[row["value"]] = bucket.get(row["value"], 0) + row["count"]
+        return result
+
+    async def aggregated_facets(self, scope: str, where_clause: str, params: list) -> dict:
+        """Compute facets for an arbitrary filter set from the items themselves"""
+        link_table, item_column, items_table = _LINKS[scope]
+        result = _empty_facets()
+        row = await self.query(
+            f"SELECT COUNT(*) AS count FROM {items_table} i{where_clause}", params, fetch_one=True
+        )
+        result["total"] = row["count"]
+        columns = ["category"] + (["committee_id", "mime_type"] if scope == FILES else [])
+        for column in columns:
+            rows = await self.query(
+                f"SELECT {column} AS value, COUNT(*) AS count FROM {items_table} i{where_clause} GROUP BY {column}",
+                params, fetch_all=True,
+            )
+            facet = "committee" if column == "committee_id" else column
+            for row in rows:
+                if row["value"] is None:
+                    continue
+                result[facet][str(row["value"])] = row["count"]
+        rows = await self.query(
+            f"""
+            SELECT t.name AS value, COUNT(*) AS count
+            FROM {items_table} i JOIN {link_table} lt ON lt.{item_column} = i.id JOIN tags t ON t.id = lt.tag_id
+            {where_clause} GROUP BY t.name
+            """,
+            params, fetch_all=True,
+        )
+        result["tag"] = {row["value"]: row["count"] for row in rows}
+        return result
+
+    async def rebuild_counts(self):
+        """Recount every facet from scratch (initial backfill or after manual edits)"""
+        await self.query("DELETE FROM facet_counts")
+        await self.query(
+            """
+            INSERT INTO facet_counts (scope, partition_key, facet, value, count)
+            SELECT 'files', COALESCE(committee_id, 0), 'total', '', COUNT(*) FROM files GROUP BY COALESCE(committee_id, 0)
+            UNION ALL
+            SELECT 'files', COALESCE(committee_id, 0), 'category', COALESCE(category, ''), COUNT(*) FROM files
+            GROUP BY COALESCE(committee_id, 0), COALESCE(category, '')
+            UNION ALL
+            SELECT 'files', COALESCE(committee_id, 0), 'mime_type', COALESCE(mime_type, ''), COUNT(*) FROM files
+            GROUP BY COALESCE(committee_id, 0), COALESCE(mime_type, '')
+            UNION ALL
+            SELECT 'files', committee_id, 'committee', CAST(committee_id AS CHAR), COUNT(*) FROM files
+            WHERE committee_id IS NOT NULL GROUP BY committee_id
+            UNION ALL
+            SELECT 'files', COALESCE(f.committee_id, 0), 'tag', t.name, COUNT(*) FROM files f
+            JOIN file_tags ft ON ft.file_id = f.id JOIN tags t ON t.id = ft.tag_id
+            GROUP BY COALESCE(f.committee_id, 0), t.name
+            UNION ALL
+            SELECT 'library', IF(is_public, 1, 0), 'total', '', COUNT(*) FROM library GROUP BY IF(is_public, 1, 0)
+            UNION ALL
+            SELECT 'library', IF(is_public, 1, 0), 'category', COALESCE(category, ''), COUNT(*) FROM library
+            GROUP BY IF(is_public, 1, 0), COALESCE(category, '')
+            UNION ALL
+            SELECT 'library', IF(l.is_public, 1, 0), 'tag', t.name, COUNT(*) FROM library l
+            JOIN library_tags lt ON lt.document_id = l.id JOIN tags t ON t.id = lt.tag_id
+            GROUP BY IF(l.is_public, 1, 0), t.name
+            """
+        )
+
+    async def backfill_library_tags(self):
+        """Normalize the free-text library.tags of documents that have no tag links yet"""
+        rows = await self.query(
+            """
+            SELECT l.id, l.tags FROM library l
+            WHERE l.tags IS NOT NULL AND l.tags <> ''
+              AND NOT EXISTS (SELECT 1 FROM library_tags lt WHERE lt.document_id = l.id)
+            """,
+            fetch_all=True,
+        )
+        for row in rows:
+            await self.set_tags(LIBRARY, row["id"], parse_tags(row["tags"]))
+        return len(rows)
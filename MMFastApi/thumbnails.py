@@ -0,0 +1,101 @@
+"""
+Image thumbnails and width-bounded responsive variants.
+
+Variants are rendered with Pillow in the shared process pool so resizing never
+runs on the event loop or competes for the GIL. They are stored next to the
+original in a "<original>.variants/" directory as w<width>.<format>, written
+atomically, and generated eagerly after upload or lazily on first request.
+Concurrent requests for the same missing variant share a single render.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from process_pool import run_in_process
+from singleflight import SingleFlight
+
+VARIANT_WIDTHS = (160, 320, 640, 1280)
+EAGER_WIDTHS = (160, 640)
+VARIANT_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+DEFAULT_FORMAT = "webp"
+VARIANT_DIR_SUFFIX = ".variants"
+
+# Pillow decodes these; anything else under image/ (e.g. SVG) is served as is
+RASTER_MIME_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp", "image/tiff"}
+
+renders = SingleFlight("thumbnails")
+
+
+def is_raster_image(mime_type: Optional[str]) -> bool:
+    return mime_type in RASTER_MIME_TYPES
+
+
+def snap_width(requested: Optional[int]) -> int:
+    """Round a requested width up to the nearest supported variant width"""
+    if not requested:
+        return VARIANT_WIDTHS[0]
+    for width in VARIANT_WIDTHS:
+        if width >= requested:
+            return width
+    return VARIANT_WIDTHS[-1]
+
+
+def variant_dir(original: Path) -> Path:
+    return original.with_name(original.name + VARIANT_DIR_SUFFIX)
+
+
+def variant_path(original: Path, width: int, fmt: str) -> Path:
+    return variant_dir(original) / f"w{width}.{fmt}"
+
+
+def render_variant(source: str, destination: str, width: int, fmt: str) -> str:
+    """Resize `source` to at most `width` pixels wide; runs in a worker process"""
+    # A previous render may have just finished
+    if os.path.exists(destination):
+        return destination
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA")
+
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        tmp_path = f"{destination}.{os.getpid()}.tmp"
+        options = {"quality": 80, "method": 4} if fmt == "webp" else {"quality": 82, "optimize": True, "progressive": True}
+        image.save(tmp_path, VARIANT_FORMATS[fmt], **options)
+    os.replace(tmp_path, destination)
+    return destination
+
+
+async def ensure_variant(original: Path, width: int, fmt: str = DEFAULT_FORMAT) -> Path:
+    """Return the variant path, rendering it first if it does not exist yet"""
+    destination = variant_path(original, width, fmt)
+    # The stat is file I/O, so it stays off the event loop too
+    if await run_in_threadpool(destination.exists):
+        return destination
+
+    async def render():
+        await run_in_process(render_variant, str(original), str(destination), width, fmt)
+        return destination
+
+    return await renders.do(str(destination), render)
+
+
+async def generate_default_variants(original: Path):
+    """Background stage after upload: pre-render the variants the file grid uses"""
+    for width in EAGER_WIDTHS:
+        try:
+            await ensure_variant(original, width)
+        except Exception as e:
+            print(f"Thumbnail generation failed for {original}: {e}")
+            return
@@ -0,0 +1,327 @@
+"""
+Voting-pattern analytics per committee, computed with NumPy.
+
+Every question a committee voted on (an agenda item, or a meeting as a
+whole) is a column and every member who cast a ballot is a row of a uint8
+matrix holding the option code (vote_codes; 0 where the member did not
+vote). From it, with a handful of matrix products instead of per-row SQL:
+
+- participation: share of the questions in range a member voted on;
+- abstention rate: share of a member's ballots that abstained;
+- agreement: for each pair of members, the share of questions both voted on
+  where they chose the same option;
+- similarity: cosine similarity of the members' ballots scored +1 for,
+  -1 against and 0 otherwise;
+- trends: participation and cohesion (mean pairwise agreement) per period.
+
+The matrix is built once per committee from the columnar archive of closed
+meetings plus the live `votes` rows of the others. Writing a cell is
+idempotent, so ballots present in both are harmless. After that it is kept
+current incrementally: the `votes` entries the change feed recorded for the
+committee since the last refresh are re-read and written into their cells.
+Results are memoized per query until the matrix changes.
+
+NumPy is optional for the rest of the app; without it `available()` is
+false and the endpoint answers 503.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+import vote_codes
+
+try:
+    import numpy as np
+except ImportError:  # optional; only the analytics endpoint needs it
+    np = None
+
+REFRESH_SECONDS = float(os.getenv("VOTE_ANALYTICS_REFRESH_SECONDS", "5"))
+MAX_COMMITTEES = int(os.getenv("VOTE_ANALYTICS_MAX_COMMITTEES", "32"))
+RESULTS_PER_COMMITTEE = 16
+PERIODS = ("month", "quarter", "year")
+
+QueryFn = Callable[..., Awaitable]
+
+
+def available() -> bool:
+    return np is not None
+
+
+def period_starts(times, period: str):
+    """Start of the calendar period (as a sortable int like 202604) for each epoch-second timestamp"""
+    months = times.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)  # months since 1970-01
+    years, month_index = months // 12 + 1970, months % 12
+    if period == "year":
+        return years * 100 + 1
+    if period == "quarter":
+        return years * 100 + month_index // 3 * 3 + 1
+    return years * 100 + month_index + 1
+
+
+def agreement_matrix(ballots):
+    """(agreement, both) for a members x questions code matrix; agreement is NaN where both is 0"""
+    voted = (ballots > 0).astype(np.float32)
+    same = np.zeros((ballots.shape[0], ballots.shape[0]), dtype=np.float32)
+    for code in vote_codes.NAMES:
+        chose = (ballots == code).astype(np.float32)
+        same += chose @ chose.T
+    both = voted @ voted.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(both > 0, same / both, np.nan), both
+
+
+def similarity_matrix(ballots):
+    scores = np.zeros(ballots.shape, dtype=np.float32)
+    scores[ballots == vote_codes.FOR] = 1
+    scores[ballots == vote_codes.AGAINST] = -1
+    norms = np.sqrt((scores * scores).sum(axis=1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        similarity = (scores @ scores.T) / np.outer(norms, norms)
+    return np.where(np.outer(norms, norms) > 0, similarity, np.nan)
+
+
+def _epoch(moment: Optional[datetime]) -> Optional[int]:
+    if moment is None:
+        return None
+    return int((moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)).timestamp())
+
+
+def _rounded(matrix) -> list:
+    return [[None if np.isnan(value) else round(float(value), 4) for value in row] for row in matrix]
+
+
+class CommitteeVotes:
+    """Members x questions code matrix for one committee, grown in place"""
+
+    def __init__(self):
+        self.members: dict[int, int] = {}  # user_id -> row
+        self.questions: dict[tuple, int] = {}  # (meeting_id, agenda_item_id) -> column
+        self.ballots = np.zeros((8, 64), dtype=np.uint8)
+        self.asked_at = np.full(64, np.iinfo(np.int64).max, dtype=np.int64)
+        self.seq = 0  # change_log position already applied
+        self.version = 0
+        self.built = False
+        self.refreshed_at = 0.0
+        self.lock = asyncio.Lock()
+        self.results: OrderedDict = OrderedDict()
+
+    def _index(self, index: dict, keys) -> "np.ndarray":
+        """Positions for `keys`, assigning new ones; loops only over distinct keys"""
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        positions = np.empty(len(unique), dtype=np.int64)
+        for i, key in enumerate(unique.tolist()):
+            key = tuple(key) if isinstance(key, list) else key
+            positions[i] = index.setdefault(key, len(index))
+        return positions[inverse.reshape(-1)]
+
+    def _grow(self):
+        rows, columns = self.ballots.shape
+        need_rows, need_columns = max(rows, len(self.members)), max(columns, len(self.questions))
+        if need_rows > rows or need_columns > columns:
+            new_rows = rows if need_rows <= rows else max(need_rows, rows * 2)
+            new_columns = columns if need_columns <= columns else max(need_columns, columns * 2)
+            grown = np.zeros((new_rows, new_columns), dtype=np.uint8)
+            grown[:rows, :columns] = self.ballots
+            self.ballots = grown
+            asked_at = np.full(new_columns, np.iinfo(np.int64).max, dtype=np.int64)
+            asked_at[:columns] = self.asked_at
+            self.asked_at = asked_at
+
+    def apply(self, meeting_ids, agenda_item_ids, user_ids, codes, created_at):
+        if len(user_ids) == 0:
+            return
+        rows = self._index(self.members, np.asarray(user_ids, dtype=np.int64))
+        columns = self._index(
+            self.questions,
+            np.stack(
+                [np.asarray(meeting_ids, dtype=np.int64), np.asarray(agenda_item_ids, dtype=np.int64)], axis=1
+            ),
+        )
+        self._grow()
+        self.ballots[rows, columns] = np.asarray(codes, dtype=np.uint8)
+        np.minimum.at(self.asked_at, columns, np.asarray(created_at, dtype=np.int64))
+        self.version += 1
+        self.results.clear()
+
+    def view(self, since: Optional[int], until: Optional[int]):
+        """(member ids, ballots, question times) restricted to questions asked in [since, until)"""
+        columns = len(self.questions)
+        asked_at = self.asked_at[:columns]
+        keep = np.ones(columns, dtype=bool)
+        if since is not None:
+            keep &= asked_at >= since
+        if until is not None:
+            keep &= asked_at < until
+        member_ids = np.empty(len(self.members), dtype=np.int64)
+        for user_id, row in self.members.items():
+            member_ids[row] = user_id
+        return member_ids, self.ballots[:len(self.members), :columns][:, keep], asked_at[keep]
+
+
+def analyse(member_ids, ballots, asked_at, period: str) -> dict:
+    questions = ballots.shape[1]
+    voted = ballots > 0
+    cast = voted.sum(axis=1)
+    abstained = (ballots == vote_codes.ABSTAIN).sum(axis=1)
+    agreement, both = agreement_matrix(ballots)
+    similarity = similarity_matrix(ballots)
+
+    members = []
+    for row, user_id in enumerate(member_ids.tolist()):
+        members.append({
+            "user_id": user_id,
+            "ballots": int(cast[row]),
+            "participation": round(float(cast[row]) / questions, 4) if questions else None,
+            "abstention_rate": round(float(abstained[row]) / float(cast[row]), 4) if cast[row] else None,
+            "for": int((ballots[row] == vote_codes.FOR).sum()),
+            "against": int((ballots[row] == vote_codes.AGAINST).sum()),
+        })
+
+    trends = []
+    if questions:
+        buckets = period_starts(asked_at, period)
+        pairs = ~np.eye(len(member_ids), dtype=bool)
+        for bucket in np.unique(buckets).tolist():
+            in_bucket = ballots[:, buckets == bucket]
+            bucket_agreement, bucket_both = agreement_matrix(in_bucket)
+            scored = pairs & (bucket_both > 0)
+            active = (in_bucket > 0).any(axis=1)
+            trends.append({
+                "period": f"{bucket // 100:04d}-{bucket % 100:02d}",
+                "questions": int(in_bucket.shape[1]),
+                "ballots": int((in_bucket > 0).sum()),
+                "participation": round(float((in_bucket[active] > 0).mean()), 4) if active.any() else None,
+                "cohesion": round(float(bucket_agreement[scored].mean()), 4) if scored.any() else None,
+            })
+
+    return {
+        "questions": questions,
+        "members": members,
+        "member_ids": member_ids.tolist(),
+        "agreement": _rounded(agreement),
+        "similarity": _rounded(similarity),
+        "shared_questions": both.astype(np.int64).tolist(),
+        "trends": trends,
+    }
+
+
+class VoteAnalytics:
+    def __init__(self, query: QueryFn, archive):
+        self.query = query
+        self.archive = archive
+        self._committees: OrderedDict[int, CommitteeVotes] = OrderedDict()
+        self.counters = {"builds": 0, "refreshes": 0, "ballots_applied": 0, "hits": 0, "computed": 0}
+
+    async def _load_rows(self, where: str, params) -> dict:
+        rows = await self.query(
+            f"""
+            SELECT v.meeting_id, v.agenda_item_id, v.user_id, v.opt_code,
+                   UNIX_TIMESTAMP(v.created_at) AS created_at
+            FROM votes v JOIN meetings m ON m.id = v.meeting_id
+            WHERE {where}
+            """,
+            params, fetch_all=True,
+        )
+        return {
+            "meeting_id": [row["meeting_id"] for row in rows],
+            "agenda_item_id": [row["agenda_item_id"] for row in rows],
+            "user_id": [row["user_id"] for row in rows],
+            "opt_code": [row["opt_code"] for row in rows],
+            "created_at": [int(row["created_at"] or 0) for row in rows],
+        }
+
+    @staticmethod
+    def _apply(votes: CommitteeVotes, columns: dict):
+        votes.apply(columns["meeting_id"], columns["agenda_item_id"], columns["user_id"],
+                    columns["opt_code"], columns["created_at"])
+        return len(columns["user_id"])
+
+    async def _build(self, committee_id: int, votes: CommitteeVotes):
+        head = await self.query("SELECT COALESCE(MAX(seq), 0) AS seq FROM change_log", fetch_one=True)
+        for year in self.archive.years(committee_id):
+            columns = await self.archive.read(committee_id, year)
+            self.counters["ballots_applied"] += await run_in_threadpool(self._apply, votes, columns)
+        live = await self._load_rows("m.committee_id = %s AND m.votes_archived_at IS NULL", (committee_id,))
+        self.counters["ballots_applied"] += await run_in_threadpool(self._apply, votes, live)
+        votes.seq = head["seq"]
+        votes.built = True
+        votes.refreshed_at = time.monotonic()
+        self.counters["builds"] += 1
+
+    async def _refresh(self, committee_id: int, votes: CommitteeVotes):
+        changed = await self.query(
+            """
+            SELECT MAX(seq) AS seq, entity_id FROM change_log
+            WHERE seq > %s AND entity = 'votes' AND committee_id = %s
+            GROUP BY entity_id
+            """,
+            (votes.seq, committee_id), fetch_all=True,
+        )
+        if changed:
+            placeholders = ", ".join(["%s"] * len(changed))
+            columns = await self._load_rows(
+                f"v.id IN ({placeholders})", [row["entity_id"] for row in changed]
+            )
+            self.counters["ballots_applied"] += self._apply(votes, columns)
+            votes.seq = max(votes.seq, max(row["seq"] for row in changed))
+        votes.refreshed_at = time.monotonic()
+        self.counters["refreshes"] += 1
+
+    async def committee(self, committee_id: int) -> CommitteeVotes:
+        votes = self._committees.get(committee_id)
+        if votes is None:
+            votes = self._committees[committee_id] = CommitteeVotes()
+        self._committees.move_to_end(committee_id)
+        while len(self._committees) > MAX_COMMITTEES:
+            self._committees.popitem(last=False)
+
+        # One build or refresh at a time per committee; waiters then see its result
+        async with votes.lock:
+            if not votes.built:
+                await self._build(committee_id, votes)
+            elif time.monotonic() - votes.refreshed_at >= REFRESH_SECONDS:
+                await self._refresh(committee_id, votes)
+        return votes
+
+    async def report(
+        self, committee_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None,
+        period: str = "month",
+    ) -> dict:
+        votes = await self.committee(committee_id)
+        key = (_epoch(since), _epoch(until), period)
+        cached = votes.results.get(key)
+        if cached is not None and cached[0] == votes.version:
+            self.counters["hits"] += 1
+            return cached[1]
+
+        version = votes.version
+        member_ids, ballots, asked_at = votes.view(*key[:2])
+        # view() returns copies, so the matrix may keep changing while this runs
+        result = await run_in_threadpool(analyse, member_ids, ballots, asked_at, period)
+        result["period"] = period
+        votes.results[key] = (version, result)
+        while len(votes.results) > RESULTS_PER_COMMITTEE:
+            votes.results.popitem(last=False)
+        self.counters["computed"] += 1
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "numpy": available(),
+            "committees": {
+                committee_id: {
+                    "members": len(votes.members),
+                    "questions": len(votes.questions),
+                    "matrix_bytes": int(votes.ballots.nbytes),
+                    "version": votes.version,
+                }
+                for committee_id, votes in self._committees.items()
+            },
+            **self.counters,
+        }
@@ -0,0 +1,264 @@
+"""
+Append-only columnar archive of ballots from closed meetings.
+
+Once a meeting is completed or cancelled its ballots no longer change (the
+ballot batcher refuses them from `meetings.status`), and historical analysis
+should not have to scan `votes`. The archiver stamps `meetings.votes_closed_at`
+when it first sees a meeting closed and, once that is older than
+VOTE_ARCHIVE_GRACE_SECONDS, appends the meeting's ballots to one file per
+committee and year (`<VOTE_ARCHIVE_DIR>/committee-<id>/<year>.votes`) and
+stamps `meetings.votes_archived_at`. The stamp is cleared if the meeting is
+reopened before it is archived.
+
+A file is a sequence of segments, one per archived meeting. A segment is a
+fixed header (magic, version, meeting id, row count) followed by one packed
+`array` per column: meeting_id, agenda_item_id and user_id as int32,
+opt_code as uint8 and created_at as int64 epoch seconds, all little-endian.
+A ballot therefore takes 21 bytes and a column can be loaded without
+touching the others' Python objects. A trailer (segment length and CRC-32)
+closes each segment, so a damaged one is recognised and skipped rather than
+read into the next; version 1 segments written before the trailer are still
+read. Segments are only ever appended, each followed by an fsync, after
+truncating the file to the end of its last valid segment, so the tail of a
+crash while appending is dropped instead of being written after. If a meeting
+is archived again after a crash before it was stamped, readers keep only its
+last segment.
+"""
+
+import asyncio
+import os
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from vote_ingest import CLOSED_STATUSES, WINDOW_SECONDS
+
+ARCHIVE_DIR = Path(os.getenv("VOTE_ARCHIVE_DIR", "vote_archive"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("VOTE_ARCHIVE_INTERVAL_SECONDS", "300"))
+ARCHIVE_BATCH_SIZE = 50
+# Well beyond a ballot batch, so nothing can still be committing for a meeting being archived
+ARCHIVE_GRACE_SECONDS = max(int(os.getenv("VOTE_ARCHIVE_GRACE_SECONDS", "60")), int(WINDOW_SECONDS) + 1)
+
+MAGIC = b"MMVA"
+FORMAT_VERSION = 2
+LEGACY_VERSION = 1  # no trailer
+HEADER = struct.Struct("<4sHII")  # magic, version, meeting_id, rows
+TRAILER = struct.Struct("<II")  # bytes of header and columns, CRC-32 of them
+# (column, array typecode); sizes are checked at import since typecodes are platform-defined
+COLUMNS = (
+    ("meeting_id", "i"),
+    ("agenda_item_id", "i"),
+    ("user_id", "i"),
+    ("opt_code", "B"),
+    ("created_at", "q"),
+)
+assert [array(code).itemsize for _, code in COLUMNS] == [4, 4, 4, 1, 8]
+ROW_BYTES = sum(array(code).itemsize for _, code in COLUMNS)
+
+QueryFn = Callable[..., Awaitable]
+
+SCHEMA_COLUMNS = [
+    ("meetings", "votes_closed_at", "DATETIME NULL"),
+    ("meetings", "votes_archived_at", "DATETIME NULL"),
+]
+
+
+def archive_path(root: Path, committee_id: Optional[int], year: int) -> Path:
+    return root / f"committee-{committee_id if committee_id is not None else 'none'}" / f"{year}.votes"
+
+
+def empty_columns() -> dict:
+    return {name: array(code) for name, code in COLUMNS}
+
+
+def encode_segment(meeting_id: int, rows: list) -> bytes:
+    columns = empty_columns()
+    for row in rows:
+        for name, _ in COLUMNS:
+            columns[name].append(row[name])
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, meeting_id, len(rows))]
+    for name, _ in COLUMNS:
+        if sys.byteorder == "big":
+            columns[name].byteswap()
+        parts.append(columns[name].tobytes())
+    body = b"".join(parts)
+    return body + TRAILER.pack(len(body), zlib.crc32(body))
+
+
+def _segment_at(data: bytes, offset: int) -> Optional[tuple[int, int, int]]:
+    """(meeting_id, rows, end) of the valid segment starting at `offset`, or None"""
+    if offset + HEADER.size > len(data):
+        return None
+    magic, version, meeting_id, rows = HEADER.unpack_from(data, offset)
+    body_end = offset + HEADER.size + rows * ROW_BYTES
+    if magic != MAGIC:
+        return None
+    if version == LEGACY_VERSION:
+        # Without a trailer, only trust a segment that ends where the file or another segment starts
+        if body_end == len(data) or data[body_end:body_end + len(MAGIC)] == MAGIC:
+            return meeting_id, rows, body_end
+        return None
+    if version != FORMAT_VERSION or body_end + TRAILER.size > len(data):
+        return None
+    length, crc = TRAILER.unpack_from(data, body_end)
+    if length != body_end - offset or crc != zlib.crc32(data[offset:body_end]):
+        return None
+    return meeting_id, rows, body_end + TRAILER.size
+
+
+def scan_segments(data: bytes) -> tuple[dict, int]:
+    """
+    Valid segments as {meeting_id: (offset of first column, rows)}, the last
+    per meeting winning, and the end of the last valid segment. Damaged bytes
+    are skipped up to the next segment that checks out.
+    """
+    segments: dict[int, tuple[int, int]] = {}
+    offset = valid_end = 0
+    while offset < len(data):
+        segment = _segment_at(data, offset)
+        if segment is None:
+            offset = data.find(MAGIC, offset + 1)
+            if offset < 0:
+                break
+            continue
+        meeting_id, rows, end = segment
+        segments[meeting_id] = (offset + HEADER.size, rows)
+        offset = valid_end = end
+    return segments, valid_end
+
+
+def append_segment(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        f.seek(0)
+        _, valid_end = scan_segments(f.read())
+        # Drop the torn tail of an earlier crash so it cannot swallow this segment
+        f.truncate(valid_end)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_file(path: Path) -> dict:
+    """All ballots in one archive file as {column: array}, last segment per meeting winning"""
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return empty_columns()
+
+    segments, _ = scan_segments(data)
+    columns = empty_columns()
+    for start, rows in segments.values():
+        position = start
+        for name, code in COLUMNS:
+            chunk = array(code)
+            size = rows * chunk.itemsize
+            chunk.frombytes(data[position:position + size])
+            if sys.byteorder == "big":
+                chunk.byteswap()
+            columns[name].extend(chunk)
+            position += size
+    return columns
+
+
+class VoteArchive:
+    def __init__(self, query: QueryFn, root: Path = ARCHIVE_DIR, grace_seconds: int = ARCHIVE_GRACE_SECONDS):
+        self.query = query
+        self.root = root
+        self.grace_seconds = grace_seconds
+        self.counters = {"meetings": 0, "ballots": 0, "bytes": 0, "errors": 0}
+
+    async def stamp_closed(self):
+        statuses = ", ".join(["%s"] * len(CLOSED_STATUSES))
+        await self.query(
+            f"""
+            UPDATE meetings SET votes_closed_at = NOW()
+            WHERE status IN ({statuses}) AND votes_closed_at IS NULL AND votes_archived_at IS NULL
+            """,
+            CLOSED_STATUSES,
+        )
+        # Reopened before it was archived; the grace period starts again when it closes
+        await self.query(
+            f"""
+            UPDATE meetings SET votes_closed_at = NULL
+            WHERE status NOT IN ({statuses}) AND votes_closed_at IS NOT NULL AND votes_archived_at IS NULL
+            """,
+            CLOSED_STATUSES,
+        )
+
+    async def archive_meeting(self, meeting: dict) -> int:
+        rows = await self.query(
+            """
+            SELECT meeting_id, agenda_item_id, user_id, opt_code, UNIX_TIMESTAMP(created_at) AS created_at
+            FROM votes WHERE meeting_id = %s ORDER BY agenda_item_id, user_id
+            """,
+            (meeting["id"],), fetch_all=True,
+        )
+        rows = [{**row, "created_at": int(row["created_at"] or 0)} for row in rows]
+        if rows:
+            data = encode_segment(meeting["id"], rows)
+            path = archive_path(self.root, meeting["committee_id"], meeting["year"])
+            await run_in_threadpool(append_segment, path, data)
+            self.counters["bytes"] += len(data)
+        await self.query(
+            "UPDATE meetings SET votes_archived_at = NOW() WHERE id = %s", (meeting["id"],)
+        )
+        self.counters["meetings"] += 1
+        self.counters["ballots"] += len(rows)
+        return len(rows)
+
+    async def archive_closed(self, limit: int = ARCHIVE_BATCH_SIZE) -> int:
+        placeholders = ", ".join(["%s"] * len(CLOSED_STATUSES))
+        meetings = await self.query(
+            f"""
+            SELECT id, committee_id, YEAR(COALESCE(scheduled_at, created_at)) AS year
+            FROM meetings
+            WHERE status IN ({placeholders}) AND votes_archived_at IS NULL
+                AND votes_closed_at < NOW() - INTERVAL %s SECOND
+            ORDER BY id LIMIT %s
+            """,
+            (*CLOSED_STATUSES, self.grace_seconds, limit), fetch_all=True,
+        )
+        for meeting in meetings:
+            try:
+                await self.archive_meeting(meeting)
+            except Exception as e:
+                # Not stamped, so it is retried on the next pass
+                self.counters["errors"] += 1
+                print(f"Vote archive failed for meeting {meeting['id']}: {e}")
+        return len(meetings)
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.stamp_closed()
+                while await self.archive_closed() == ARCHIVE_BATCH_SIZE:
+                    pass
+            except Exception as e:
+                print(f"Vote archiver error: {e}")
+            await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+    def years(self, committee_id: Optional[int]) -> list:
+        directory = archive_path(self.root, committee_id, 0).parent
+        if not directory.is_dir():
+            return []
+        return sorted(int(path.stem) for path in directory.glob("*.votes") if path.stem.isdigit())
+
+    async def read(self, committee_id: Optional[int], year: int) -> dict:
+        return await run_in_threadpool(read_file, archive_path(self.root, committee_id, year))
+
+    def stats(self) -> dict:
+        files = list(self.root.glob("committee-*/*.votes")) if self.root.is_dir() else []
+        return {
+            "directory": str(self.root),
+            "files": len(files),
+            "file_bytes": sum(path.stat().st_size for path in files),
+            "grace_seconds": self.grace_seconds,
+            "row_bytes": ROW_BYTES,
+            **self.counters,
+        }
@@ -0,0 +1,94 @@
+"""
+Integer codes for ballot options.
+
+Ballots used to store their option as free text ('for', 'yes', 'Against ', ...)
+in `votes.opt`, so every tally grouped on strings. They now store
+`votes.opt_code`, a TINYINT from the `vote_options` lookup table, and the
+names below are the canonical spelling; 'yes' and 'no' are accepted as
+aliases of 'for' and 'against'.
+
+Rows written before this existed are converted in id-range batches at
+startup: known values get their code and lose the text. Values that match no
+option keep their text with code 0, so nothing is lost; `name()` falls back to
+that text.
+"""
+
+from typing import Awaitable, Callable, Optional
+
+FOR = 1
+AGAINST = 2
+ABSTAIN = 3
+UNMAPPED = 0
+
+NAMES = {FOR: "for", AGAINST: "against", ABSTAIN: "abstain"}
+ALIASES = {"yes": "for", "no": "against"}
+CODES = {name: code for code, name in NAMES.items()}
+
+MIGRATION_BATCH_SIZE = 5000
+
+QueryFn = Callable[..., Awaitable]
+
+SCHEMA_TABLE = """
+CREATE TABLE IF NOT EXISTS vote_options (
+    code TINYINT UNSIGNED PRIMARY KEY,
+    name VARCHAR(16) NOT NULL UNIQUE
+) ENGINE=InnoDB
+"""
+
+SCHEMA_COLUMNS = [
+    ("votes", "opt_code", "TINYINT UNSIGNED NOT NULL DEFAULT 0"),
+]
+
+
+def code_of(opt: Optional[str]) -> Optional[int]:
+    """Code for an option name or alias, None if it is not one"""
+    name = (opt or "").strip().lower()
+    return CODES.get(ALIASES.get(name, name))
+
+
+def name(code: int, legacy: Optional[str] = None) -> Optional[str]:
+    return NAMES.get(code, legacy)
+
+
+def option_case(column: str) -> str:
+    """SQL expression mapping a text option column to its code (0 when unknown)"""
+    spellings = {**{spelling: spelling for spelling in CODES}, **ALIASES}
+    whens = " ".join(f"WHEN '{spelling}' THEN {CODES[canonical]}" for spelling, canonical in spellings.items())
+    return f"CASE LOWER(TRIM({column})) {whens} ELSE {UNMAPPED} END"
+
+
+def name_sql(code_column: str = "opt_code", text_column: str = "opt") -> str:
+    """SQL expression giving a ballot's option name, as `name()` does"""
+    assert sorted(NAMES) == list(range(1, len(NAMES) + 1))  # ELT is positional
+    names = ", ".join(f"'{NAMES[code]}'" for code in sorted(NAMES))
+    return f"COALESCE(ELT({code_column}, {names}), {text_column})"
+
+
+async def seed(query: QueryFn):
+    values = ", ".join(["(%s, %s)"] * len(NAMES))
+    await query(
+        f"INSERT IGNORE INTO vote_options (code, name) VALUES {values}",
+        [value for item in NAMES.items() for value in item],
+    )
+
+
+async def migrate_text(query: QueryFn, batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """Convert text options to codes; returns how many rows remain unmapped"""
+    bounds = await query(
+        "SELECT MIN(id) AS first_id, MAX(id) AS last_id FROM votes WHERE opt_code = 0 AND opt IS NOT NULL",
+        fetch_one=True,
+    )
+    if bounds["first_id"] is not None:
+        for start in range(bounds["first_id"], bounds["last_id"] + 1, batch_size):
+            await query(
+                f"""
+                UPDATE votes SET opt_code = {option_case('opt')},
+                    opt = IF({option_case('opt')} = {UNMAPPED}, opt, NULL)
+                WHERE id >= %s AND id < %s AND opt_code = 0 AND opt IS NOT NULL
+                """,
+                (start, start + batch_size),
+            )
+    unmapped = await query(
+        "SELECT COUNT(*) AS count FROM votes WHERE opt_code = 0", fetch_one=True
+    )
+    return unmapped["count"]
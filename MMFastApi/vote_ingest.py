@@ -0,0 +1,278 @@
+"""
+Group-commit ingestion for ballots.
+
+When the chair opens a vote every member submits within seconds. Instead of
+a check, an insert-or-update and a re-select on a fresh connection per
+ballot, `VoteBatcher.submit` queues the ballot and waits on a future. A
+single flusher task collects whatever arrives within VOTE_BATCH_WINDOW_MS
+(or until VOTE_BATCH_MAX ballots are queued) and writes the batch with one
+multi-row INSERT ... ON DUPLICATE KEY UPDATE on its own long-lived
+connection, reads the stored rows back in the same transaction and commits.
+Only then are the callers' futures resolved, so an acknowledged ballot is
+durable. While one batch commits the next one accumulates.
+
+Ballots are keyed by meeting, agenda item (0 for the meeting as a whole) and
+member. The options they replace are read under lock before the upsert and
+handed to the `in_transaction` hook together with the new ones and the
+stored rows, so derived aggregates (vote_tally) and journal entries
+(change_feed, the read-model outbox) commit with the ballots.
+
+Each batch first reads its meetings' status under a shared lock. Ballots for
+a meeting that is completed or cancelled are refused with VotingClosedError
+and left out of the batch. Closing a meeting waits for the batches holding
+its row, so every ballot accepted for a meeting has committed before the
+meeting is closed, and none is accepted after.
+
+A member voting twice in the same batch keeps the later ballot, exactly as
+two sequential updates would. If a batch fails on a ballot's data (a user or
+meeting deleted meanwhile), its halves are committed separately, down to
+single ballots, so only the offending ballots get the error. Any other
+failure fails the ballots not yet committed, and the connection is replaced;
+parts of a split batch that did commit are acknowledged as usual.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+import aiomysql
+
+WINDOW_SECONDS = float(os.getenv("VOTE_BATCH_WINDOW_MS", "5")) / 1000
+MAX_BATCH = int(os.getenv("VOTE_BATCH_MAX", "500"))
+
+SCHEMA_COLUMNS = [
+    ("votes", "agenda_item_id", "INT NOT NULL DEFAULT 0"),
+]
+# One ballot per member and agenda item; meeting-level ballots use agenda_item_id 0
+SCHEMA_INDEX = (
+    "votes", "uq_votes_ballot", "UNIQUE KEY uq_votes_ballot (meeting_id, agenda_item_id, user_id)"
+)
+# Keep the newest ballot per member and item so the unique key can be added
+DEDUPLICATE_SQL = """
+DELETE older FROM votes older
+JOIN votes newer ON newer.meeting_id = older.meeting_id AND newer.agenda_item_id = older.agenda_item_id
+    AND newer.user_id = older.user_id AND newer.id > older.id
+"""
+# Superseded by uq_votes_ballot
+OBSOLETE_INDEXES = [("votes", "uq_votes_meeting_user")]
+
+# Meetings in these states take no more ballots
+CLOSED_STATUSES = ("completed", "cancelled")
+
+# Single-ballot upsert for the per-request paths. It inserts nothing once the
+# meeting is closed (or gone); the SELECT share-locks the meeting row as the batch does.
+UPSERT_IF_OPEN_SQL = f"""
+INSERT INTO votes (meeting_id, agenda_item_id, user_id, opt_code)
+SELECT m.id, %s, %s, %s FROM meetings m
+WHERE m.id = %s AND m.status NOT IN ({", ".join(repr(status) for status in CLOSED_STATUSES)})
+ON DUPLICATE KEY UPDATE opt_code = VALUES(opt_code), opt = NULL, id = LAST_INSERT_ID(votes.id)
+"""
+
+ConnectFn = Callable[[], Awaitable]
+QueryFn = Callable[..., Awaitable]
+
+
+class VotingClosedError(RuntimeError):
+    pass
+
+
+class VoteBatcher:
+    def __init__(
+        self,
+        connect: ConnectFn,
+        on_commit: Optional[Callable[[list], Awaitable]] = None,
+        in_transaction: Optional[Callable[[QueryFn, list, list], Awaitable]] = None,
+        table: str = "votes",
+        window: float = WINDOW_SECONDS,
+        max_batch: int = MAX_BATCH,
+    ):
+        self.connect = connect
+        self.on_commit = on_commit
+        self.in_transaction = in_transaction
+        self.table = table
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: deque = deque()
+        self._full = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._connection = None
+        self.counters = {"ballots": 0, "batches": 0, "failed_batches": 0, "rejected_ballots": 0, "closed_ballots": 0,
+                         "largest_batch": 0}
+        self._commit_seconds = 0.0
+
+    async def submit(self, meeting_id: int, user_id: int, opt_code: int, agenda_item_id: int = 0) -> dict:
+        """Queue a ballot (option as a vote_codes code); returns the stored row once its batch has committed"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((meeting_id, agenda_item_id, user_id), opt_code, future))
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        return await future
+
+    async def _flush_loop(self):
+        while self._pending:
+            if len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            self._full.clear()
+            batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.max_batch))]
+            committed: dict = {}
+            accepted: list = []
+            error = None
+            try:
+                await self._commit_isolating(batch, committed, accepted)
+            except Exception as e:
+                # Parts of a split batch may have committed before this
+                error = e
+
+            if self.on_commit and committed:
+                try:
+                    await self.on_commit(list(committed.values()))
+                except Exception as e:
+                    print(f"Vote batch post-commit hook error: {e}")
+            for key, _, future in accepted:
+                if not future.done():
+                    future.set_result(dict(committed[key]))
+            if error is not None:
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+
+    async def _commit_isolating(self, batch: list, committed: dict, accepted: list):
+        """
+        Commit `batch`, splitting it when a ballot's data is rejected; rejected
+        ballots get the error. Stored rows are added to `committed` and their
+        entries to `accepted` as each part commits, so they survive a later failure.
+        """
+        try:
+            rows = await self._commit(batch)
+        except (aiomysql.IntegrityError, aiomysql.DataError) as e:
+            self.counters["failed_batches"] += 1
+            if len(batch) == 1:
+                self.counters["rejected_ballots"] += 1
+                if not batch[0][2].done():
+                    batch[0][2].set_exception(e)
+                return
+            # Halves commit in order, so a member's later ballot still wins
+            middle = len(batch) // 2
+            await self._commit_isolating(batch[:middle], committed, accepted)
+            await self._commit_isolating(batch[middle:], committed, accepted)
+            return
+        except Exception:
+            self.counters["failed_batches"] += 1
+            raise
+        committed.update(rows)
+        accepted.extend(entry for entry in batch if entry[0] in rows)
+
+    async def _get_connection(self):
+        if self._connection is None or self._connection.closed:
+            self._connection = await self.connect()
+        return self._connection
+
+    async def _commit(self, batch: list) -> dict:
+        started = time.perf_counter()
+        meeting_ids = sorted({key[0] for key, _, _ in batch})
+        rows = []
+
+        connection = await self._get_connection()
+        try:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                async def query(sql, params=None, fetch_one=False, fetch_all=False):
+                    await cursor.execute(sql, params)
+                    if fetch_one:
+                        return await cursor.fetchone()
+                    if fetch_all:
+                        return await cursor.fetchall()
+                    return cursor.lastrowid
+
+                # Held until the commit, so a meeting cannot close under the batch
+                closed = {
+                    row["id"] for row in await query(
+                        f"SELECT id, status FROM meetings WHERE id IN ({', '.join(['%s'] * len(meeting_ids))}) "
+                        "LOCK IN SHARE MODE",
+                        meeting_ids, fetch_all=True,
+                    )
+                    if row["status"] in CLOSED_STATUSES
+                }
+                # Last ballot wins within a batch; the same key twice in one VALUES list would too
+                latest = {}
+                for key, opt_code, future in batch:
+                    if key[0] not in closed:
+                        latest[key] = opt_code
+                    elif not future.done():
+                        self.counters["closed_ballots"] += 1
+                        future.set_exception(VotingClosedError(f"Voting for meeting {key[0]} is closed"))
+                if latest:
+                    rows = await self._upsert(query, latest)
+            await connection.commit()
+        except Exception:
+            try:
+                await connection.rollback()
+            finally:
+                connection.close()
+                self._connection = None
+            raise
+
+        self.counters["batches"] += 1
+        self.counters["ballots"] += len(batch)
+        self.counters["largest_batch"] = max(self.counters["largest_batch"], len(batch))
+        self._commit_seconds += time.perf_counter() - started
+        return {(row["meeting_id"], row["agenda_item_id"], row["user_id"]): row for row in rows}
+
+    async def _upsert(self, query: QueryFn, latest: dict) -> list:
+        keys = ", ".join(["(%s, %s, %s)"] * len(latest))
+        key_params = [value for key in latest for value in key]
+        values = ", ".join(["(%s, %s, %s, %s, NOW())"] * len(latest))
+        params = [value for key, opt_code in latest.items() for value in (*key, opt_code)]
+        columns = "meeting_id, agenda_item_id, user_id"
+
+        previous = await query(
+            f"SELECT {columns}, opt_code FROM {self.table} WHERE ({columns}) IN ({keys}) FOR UPDATE",
+            key_params, fetch_all=True,
+        )
+        await query(
+            f"""
+            INSERT INTO {self.table} ({columns}, opt_code, created_at) VALUES {values}
+            ON DUPLICATE KEY UPDATE opt_code = VALUES(opt_code), opt = NULL
+            """,
+            params,
+        )
+        rows = await query(
+            f"""
+            SELECT v.id, v.meeting_id, v.agenda_item_id, v.user_id, v.opt_code, v.created_at, m.committee_id
+            FROM {self.table} v JOIN meetings m ON m.id = v.meeting_id
+            WHERE (v.meeting_id, v.agenda_item_id, v.user_id) IN ({keys})
+            """,
+            key_params, fetch_all=True,
+        )
+        if self.in_transaction:
+            replaced = {
+                (row["meeting_id"], row["agenda_item_id"], row["user_id"]): row["opt_code"] for row in previous
+            }
+            await self.in_transaction(
+                query, [(key, replaced.get(key), code) for key, code in latest.items()], rows
+            )
+        return rows
+
+    async def close(self):
+        if self._flusher is not None:
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def stats(self) -> dict:
+        batches = self.counters["batches"]
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "queued": len(self._pending),
+            "mean_batch": self.counters["ballots"] / batches if batches else 0,
+            "mean_commit_ms": self._commit_seconds / batches * 1000 if batches else 0,
+            **self.counters,
+        }
@@ -0,0 +1,190 @@
+"""
+Server-side roll-call tallies for agenda items.
+
+A ballot may name an agenda item (`votes.agenda_item_id` is 0 for ballots
+on the meeting as a whole, see vote_ingest). `vote_results` is a cached
+aggregate per agenda item that nobody posts any more: when a batch of
+ballots commits, the change in for/against/abstain per item (a new ballot
+adds one, a changed ballot moves one between columns) is applied in the same
+transaction, and the item's result is decided again.
+
+The decision uses the committee's membership and the meeting's attendance.
+`quorum()` is the one quorum rule, also behind attendance_live's counter:
+more than VOTE_QUORUM_FRACTION of the committee's members (rounded down,
+plus one) are present, and only committee members count. For an item, a
+member who voted on it counts as present even without a check-in. A quorate
+item is approved by a simple majority of the ballots cast for or against
+(abstentions count for neither) or, with VOTE_MAJORITY=present, by more than
+half of those present.
+
+`recount()` rebuilds one item's row from the ballots, for writers that do
+not track the previous ballot (main_extended, main_mysql) and for repairs.
+"""
+
+import os
+from typing import Awaitable, Callable, Iterable, Optional
+
+from vote_codes import FOR, AGAINST, ABSTAIN
+
+# Column order of the per-item adjustments
+CODES = (FOR, AGAINST, ABSTAIN)
+
+APPROVED = "approved"
+REJECTED = "rejected"
+NO_QUORUM = "no_quorum"
+
+QUORUM_FRACTION = float(os.getenv("VOTE_QUORUM_FRACTION", "0.5"))
+MAJORITY = os.getenv("VOTE_MAJORITY", "cast")  # "cast" or "present"
+
+QueryFn = Callable[..., Awaitable]
+
+# Same definition as schema_extended.sql / main_extended, for databases set up from the base schema
+SCHEMA_TABLE = """
+CREATE TABLE IF NOT EXISTS vote_results (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    agenda_item_id INT NOT NULL,
+    votes_for INT DEFAULT 0,
+    votes_against INT DEFAULT 0,
+    votes_abstain INT DEFAULT 0,
+    total_votes INT DEFAULT 0,
+    result ENUM('approved', 'rejected', 'no_quorum') NOT NULL,
+    voted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (agenda_item_id) REFERENCES agenda_items(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_agenda_vote (agenda_item_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+def quorum_required(members: int) -> int:
+    return int(members * QUORUM_FRACTION) + 1
+
+
+def quorum(members: int, present_members: int) -> dict:
+    """Committee size and committee members present, with the quorum they make"""
+    required = quorum_required(members)
+    return {
+        "members": members,
+        "present_members": present_members,
+        "quorum_required": required,
+        "quorate": present_members >= required,
+    }
+
+
+def decide(votes_for: int, votes_against: int, present: int, members: int) -> str:
+    if not quorum(members, present)["quorate"]:
+        return NO_QUORUM
+    if MAJORITY == "present":
+        return APPROVED if votes_for * 2 > present else REJECTED
+    return APPROVED if votes_for > votes_against else REJECTED
+
+
+def deltas(changes: Iterable[tuple]) -> dict:
+    """
+    Per agenda item, the [for, against, abstain] adjustment for
+    (agenda_item_id, previous option code or None, new option code) changes.
+    """
+    adjustments: dict[int, list] = {}
+    for agenda_item_id, previous, current in changes:
+        if not agenda_item_id:
+            continue
+        counts = adjustments.setdefault(agenda_item_id, [0, 0, 0])
+        if previous in CODES:
+            counts[CODES.index(previous)] -= 1
+        if current in CODES:
+            counts[CODES.index(current)] += 1
+    return adjustments
+
+
+async def apply_changes(query: QueryFn, changes: Iterable[tuple]) -> list:
+    """Adjust vote_results for a batch of ballot changes and re-decide the items; returns their ids"""
+    adjustments = deltas(changes)
+    if not adjustments:
+        return []
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(adjustments))
+    params = [
+        value
+        for agenda_item_id, (votes_for, votes_against, votes_abstain) in adjustments.items()
+        for value in (agenda_item_id, votes_for, votes_against, votes_abstain,
+                      votes_for + votes_against + votes_abstain, NO_QUORUM)
+    ]
+    await query(
+        f"""
+        INSERT INTO vote_results (agenda_item_id, votes_for, votes_against, votes_abstain, total_votes, result)
+        VALUES {values}
+        ON DUPLICATE KEY UPDATE
+            votes_for = votes_for + VALUES(votes_for),
+            votes_against = votes_against + VALUES(votes_against),
+            votes_abstain = votes_abstain + VALUES(votes_abstain),
+            total_votes = total_votes + VALUES(total_votes)
+        """,
+        params,
+    )
+    for agenda_item_id in adjustments:
+        await redecide(query, agenda_item_id)
+    return list(adjustments)
+
+
+async def standing(query: QueryFn, agenda_item_id: int) -> Optional[dict]:
+    """Committee size and committee members present (checked in or voted on the item) for the item's meeting"""
+    return await query(
+        """
+        SELECT ai.meeting_id,
+               (SELECT COUNT(*) FROM committee_members cm WHERE cm.committee_id = m.committee_id) AS members,
+               (SELECT COUNT(*) FROM (
+                    SELECT a.user_id FROM attendance a
+                    WHERE a.meeting_id = ai.meeting_id AND a.status = 'present'
+                        AND a.user_id IN (SELECT cm.user_id FROM committee_members cm
+                                          WHERE cm.committee_id = m.committee_id)
+                    UNION
+                    SELECT v.user_id FROM votes v
+                    WHERE v.meeting_id = ai.meeting_id AND v.agenda_item_id = ai.id
+                        AND v.user_id IN (SELECT cm.user_id FROM committee_members cm
+                                          WHERE cm.committee_id = m.committee_id)
+               ) AS p) AS present
+        FROM agenda_items ai JOIN meetings m ON m.id = ai.meeting_id
+        WHERE ai.id = %s
+        """,
+        (agenda_item_id,), fetch_one=True,
+    )
+
+
+async def redecide(query: QueryFn, agenda_item_id: int) -> Optional[str]:
+    counts = await query(
+        "SELECT votes_for, votes_against FROM vote_results WHERE agenda_item_id = %s",
+        (agenda_item_id,), fetch_one=True,
+    )
+    numbers = await standing(query, agenda_item_id)
+    if not counts or not numbers:
+        return None
+    result = decide(counts["votes_for"], counts["votes_against"], numbers["present"], numbers["members"])
+    await query(
+        "UPDATE vote_results SET result = %s, voted_at = CURRENT_TIMESTAMP WHERE agenda_item_id = %s",
+        (result, agenda_item_id),
+    )
+    return result
+
+
+def _count(code: int) -> str:
+    return f"COALESCE(SUM(v.opt_code = {code}), 0)"
+
+
+async def recount(query: QueryFn, agenda_item_id: int) -> Optional[str]:
+    """Rebuild the item's row from its ballots"""
+    await query(
+        f"""
+        INSERT INTO vote_results (agenda_item_id, votes_for, votes_against, votes_abstain, total_votes, result)
+        SELECT ai.id, {_count(FOR)}, {_count(AGAINST)}, {_count(ABSTAIN)},
+               {_count(FOR)} + {_count(AGAINST)} + {_count(ABSTAIN)}, %s
+        FROM agenda_items ai
+        LEFT JOIN votes v ON v.meeting_id = ai.meeting_id AND v.agenda_item_id = ai.id
+        WHERE ai.id = %s
+        GROUP BY ai.id
+        ON DUPLICATE KEY UPDATE
+            votes_for = VALUES(votes_for),
+            votes_against = VALUES(votes_against),
+            votes_abstain = VALUES(votes_abstain),
+            total_votes = VALUES(total_votes)
+        """,
+        (NO_QUORUM, agenda_item_id),
+    )
+    return await redecide(query, agenda_item_id)
@@ -0,0 +1,247 @@
+"""
+Streaming ZIP archives of files on disk.
+
+The archive is produced incrementally: each member is read in chunks, CRC'd
+and (optionally) deflated on the fly, with sizes written in a trailing data
+descriptor, so no temp file is needed and memory stays constant regardless of
+archive size. Already-compressed types are stored rather than deflated.
+
+Output is deterministic for the same set of files: entries keep the given
+order, timestamps come from file mtimes and compression settings are fixed,
+so the archive can be identified by an ETag computed from the entry list
+without reading any file contents. ZIP64 records are emitted when sizes or
+offsets exceed the classic 4 GiB limits.
+"""
+
+import hashlib
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 256 * 1024
+DEFLATE_LEVEL = 6
+ZIP_FORMAT_VERSION = 1  # bump when the encoding changes so cached ETags are invalidated
+
+STORED = 0
+DEFLATED = 8
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_ENTRY_LIMIT = 0xFFFF
+
+# Formats that are already compressed; deflating them again only costs CPU
+STORED_MIME_PREFIXES = ("image/", "video/", "audio/")
+STORED_MIME_TYPES = {
+    "application/pdf",
+    "application/zip",
+    "application/gzip",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "application/vnd.oasis.opendocument.text",
+    "application/vnd.oasis.opendocument.spreadsheet",
+}
+
+
+@dataclass(frozen=True)
+class ZipSource:
+    arcname: str
+    path: Path
+    size: int
+    mtime_ns: int
+    method: int
+    codec: Optional[str] = None
+
+
+def compression_for(mime_type: Optional[str]) -> int:
+    if not mime_type:
+        return DEFLATED
+    if mime_type.startswith(STORED_MIME_PREFIXES) or mime_type in STORED_MIME_TYPES:
+        return STORED
+    return DEFLATED
+
+
+def _unique_name(name: str, seen: set) -> str:
+    name = name.replace("\\", "/").lstrip("/") or "file"
+    candidate = name
+    stem, dot, suffix = name.rpartition(".")
+    counter = 2
+    while candidate in seen:
+        candidate = f"{stem} ({counter}).{suffix}" if dot else f"{name} ({counter})"
+        counter += 1
+    seen.add(candidate)
+    return candidate
+
+
+def plan_entries(
+    rows: Iterable[tuple[str, str, Optional[str], Optional[str], Optional[int]]]
+) -> tuple[list[ZipSource], list[str]]:
+    """
+    Stat (name, file_path, mime_type, codec, file_size) rows and build the
+    archive members. codec is set for compressed cold-tier blobs, whose size
+    on disk is not the member size, so file_size is used for those.
+    Returns (entries, missing) where missing lists names not found on disk.
+    Blocking; run it in the thread pool.
+    """
+    entries = []
+    missing = []
+    seen: set = set()
+    for name, file_path, mime_type, codec, file_size in rows:
+        try:
+            stat = os.stat(file_path)
+        except (OSError, TypeError):
+            missing.append(name)
+            continue
+        size = stat.st_size
+        if codec:
+            # Unknown original size: force ZIP64 sizes so any length fits
+            size = file_size if file_size is not None else ZIP64_LIMIT
+        entries.append(ZipSource(
+            arcname=_unique_name(name, seen),
+            path=Path(file_path),
+            size=size,
+            mtime_ns=stat.st_mtime_ns,
+            method=compression_for(mime_type),
+            codec=codec,
+        ))
+    return entries, missing
+
+
+def _open_plain(path: Path, codec: Optional[str]):
+    return open(path, "rb")
+
+
+def archive_etag(entries: list[ZipSource]) -> str:
+    digest = hashlib.sha256(f"zip-v{ZIP_FORMAT_VERSION}-l{DEFLATE_LEVEL}".encode())
+    for entry in entries:
+        digest.update(f"{entry.arcname}\0{entry.size}\0{entry.mtime_ns}\0{entry.method}\0".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _dos_datetime(mtime_ns: int) -> tuple[int, int]:
+    t = time.gmtime(max(mtime_ns // 1_000_000_000, 315532800))  # ZIP cannot represent pre-1980
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _read_chunk(f, compressor):
+    """Read and compress the next chunk; returns (raw data, bytes to emit)"""
+    data = f.read(CHUNK_SIZE)
+    if not data:
+        return b"", compressor.flush() if compressor else b""
+    return data, compressor.compress(data) if compressor else data
+
+
+class _CentralRecord:
+    __slots__ = ("name", "method", "flags", "dos_time", "dos_date", "crc", "compressed", "size", "offset")
+
+
+async def stream_zip(
+    entries: list[ZipSource],
+    opener: Callable[[Path, Optional[str]], object] = _open_plain,
+) -> AsyncIterator[bytes]:
+    """Yield the archive; `opener(path, codec)` returns a binary reader of the original bytes"""
+    offset = 0
+    records = []
+
+    for entry in entries:
+        name = entry.arcname.encode("utf-8")
+        dos_time, dos_date = _dos_datetime(entry.mtime_ns)
+        zip64 = entry.size >= ZIP64_LIMIT - (entry.size >> 8) - 1024  # leave room for deflate overhead
+        flags = FLAG_DATA_DESCRIPTOR | FLAG_UTF8
+        version = 45 if zip64 else 20
+
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b""
+        size_field = ZIP64_LIMIT if zip64 else 0
+        header = struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, version, flags, entry.method, dos_time, dos_date,
+            0, size_field, size_field, len(name), len(extra),
+        ) + name + extra
+
+        record = _CentralRecord()
+        record.name, record.method, record.flags = name, entry.method, flags
+        record.dos_time, record.dos_date, record.offset = dos_time, dos_date, offset
+        yield header
+        offset += len(header)
+
+        crc = 0
+        compressed = 0
+        size = 0
+        compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15) if entry.method == DEFLATED else None
+        f = await run_in_threadpool(opener, entry.path, entry.codec)
+        try:
+            while True:
+                data, output = await run_in_threadpool(_read_chunk, f, compressor)
+                if data:
+                    crc = zlib.crc32(data, crc)
+                    size += len(data)
+                if output:
+                    compressed += len(output)
+                    yield output
+                if not data:
+                    break
+        finally:
+            await run_in_threadpool(f.close)
+
+        record.crc, record.compressed, record.size = crc, compressed, size
+        if zip64:
+            descriptor = struct.pack("<IIQQ", 0x08074B50, crc, compressed, size)
+        else:
+            descriptor = struct.pack("<IIII", 0x08074B50, crc, compressed, size)
+        yield descriptor
+        offset += compressed + len(descriptor)
+        records.append(record)
+
+    central_offset = offset
+    central_size = 0
+    for record in records:
+        zip64_fields = []
+        size = record.size
+        compressed = record.compressed
+        local_offset = record.offset
+        if size >= ZIP64_LIMIT:
+            zip64_fields.append(size)
+            size = ZIP64_LIMIT
+        if compressed >= ZIP64_LIMIT:
+            zip64_fields.append(compressed)
+            compressed = ZIP64_LIMIT
+        if local_offset >= ZIP64_LIMIT:
+            zip64_fields.append(local_offset)
+            local_offset = ZIP64_LIMIT
+        extra = b""
+        if zip64_fields:
+            extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields)
+        version = 45 if zip64_fields else 20
+
+        central = struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | version, version, record.flags,
+            record.method, record.dos_time, record.dos_date, record.crc, compressed, size,
+            len(record.name), len(extra), 0, 0, 0, 0o100644 << 16, local_offset,
+        ) + record.name + extra
+        central_size += len(central)
+        yield central
+
+    end_offset = central_offset + central_size
+    count = len(records)
+    if count >= ZIP64_ENTRY_LIMIT or central_offset >= ZIP64_LIMIT or central_size >= ZIP64_LIMIT:
+        yield struct.pack(
+            "<IQHHIIQQQQ", 0x06064B50, 44, (3 << 8) | 45, 45, 0, 0,
+            count, count, central_size, central_offset,
+        )
+        yield struct.pack("<IIQI", 0x07064B50, 0, end_offset, 1)
+        count = min(count, ZIP64_ENTRY_LIMIT)
+        central_size = min(central_size, ZIP64_LIMIT)
+        central_offset = min(central_offset, ZIP64_LIMIT)
+
+    yield struct.pack(
+        "<IHHHHIIH", 0x06054B50, 0, 0, count, count, central_size, central_offset, 0,
+    )